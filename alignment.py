@@ -0,0 +1,238 @@
+"""Lap/distance alignment of car telemetry.
+
+Telemetry rows only carry a timestamp (and sometimes a lap number), so two
+drivers cannot be compared point by point. This module:
+
+1. integrates speed over time into distance travelled (trapezoidal rule,
+   per driver/race, gaps longer than MAX_GAP_S count as standing still),
+2. splits each driver's run into laps, using the `lap` column when present
+   and the circuit length (CIRCUIT_LENGTHS_M) otherwise,
+3. resamples every lap onto one fixed distance grid with a single
+   np.interp call over all laps.
+
+The result, AlignedLaps, holds one (n_laps, n_points) array per channel,
+so overlays and deltas between drivers are plain array arithmetic:
+
+    aligned = align_laps(df)                      # any drivers/races
+    best = aligned.fastest()                      # fastest lap per driver
+    delta = aligned.channels["time"][best[1]] - aligned.channels["time"][best[0]]
+
+Distances are estimates: car_data is sampled at ~4 Hz and scraped data
+drops rows below 100 km/h, so laps split by circuit length drift slowly
+over a session.
+"""
+import numpy as np
+import pandas as pd
+
+DEFAULT_STEP_M = 10.0
+MAX_GAP_S = 10.0
+MIN_LAP_FRACTION = 0.9
+GROUP_COLUMNS = ["year", "session_type", "driver_name", "race"]
+CHANNELS = ["speed", "throttle", "brake", "rpm", "n_gear"]
+
+# Track lengths (m) keyed by OpenF1 circuit_short_name
+CIRCUIT_LENGTHS_M = {
+    "Sakhir": 5412, "Jeddah": 6174, "Melbourne": 5278, "Suzuka": 5807, "Shanghai": 5451,
+    "Miami": 5412, "Imola": 4909, "Monte Carlo": 3337, "Catalunya": 4657, "Montreal": 4361,
+    "Spielberg": 4318, "Silverstone": 5891, "Hungaroring": 4381, "Spa-Francorchamps": 7004,
+    "Zandvoort": 4259, "Monza": 5793, "Baku": 6003, "Singapore": 4940, "Austin": 5513,
+    "Mexico City": 4304, "Interlagos": 4309, "Las Vegas": 6201, "Lusail": 5419,
+    "Yas Marina Circuit": 5281,
+}
+
+
+def _circuit_key(name):
+    return "".join(ch for ch in str(name).lower() if ch.isalnum())
+
+
+_LENGTHS_BY_KEY = {_circuit_key(k): v for k, v in CIRCUIT_LENGTHS_M.items()}
+
+
+def circuit_length(circuit):
+    """Track length in metres, or None for an unknown circuit ('Monte_Carlo' == 'Monte Carlo')"""
+    return _LENGTHS_BY_KEY.get(_circuit_key(circuit)) if circuit is not None else None
+
+
+def segment_starts(*keys):
+    """Boolean mask of rows where any key array changes (row 0 always starts)"""
+    n = len(keys[0]) if keys else 0
+    starts = np.zeros(n, dtype=bool)
+    if n:
+        starts[0] = True
+    for key in keys:
+        starts[1:] |= key[1:] != key[:-1]
+    return starts
+
+
+def integrate_distance(seconds, speed_kmh, starts=None, max_gap=MAX_GAP_S):
+    """Cumulative distance (m) per segment, restarting at 0 wherever `starts` is True"""
+    seconds = np.asarray(seconds, dtype=np.float64)
+    v = np.asarray(speed_kmh, dtype=np.float64) / 3.6
+    if starts is None:
+        starts = segment_starts(np.zeros(len(v)))
+    dt = np.diff(seconds, prepend=seconds[:1])
+    step = 0.5 * (v + np.concatenate((v[:1], v[:-1]))) * dt
+    step[starts | (dt < 0) | (dt > max_gap) | ~np.isfinite(step)] = 0.0
+    total = np.cumsum(step)
+    first = np.flatnonzero(starts)
+    return total - np.repeat(total[first], np.diff(np.append(first, len(v))))
+
+
+class AlignedLaps:
+    """Laps resampled onto a common distance grid.
+
+    grid: distance from the lap start (m), shape (n_points,)
+    laps: one row per lap (group columns, lap, lap_time_s, length_m, complete)
+    channels: name -> (n_laps, n_points) float32 array, NaN past the lap's
+        end; 'time' is seconds since the lap start.
+    """
+
+    def __init__(self, grid, laps, channels):
+        self.grid = grid
+        self.laps = laps
+        self.channels = channels
+
+    def __len__(self):
+        return len(self.laps)
+
+    @property
+    def nbytes(self):
+        return (self.grid.nbytes + sum(a.nbytes for a in self.channels.values())
+                + int(self.laps.memory_usage(deep=True).sum()))
+
+    def fastest(self, by="driver_name"):
+        """Row index of the fastest complete lap per `by` group, in first-seen order"""
+        laps = self.laps[self.laps["complete"]]
+        if laps.empty:
+            return []
+        if by not in laps.columns:
+            return [int(laps["lap_time_s"].idxmin())]
+        best = laps.groupby(by, sort=False, observed=True)["lap_time_s"].idxmin()
+        return [int(i) for i in best]
+
+    def frame(self, rows, channels=None):
+        """Long DataFrame (distance, group columns, channels) for the given lap rows"""
+        channels = channels or list(self.channels)
+        rows = list(rows)
+        n = len(self.grid)
+        data = {"distance": np.tile(self.grid, len(rows))}
+        for col in self.laps.columns:
+            data[col] = np.repeat(self.laps[col].to_numpy()[rows], n)
+        for name in channels:
+            data[name] = self.channels[name][rows].ravel()
+        return pd.DataFrame(data)
+
+
+def _empty(channels):
+    laps = pd.DataFrame(columns=["lap", "lap_time_s", "length_m", "complete"])
+    return AlignedLaps(np.zeros(0), laps, {c: np.zeros((0, 0), dtype=np.float32) for c in channels + ["time"]})
+
+
+def align_laps(df, step=DEFAULT_STEP_M, lap_length=None, channels=None, min_fraction=MIN_LAP_FRACTION):
+    """Split df (one or more drivers/races) into laps on a `step`-metre distance grid
+
+    Laps come from the `lap` column when it has values, else from
+    `lap_length` metres (default: the circuit's CIRCUIT_LENGTHS_M entry when
+    df covers a single known race); without either each driver/race is one
+    segment. Laps shorter than min_fraction of the typical lap are kept but
+    flagged complete=False (out-laps, the partial lap at either end).
+    """
+    channels = [c for c in (channels or CHANNELS) if c in df.columns]
+    if df.empty or "date" not in df.columns or "speed" not in df.columns:
+        return _empty(channels)
+
+    group_cols = [c for c in GROUP_COLUMNS if c in df.columns]
+    df = df.dropna(subset=["date", "speed"])
+    df = df.sort_values(group_cols + ["date"], kind="stable", ignore_index=True)
+    if df.empty:
+        return _empty(channels)
+
+    dates = pd.to_datetime(df["date"], utc=True)
+    seconds = (dates - dates.iloc[0]).dt.total_seconds().to_numpy()
+    group_keys = [pd.factorize(df[c])[0] for c in group_cols]
+    group_starts = segment_starts(*group_keys) if group_keys else segment_starts(np.zeros(len(df)))
+    distance = integrate_distance(seconds, df["speed"].to_numpy(dtype=np.float64), group_starts)
+
+    if lap_length is None and "race" in df.columns and df["race"].nunique() == 1:
+        lap_length = circuit_length(df["race"].iloc[0])
+    has_laps = "lap" in df.columns and df["lap"].notna().any()
+    if has_laps:
+        laps = pd.to_numeric(df["lap"], errors="coerce").fillna(-1).to_numpy(dtype=np.int64)
+    elif lap_length:
+        laps = (distance // lap_length).astype(np.int64) + 1
+    else:
+        laps = np.ones(len(df), dtype=np.int64)
+
+    starts = group_starts | segment_starts(laps)
+    first = np.flatnonzero(starts)
+    last = np.append(first[1:], len(df)) - 1
+    counts = last - first + 1
+    seg = np.repeat(np.arange(len(first)), counts)
+
+    if has_laps or not lap_length:
+        lap_distance = distance - distance[first][seg]
+    else:
+        # Laps split on distance start exactly at a multiple of lap_length
+        lap_distance = distance - (laps - 1) * lap_length
+    lap_seconds = seconds - seconds[first][seg]
+    lengths = lap_distance[last]
+
+    # Typical lap length: given, or the median of the longer segments
+    typical = lap_length or float(np.median(lengths[lengths >= np.median(lengths)]))
+    complete = (lengths >= min_fraction * typical) & (counts > 1)
+
+    n_points = int(np.ceil(max(lengths.max(), step) / step)) + 1
+    grid = np.arange(n_points) * step
+
+    # One interpolation over all laps: offset each lap onto its own stretch of the
+    # axis, with an anchor at distance 0 holding the lap's first sample so grid
+    # points before it never blend with the previous lap
+    span = grid[-1] + step
+    xp = np.concatenate((np.arange(len(first)) * span, seg * span + np.minimum(lap_distance, span - step / 2)))
+    source = np.concatenate((first, np.arange(len(df))))
+    x = (np.arange(len(first))[:, None] * span + grid[None, :]).ravel()
+    past_end = (grid[None, :] > lengths[:, None]).ravel()
+    order = np.argsort(xp, kind="stable")
+    xp = xp[order]
+    source = source[order]
+
+    out = {}
+    for name in channels + ["time"]:
+        values = lap_seconds if name == "time" else pd.to_numeric(df[name], errors="coerce").to_numpy(np.float64)
+        y = np.interp(x, xp, values[source])
+        y[past_end] = np.nan
+        out[name] = y.reshape(len(first), n_points).astype(np.float32)
+
+    lap_table = df.loc[first, group_cols].reset_index(drop=True)
+    lap_table["lap"] = laps[first]
+    lap_table["lap_time_s"] = seconds[last] - seconds[first]
+    lap_table["length_m"] = lengths
+    lap_table["complete"] = complete
+    return AlignedLaps(grid, lap_table, out)
+
+
+def compare_fastest(aligned_by_driver, channels=("speed", "time")):
+    """Fastest complete laps of several AlignedLaps on one grid
+
+    Returns a long DataFrame (driver_name, distance, channels...) plus
+    'delta_s': time behind the first driver's lap at each distance.
+    """
+    picked = []
+    for driver, aligned in aligned_by_driver.items():
+        best = aligned.fastest() if aligned is not None and len(aligned) else []
+        if best:
+            picked.append((driver, aligned, best[0]))
+    if not picked:
+        return pd.DataFrame()
+
+    n_points = min(len(aligned.grid) for _, aligned, _ in picked)
+    grid = picked[0][1].grid[:n_points]
+    reference_time = picked[0][1].channels["time"][picked[0][2], :n_points]
+    parts = []
+    for driver, aligned, row in picked:
+        part = {"driver_name": driver, "distance": grid}
+        for name in channels:
+            part[name] = aligned.channels[name][row, :n_points]
+        part["delta_s"] = aligned.channels["time"][row, :n_points] - reference_time
+        parts.append(pd.DataFrame(part))
+    return pd.concat(parts, ignore_index=True)
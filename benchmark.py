@@ -0,0 +1,283 @@
+"""Benchmarks for the data loaders and chart helpers.
+
+Two steps:
+
+1. `generate` writes a synthetic f1_cleaned_data tree shaped like a real
+   season (RACES races x DRIVERS drivers, ROWS_PER_FILE car_data rows per
+   driver and race) with rows per file multiplied by --scale, e.g. 1, 10
+   or 50. --stores also builds manifests, rollups, the memmap store and
+   (with pyarrow) the columnar store, so both cold and prepared trees can
+   be measured.
+2. `run` times every case outside Streamlit, calling the loaders'
+   undecorated functions (inspect.unwrap) so neither st.cache_data, the
+   shared frame cache nor the figure cache hides the work. Each case is repeated and its
+   median/min wall time recorded, then run once more under tracemalloc for
+   its peak allocation. Results are written as JSON and, with --baseline,
+   compared against an earlier results file.
+
+Usage:
+    python benchmark.py generate --out bench_data --scale 10 --stores
+    python benchmark.py run --data bench_data --output results.json
+    python benchmark.py run --data bench_data --baseline results.json --tolerance 0.25
+"""
+import argparse
+import inspect
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+YEAR = 2024
+RACES = 24
+SPRINTS = 6
+DRIVERS = 20
+ROWS_PER_FILE = 18_000   # ~3.7 Hz car_data over a race, speed >= 100
+SAMPLE_MS = 270
+REPEATS = 5
+TOLERANCE = 0.25
+
+
+def _names(prefix, n):
+    return [f"{prefix}_{i:02d}" for i in range(1, n + 1)]
+
+
+def synthetic_file(rng, rows, year, race, session_key, driver_number, driver_name, start):
+    """One cleaned car_data file worth of plausible telemetry"""
+    t = np.arange(rows)
+    phase = rng.uniform(0, 2 * np.pi)
+    speed = np.clip(220 + 90 * np.sin(t / 60 + phase) + rng.normal(0, 6, rows), 100, 350)
+    throttle = np.clip((speed - 150) * 0.6 + rng.normal(0, 10, rows), 0, 100)
+    brake = np.where(np.diff(speed, prepend=speed[0]) < -2, 100, 0)
+    n_gear = np.clip((speed / 42).astype(int), 1, 8)
+    rpm = np.clip(speed * 38 + rng.normal(0, 300, rows), 4000, 15000).astype(int)
+    dates = pd.Timestamp(start) + pd.to_timedelta(t * SAMPLE_MS, unit="ms")
+    return pd.DataFrame({
+        "brake": brake,
+        "date": dates.strftime("%Y-%m-%dT%H:%M:%S.%f+00:00"),
+        "driver_number": driver_number,
+        "drs": 0,
+        "meeting_key": session_key // 10,
+        "n_gear": n_gear,
+        "rpm": rpm,
+        "session_key": session_key,
+        "speed": speed.round().astype(int),
+        "throttle": throttle.round().astype(int),
+        "year": year,
+        "race": race,
+        "driver_name": driver_name,
+        "lap": 1 + t * SAMPLE_MS // 90_000,
+    })
+
+
+def generate(out_dir, scale=1.0, year=YEAR, seed=0, stores=False):
+    """Write <out_dir>/f1_cleaned_data/<year>/{race,sprint}/; returns total rows"""
+    rng = np.random.default_rng(seed)
+    rows = max(1, int(ROWS_PER_FILE * scale))
+    cleaned_dir = os.path.join(out_dir, "f1_cleaned_data")
+    drivers = list(enumerate(_names("Driver", DRIVERS), start=1))
+    total = 0
+    for session_type, n_races in (("race", RACES), ("sprint", SPRINTS)):
+        folder = os.path.join(cleaned_dir, str(year), session_type)
+        os.makedirs(folder, exist_ok=True)
+        session_rows = rows if session_type == "race" else max(1, rows // 3)
+        for r, race in enumerate(_names("Circuit", n_races)):
+            session_key = 9000 + r * 10 + (session_type == "sprint")
+            start = pd.Timestamp(f"{year}-03-01T13:00:00Z") + pd.Timedelta(days=14 * r)
+            for number, name in drivers:
+                df = synthetic_file(rng, session_rows, year, race, session_key, number, name, start)
+                fname = f"{year}_{race}_{session_type.capitalize()}_{session_key}_{number}.csv"
+                df.to_csv(os.path.join(folder, fname), index=False)
+                total += len(df)
+        print(f"{year} {session_type}: {n_races * DRIVERS} files")
+    if stores:
+        build_stores(out_dir, year)
+    return total
+
+
+def build_stores(data_dir, year=YEAR):
+    import columnar_store
+    import manifest
+    import memmap_store
+    import rollups
+
+    cleaned_dir = os.path.join(data_dir, "f1_cleaned_data")
+    columnar_dir = os.path.join(data_dir, "f1_columnar_data")
+    for session_type in ("race", "sprint"):
+        manifest.load_manifest(os.path.join(cleaned_dir, str(year), session_type))
+        if columnar_store.is_available():
+            columnar_store.convert_folder(year, session_type, cleaned_dir, columnar_dir)
+        rollups.load_rollups(year, session_type, cleaned_dir, columnar_dir)
+        memmap_store.build_season(year, session_type, cleaned_dir, columnar_dir,
+                                  os.path.join(data_dir, "f1_memmap_data"))
+
+
+def _point_utils(data_dir):
+    """Import utils with its data folders pointed at a generated tree"""
+    import streamlit.logger
+    streamlit.logger.set_log_level("error")  # "No runtime found" warnings outside `streamlit run`
+    import utils
+    utils.CLEANED_DIR = os.path.join(data_dir, "f1_cleaned_data")
+    utils.COLUMNAR_DIR = os.path.join(data_dir, "f1_columnar_data")
+    utils.MEMMAP_DIR = os.path.join(data_dir, "f1_memmap_data")
+    utils.SQL_DIR = os.path.join(data_dir, "f1_sql_data")
+    return utils
+
+
+def _uncached(func):
+    """The undecorated function beneath cache and timing wrappers"""
+    return inspect.unwrap(func)
+
+
+def build_cases(utils, year=YEAR, session_type="race"):
+    """{name: zero-argument callable}; loaders and chart helpers are called uncached"""
+    drivers = _uncached(utils.get_available_drivers)(year, session_type)
+    circuits = _uncached(utils.get_available_circuits)(year, session_type)
+    if not drivers:
+        raise SystemExit(f"no data for {year} {session_type} under {utils.CLEANED_DIR}")
+    driver, circuit = drivers[0], circuits[0]
+    chart_columns = ["driver_name", "speed", "rpm", "throttle", "brake", "n_gear", "race", "lap", "date"]
+
+    season = _uncached(utils.load_data)(year, session_type, columns=chart_columns)
+    driver_df = season[season["driver_name"] == driver]
+
+    return {
+        "load_data": lambda: _uncached(utils.load_data)(year, session_type),
+        "load_data_columns": lambda: _uncached(utils.load_data)(year, session_type,
+                                                                 columns=["driver_name", "speed", "rpm"]),
+        "load_data_filtered_driver": lambda: _uncached(utils.load_data_filtered)(year, session_type,
+                                                                                  driver_name=driver),
+        "load_data_filtered_circuit": lambda: _uncached(utils.load_data_filtered)(year, session_type,
+                                                                                   circuit=circuit),
+        "query_driver": lambda: _uncached(utils.query)(year, session_type, columns=chart_columns,
+                                                        drivers=driver),
+        "get_available_drivers": lambda: _uncached(utils.get_available_drivers)(year, session_type),
+        "get_data_summary": lambda: _uncached(utils.get_data_summary)(year, session_type),
+        "get_rollups": lambda: _uncached(utils.get_rollups)(year, session_type),
+        "get_evolution_table": lambda: _uncached(utils.get_evolution_table)([year], ["race", "sprint"]),
+        "create_speed_distribution": lambda: _uncached(utils.create_speed_distribution)(season),
+        "create_speed_rpm_scatter": lambda: _uncached(utils.create_speed_rpm_scatter)(season),
+        "create_throttle_brake_map": lambda: _uncached(utils.create_throttle_brake_map)(season),
+        "create_gear_distribution": lambda: _uncached(utils.create_gear_distribution)(season),
+        "create_average_speed_bar": lambda: _uncached(utils.create_average_speed_bar)(season),
+        "create_line_chart": lambda: _uncached(utils.create_line_chart)(driver_df, x="date", y="speed"),
+        "create_density_heatmap": lambda: _uncached(utils.create_density_heatmap)(season, "rpm", "throttle"),
+        "create_scatter_webgl": lambda: _uncached(utils.create_scatter)(season, "rpm", "speed", color="driver_name"),
+    }
+
+
+def time_case(func, repeats=REPEATS):
+    """Wall times of `repeats` calls plus the peak traced allocation of one more"""
+    func()  # warm-up: manifests, imports, OS page cache
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        "median_s": statistics.median(times),
+        "min_s": min(times),
+        "repeats": repeats,
+        "peak_mb": peak / 1024**2,
+    }
+
+
+def run(data_dir, repeats=REPEATS, only=None, year=YEAR):
+    utils = _point_utils(data_dir)
+    cases = build_cases(utils, year)
+    results = {}
+    for name, func in cases.items():
+        if only and not any(pattern in name for pattern in only):
+            continue
+        results[name] = time_case(func, repeats)
+        r = results[name]
+        print(f"{name:<28} {r['median_s'] * 1000:>10.1f} ms  (min {r['min_s'] * 1000:.1f})  "
+              f"peak {r['peak_mb']:>8.1f} MB")
+    summary = _uncached(utils.get_data_summary)(year, "race")
+    return {
+        "meta": {
+            "data_dir": os.path.abspath(data_dir),
+            "files": len(utils._folder_manifest(year, "race")),
+            "drivers": len(summary.get("drivers", [])),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "cases": results,
+    }
+
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    """Cases slower or heavier than baseline by more than `tolerance`; prints a table"""
+    regressions = []
+    print(f"\n{'case':<28} {'time':>8} {'memory':>8}")
+    for name, current in results["cases"].items():
+        base = baseline.get("cases", {}).get(name)
+        if not base:
+            print(f"{name:<28} {'new':>8}")
+            continue
+        time_ratio = current["median_s"] / base["median_s"] if base["median_s"] else 1.0
+        mem_ratio = current["peak_mb"] / base["peak_mb"] if base["peak_mb"] else 1.0
+        flag = ""
+        if time_ratio > 1 + tolerance or mem_ratio > 1 + tolerance:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:<28} {time_ratio:>7.2f}x {mem_ratio:>7.2f}x{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark loaders and chart helpers")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    gen = sub.add_parser("generate", help="write a synthetic f1_cleaned_data tree")
+    gen.add_argument("--out", default="bench_data")
+    gen.add_argument("--scale", type=float, default=1.0, help="rows per file relative to a real season")
+    gen.add_argument("--year", type=int, default=YEAR)
+    gen.add_argument("--seed", type=int, default=0)
+    gen.add_argument("--stores", action="store_true", help="also build manifests, rollups and stores")
+
+    bench = sub.add_parser("run", help="time loaders and chart helpers")
+    bench.add_argument("--data", default="bench_data")
+    bench.add_argument("--year", type=int, default=YEAR)
+    bench.add_argument("--repeats", type=int, default=REPEATS)
+    bench.add_argument("--only", nargs="+", help="run cases whose name contains any of these")
+    bench.add_argument("--output", help="write results JSON here")
+    bench.add_argument("--baseline", help="results JSON to compare against")
+    bench.add_argument("--tolerance", type=float, default=TOLERANCE, help="allowed slowdown, 0.25 = 25%%")
+    args = parser.parse_args(argv)
+
+    if args.command == "generate":
+        rows = generate(args.out, args.scale, args.year, args.seed, args.stores)
+        print(f"{rows:,} rows written to {args.out}")
+        return 0
+
+    results = run(args.data, args.repeats, args.only, args.year)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=1)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s): {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
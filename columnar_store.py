@@ -0,0 +1,156 @@
+"""Columnar (Parquet) mirror of f1_cleaned_data.
+
+The converter writes one Parquet file per cleaned CSV, laid out as
+f1_columnar_data/<year>/<session>/<race>/<driver_name>/<csv_stem>.parquet,
+with numeric columns typed and `date` stored as a UTC timestamp.
+
+Usage:
+    python columnar_store.py               # convert every year/session
+    python columnar_store.py 2024          # convert one year
+    python columnar_store.py 2024 race     # convert one year/session
+    python columnar_store.py --force       # rewrite files that are up to date
+"""
+import os
+import re
+import sys
+
+import pandas as pd
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:  # optional dependency, loaders fall back to CSV
+    pq = None
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+CLEANED_DIR = os.path.join(ROOT_DIR, "f1_cleaned_data")
+COLUMNAR_DIR = os.path.join(ROOT_DIR, "f1_columnar_data")
+
+PARQUET_COMPRESSION = "zstd"
+
+
+def is_available():
+    return pq is not None
+
+
+def _partition_name(value, default="Unknown"):
+    text = str(value).strip() if value is not None and not pd.isna(value) else ""
+    text = re.sub(r'[\\/:*?"<>|]+', "_", text)
+    return text or default
+
+
+def parquet_path_for(df, csv_path, store_folder):
+    """Target path of a CSV inside the year/session store folder"""
+    race = df["race"].iloc[0] if "race" in df.columns and len(df) else None
+    driver = df["driver_name"].iloc[0] if "driver_name" in df.columns and len(df) else None
+    stem = os.path.splitext(os.path.basename(csv_path))[0]
+    return os.path.join(store_folder, _partition_name(race), _partition_name(driver), stem + ".parquet")
+
+
+def list_store_files(store_folder):
+    """Map CSV stem -> Parquet path for every file under a year/session store folder"""
+    found = {}
+    if not os.path.isdir(store_folder):
+        return found
+    for dirpath, _, filenames in os.walk(store_folder):
+        for fname in filenames:
+            if fname.endswith(".parquet"):
+                found[fname[:-len(".parquet")]] = os.path.join(dirpath, fname)
+    return found
+
+
+def resolve_sources(csv_files, store_folder):
+    """Pick the Parquet copy of each CSV when it exists and is up to date"""
+    if pq is None:
+        return list(csv_files)
+    store_files = list_store_files(store_folder)
+    if not store_files:
+        return list(csv_files)
+    sources = []
+    for path in csv_files:
+        stem = os.path.splitext(os.path.basename(path))[0]
+        pq_path = store_files.get(stem)
+        try:
+            if pq_path and os.path.getmtime(pq_path) >= os.path.getmtime(path):
+                sources.append(pq_path)
+                continue
+        except OSError:
+            pass
+        sources.append(path)
+    return sources
+
+
+def read_parquet(path, columns=None):
+    """Read a store file, projecting to the requested columns that exist"""
+    if columns:
+        names = pq.ParquetFile(path).schema_arrow.names
+        columns = [c for c in columns if c in names]
+    return pd.read_parquet(path, columns=columns or None)
+
+
+def iter_parquet(path, columns=None, batch_rows=100_000):
+    """Yield a store file as DataFrames of at most batch_rows rows"""
+    pf = pq.ParquetFile(path)
+    if columns:
+        columns = [c for c in columns if c in pf.schema_arrow.names]
+    for batch in pf.iter_batches(batch_size=batch_rows, columns=columns or None):
+        yield batch.to_pandas()
+
+
+def _typed_frame(df):
+    if "date" in df.columns:
+        df["date"] = pd.to_datetime(df["date"], errors="coerce", utc=True, format="ISO8601")
+    return df
+
+
+def convert_folder(year, session_type, cleaned_dir=CLEANED_DIR, columnar_dir=COLUMNAR_DIR, force=False):
+    """Convert one f1_cleaned_data/<year>/<session> folder; returns (converted, skipped, failed)"""
+    if pq is None:
+        raise RuntimeError("pyarrow is required to build the columnar store (pip install pyarrow)")
+
+    src = os.path.join(cleaned_dir, str(year), session_type)
+    dst = os.path.join(columnar_dir, str(year), session_type)
+    if not os.path.isdir(src):
+        return 0, 0, 0
+
+    existing = list_store_files(dst)
+    converted = skipped = failed = 0
+    for fname in sorted(os.listdir(src)):
+        if not fname.lower().endswith(".csv"):
+            continue
+        csv_path = os.path.join(src, fname)
+        stem = os.path.splitext(fname)[0]
+        old = existing.get(stem)
+        if not force and old and os.path.getmtime(old) >= os.path.getmtime(csv_path):
+            skipped += 1
+            continue
+        try:
+            df = _typed_frame(pd.read_csv(csv_path))
+        except Exception as e:
+            print(f"failed {fname}: {e}")
+            failed += 1
+            continue
+        target = parquet_path_for(df, csv_path, dst)
+        if old and old != target:
+            os.remove(old)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        df.to_parquet(target, index=False, compression=PARQUET_COMPRESSION)
+        converted += 1
+    return converted, skipped, failed
+
+
+def convert_all(years=None, sessions=None, cleaned_dir=CLEANED_DIR, columnar_dir=COLUMNAR_DIR, force=False):
+    if years is None:
+        years = sorted(n for n in os.listdir(cleaned_dir) if n.isdigit()) if os.path.isdir(cleaned_dir) else []
+    for year in years:
+        year_dir = os.path.join(cleaned_dir, str(year))
+        year_sessions = sessions or (sorted(os.listdir(year_dir)) if os.path.isdir(year_dir) else [])
+        for session_type in year_sessions:
+            converted, skipped, failed = convert_folder(year, session_type, cleaned_dir, columnar_dir, force)
+            print(f"{year} {session_type}: {converted} converted, {skipped} up to date, {failed} failed")
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    force = "--force" in args
+    args = [a for a in args if a != "--force"]
+    convert_all(years=args[:1] or None, sessions=args[1:2] or None, force=force)
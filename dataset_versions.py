@@ -0,0 +1,114 @@
+"""Dataset versions of the f1_cleaned_data year/session folders.
+
+A folder's version is the hash of its CSV names, mtimes and sizes (the
+same formula as memmap_store.manifest_fingerprint), taken with one stat
+per file and no reads. utils.versioned passes the versions of the
+folders a call reads into its cache key, so dropping, replacing or
+deleting a file changes the key of exactly the entries built from that
+folder, and nothing else is recomputed:
+
+    DATASET_VERSIONS.get(cleaned_dir, 2024, "race")   # 'a94f...'
+
+Versions are re-checked at most every VERSION_POLL_S seconds per folder.
+start_watcher() polls every folder seen so far on a daemon thread and
+calls the change listeners (utils drops the stale frames, warmup.py
+reloads the changed seasons) as soon as one changes, before anyone asks.
+
+Environment: F1_VERSION_POLL_S overrides the re-check interval.
+"""
+import logging
+import os
+import threading
+import time
+
+import memmap_store
+
+VERSION_POLL_S = float(os.environ.get("F1_VERSION_POLL_S", 2))
+THREAD_NAME = "f1-dataset-watcher"
+
+logger = logging.getLogger(__name__)
+
+
+def folder_version(folder):
+    """Hash of the CSV names, mtimes and sizes in a folder ('' when missing or empty)"""
+    entries = {}
+    try:
+        with os.scandir(folder) as it:
+            for item in it:
+                if item.name.lower().endswith(".csv") and item.is_file():
+                    stat = item.stat()
+                    entries[item.name] = {"mtime": stat.st_mtime, "size": stat.st_size}
+    except OSError:
+        return ""
+    return memmap_store.manifest_fingerprint(entries) if entries else ""
+
+
+class DatasetVersions:
+    """Per-folder versions, re-checked at most every poll_s seconds, with change listeners."""
+
+    def __init__(self, poll_s=VERSION_POLL_S):
+        self.poll_s = poll_s
+        self._versions = {}  # (cleaned_dir, year, session_type) -> (version, checked_at)
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def get(self, cleaned_dir, year, session_type):
+        """Current version of one year/session folder"""
+        key = (cleaned_dir, int(year), session_type)
+        with self._lock:
+            known = self._versions.get(key)
+        if known is not None and time.monotonic() - known[1] < self.poll_s:
+            return known[0]
+        return self._check([key])[0][key]
+
+    def check(self):
+        """Re-check every folder seen so far; returns the (year, session_type) pairs that changed"""
+        with self._lock:
+            keys = list(self._versions)
+        return [(year, session_type) for year, session_type, _, _ in self._check(keys)[1]]
+
+    def _check(self, keys):
+        """Recompute versions; returns ({key: version}, changes) after notifying the listeners"""
+        versions, changed = {}, []
+        for key in keys:
+            version = folder_version(os.path.join(key[0], str(key[1]), key[2]))
+            with self._lock:
+                known = self._versions.get(key)
+                self._versions[key] = (version, time.monotonic())
+            if known is not None and known[0] != version:
+                changed.append((key[1], key[2], known[0], version))
+            versions[key] = version
+        if changed:
+            with self._lock:
+                listeners = list(self._listeners)
+            for listener in listeners:
+                listener(changed)
+        return versions, changed
+
+    def add_change_listener(self, callback):
+        """Call callback([(year, session_type, old_version, new_version), ...]) on every change"""
+        with self._lock:
+            if callback not in self._listeners:
+                self._listeners.append(callback)
+
+    def start_watcher(self, interval_s=None):
+        """Poll the known folders on a daemon thread (no-op if already running)"""
+        interval_s = self.poll_s if interval_s is None else interval_s
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return self
+            self._thread = threading.Thread(target=self._watch, args=(interval_s,), name=THREAD_NAME, daemon=True)
+            self._thread.start()
+        return self
+
+    def _watch(self, interval_s):
+        while True:
+            time.sleep(interval_s)
+            try:
+                self.check()
+            except Exception:
+                logger.exception("dataset watcher failed")
+
+
+DATASET_VERSIONS = DatasetVersions()
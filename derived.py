@@ -0,0 +1,171 @@
+"""Derived telemetry signals computed once at ingest time.
+
+derive_signals() adds these columns to cleaned car_data, fully vectorized
+per driver/race/session (rows sorted by date):
+
+- accel_ms2: longitudinal acceleration (m/s^2) from speed/date differences,
+  empty at the first row and across gaps longer than MAX_GAP_S
+- brake_start / brake_end: 1 on the first/last row of a braking zone
+  (consecutive rows with brake > 0)
+- brake_zone_s: duration of the zone a braking row belongs to, 0 otherwise
+- gear_shift: +1 on an upshift, -1 on a downshift, 0 otherwise
+- full_throttle_frac: share of the row's lap spent at >= FULL_THROTTLE %
+- lap: the file's own lap column, moved here; when it has none, estimated
+  from integrated distance and the circuit length
+  (alignment.CIRCUIT_LENGTHS_M), empty when the circuit is unknown
+
+Every file ends with the same columns in the order of OUTPUT_COLUMNS, so
+cleaned files, annual outputs and the stores built from them share one
+header; a signal whose source column is missing is left empty.
+
+ingest.py and openf1_fetcher.py run it on every cleaned file they write;
+this CLI backfills existing folders and refreshes their stores.
+
+Usage:
+    python derived.py               # every year/session
+    python derived.py 2024 race     # one folder
+    python derived.py --force       # recompute files that already have the columns
+"""
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+import alignment
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+CLEANED_DIR = os.path.join(ROOT_DIR, "f1_cleaned_data")
+
+GROUP_COLUMNS = ["driver_name", "race", "session_key"]
+DERIVED_COLUMNS = ["accel_ms2", "brake_start", "brake_end", "brake_zone_s", "gear_shift", "full_throttle_frac"]
+OUTPUT_COLUMNS = ["accel_ms2", "brake_start", "brake_end", "brake_zone_s", "gear_shift", "lap", "full_throttle_frac"]
+FULL_THROTTLE = 98
+MAX_GAP_S = 2.0
+
+
+def _run_bounds(active, starts, gaps):
+    """(start mask, end mask) of runs of `active` rows, split at group starts and gaps"""
+    breaks = starts | gaps
+    prev = np.concatenate(([False], active[:-1]))
+    run_start = active & (breaks | ~prev)
+    nxt_break = np.concatenate((breaks[1:], [True]))
+    nxt = np.concatenate((active[1:], [False]))
+    run_end = active & (nxt_break | ~nxt)
+    return run_start, run_end
+
+
+def derive_signals(df):
+    """Return df sorted by group/date and ending with OUTPUT_COLUMNS (NaN where they can't be computed)"""
+    add_lap = "lap" not in df.columns
+    derived = {}
+    if not df.empty and "date" in df.columns:
+        df = _compute_signals(df, derived, add_lap)
+    if not add_lap:
+        derived["lap"] = df["lap"]
+    df = df.drop(columns=[c for c in OUTPUT_COLUMNS if c in df.columns])
+    for col in OUTPUT_COLUMNS:
+        if col == "lap":
+            df[col] = derived.get(col, pd.array([pd.NA] * len(df), dtype="Int64"))
+        else:
+            df[col] = derived.get(col, np.float32(np.nan))
+    return df
+
+
+def _compute_signals(df, derived, add_lap):
+    """Sort df by group/date and fill `derived` with the signals its columns allow"""
+    group_cols = [c for c in GROUP_COLUMNS if c in df.columns]
+    df = df.sort_values(group_cols + ["date"], kind="stable", ignore_index=True)
+    dates = pd.to_datetime(df["date"].astype(str), errors="coerce", utc=True, format="ISO8601")
+    seconds = (dates - dates.min()).dt.total_seconds().to_numpy()
+    keys = [pd.factorize(df[c])[0] for c in group_cols] or [np.zeros(len(df), dtype=np.int64)]
+    starts = alignment.segment_starts(*keys)
+
+    dt = np.diff(seconds, prepend=np.nan)
+    gaps = ~((dt > 0) & (dt <= MAX_GAP_S)) & ~starts
+
+    if "speed" in df.columns:
+        v = pd.to_numeric(df["speed"], errors="coerce").to_numpy(np.float64) / 3.6
+        # Repeated timestamps (dt == 0) are gap rows: leave them NaN instead of dividing by zero
+        accel = np.divide(np.diff(v, prepend=np.nan), dt, out=np.full(len(dt), np.nan), where=dt > 0)
+        accel[starts | gaps] = np.nan
+        derived["accel_ms2"] = np.round(accel, 3).astype(np.float32)
+
+    if "brake" in df.columns:
+        braking = pd.to_numeric(df["brake"], errors="coerce").fillna(0).to_numpy() > 0
+        zone_start, zone_end = _run_bounds(braking, starts, gaps)
+        first, last = np.flatnonzero(zone_start), np.flatnonzero(zone_end)
+        durations = seconds[last] - seconds[first]
+        zone = np.cumsum(zone_start) - 1
+        zone_s = np.where(braking & (zone >= 0), durations[np.clip(zone, 0, None)] if len(first) else 0.0, 0.0)
+        derived["brake_start"] = zone_start.astype(np.int8)
+        derived["brake_end"] = zone_end.astype(np.int8)
+        derived["brake_zone_s"] = np.round(zone_s, 3).astype(np.float32)
+
+    if "n_gear" in df.columns:
+        gear = pd.to_numeric(df["n_gear"], errors="coerce").to_numpy(np.float64)
+        shift = np.sign(np.diff(gear, prepend=np.nan))
+        shift[starts | ~np.isfinite(shift)] = 0
+        derived["gear_shift"] = shift.astype(np.int8)
+
+    if add_lap and "speed" in df.columns and "race" in df.columns:
+        lap_length = df["race"].map(alignment.circuit_length).to_numpy(dtype=np.float64)
+        if np.isfinite(lap_length).any():
+            distance = alignment.integrate_distance(seconds, df["speed"].to_numpy(np.float64), starts)
+            laps = np.floor(distance / lap_length) + 1
+            derived["lap"] = pd.array(np.where(np.isfinite(laps), laps, np.nan), dtype="Int64")
+
+    if "throttle" in df.columns:
+        full = (pd.to_numeric(df["throttle"], errors="coerce").to_numpy() >= FULL_THROTTLE).astype(np.float64)
+        lap = derived.get("lap") if add_lap else df["lap"]
+        lap_key = lap.fillna(-1).to_numpy(np.int64) if lap is not None else np.zeros(len(df), np.int64)
+        seg_first = np.flatnonzero(starts | alignment.segment_starts(lap_key))
+        counts = np.diff(np.append(seg_first, len(df)))
+        frac = np.add.reduceat(full, seg_first) / counts
+        derived["full_throttle_frac"] = np.round(np.repeat(frac, counts), 4).astype(np.float32)
+    return df
+
+
+def derive_file(path, force=False):
+    """Add derived columns to one cleaned CSV in place; returns True if rewritten"""
+    df = pd.read_csv(path)
+    if not force and all(c in df.columns for c in OUTPUT_COLUMNS):
+        return False
+    df = derive_signals(df.drop(columns=[c for c in DERIVED_COLUMNS if c in df.columns]))
+    tmp = path + ".tmp"
+    df.to_csv(tmp, index=False)
+    os.replace(tmp, path)
+    return True
+
+
+def derive_folder(year, session_type, cleaned_dir=CLEANED_DIR, force=False):
+    """Backfill one year/session folder; returns the number of files rewritten"""
+    folder = os.path.join(cleaned_dir, str(year), session_type)
+    if not os.path.isdir(folder):
+        return 0
+    rewritten = 0
+    for fname in sorted(os.listdir(folder)):
+        if not fname.lower().endswith(".csv"):
+            continue
+        try:
+            rewritten += derive_file(os.path.join(folder, fname), force)
+        except Exception as e:
+            print(f"failed {fname}: {e}")
+    return rewritten
+
+
+if __name__ == "__main__":
+    import ingest
+
+    args = sys.argv[1:]
+    force = "--force" in args
+    args = [a for a in args if a != "--force"]
+    years = args[:1] or (sorted(n for n in os.listdir(CLEANED_DIR) if n.isdigit())
+                         if os.path.isdir(CLEANED_DIR) else [])
+    for year in years:
+        year_dir = os.path.join(CLEANED_DIR, str(year))
+        for session_type in args[1:2] or (sorted(os.listdir(year_dir)) if os.path.isdir(year_dir) else []):
+            rewritten = derive_folder(year, session_type, force=force)
+            if rewritten:
+                ingest.refresh_folder(str(year), session_type)
+            print(f"{year} {session_type}: {rewritten} file(s) updated")
@@ -0,0 +1,54 @@
+"""Process-wide cache of rendered Plotly figures.
+
+Every rerun rebuilds each chart with px.*, even when its input has not
+changed. Chart helpers decorated with @cached_figure store the figure's
+JSON in a FrameCache keyed by (helper, data_key, arguments), so a rerun
+over the same data deserializes the figure instead of grouping, sampling
+and building it again:
+
+    @cached_figure
+    def create_speed_rpm_scatter(df, title="Speed vs RPM", max_points=5000): ...
+
+    fig = create_speed_rpm_scatter(df_driver, data_key=frame_key(df_driver))
+
+`data_key` names the input frame by where it came from instead of by its
+content: utils.query() records its arguments and the dataset version of
+the folders it read in df.attrs (utils.frame_key), which is free to look
+up, while hashing a full season costs as much as drawing it. Only pass
+it for a frame exactly as returned; without a data_key (derived or
+modified frames) the chart is built uncached. The budget is
+F1_FIGURE_CACHE_MB (default 256).
+"""
+import functools
+import os
+
+import plotly.io as pio
+
+from frame_cache import FrameCache, _freeze, note_lookup
+
+FIGURE_BUDGET_BYTES = int(float(os.environ.get("F1_FIGURE_CACHE_MB", 256)) * 1024**2)
+FIGURE_TTL = None  # keys carry the dataset version, so entries never go stale
+
+FIGURE_CACHE = FrameCache(FIGURE_BUDGET_BYTES)
+
+
+def cached_figure(func):
+    """Cache a chart helper's figure as JSON when called with a `data_key` for its DataFrame"""
+
+    @functools.wraps(func)
+    def wrapper(df, *args, data_key=None, **kwargs):
+        if data_key is None:
+            return func(df, *args, **kwargs)
+        key = (func.__module__, func.__qualname__, data_key, _freeze(args), _freeze(kwargs))
+        built = []
+
+        def render():
+            built.append(func(df, *args, **kwargs))
+            return built[0].to_json()
+
+        payload = FIGURE_CACHE.get_or_load(key, render, ttl=FIGURE_TTL)
+        note_lookup("miss" if built else "hit")
+        return built[0] if built else pio.from_json(payload)
+
+    wrapper.clear = lambda: FIGURE_CACHE.invalidate(lambda k: k[:2] == (func.__module__, func.__qualname__))
+    return wrapper
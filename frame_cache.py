@@ -0,0 +1,189 @@
+"""Process-wide, memory-budgeted cache for loaded DataFrames.
+
+`st.cache_data` pickles every result and hands each caller its own copy,
+so N sessions looking at the same season hold N copies of it. Frames
+cached here are stored once per process and shared by every session:
+
+    @shared_frame_cache
+    def load_data(year, session_type, columns=None): ...
+
+Entries are evicted least-recently-used once the total `memory_usage`
+exceeds the budget (F1_CACHE_BUDGET_MB, default 2048), or after `ttl`
+seconds when one is given (by default entries do not expire; utils keys
+its loaders on the dataset version instead, see utils.versioned). Callers get a shallow copy, so adding/replacing columns never
+leaks into the shared frame, but cached frames must not be modified in
+place (e.g. `df.loc[...] = ...`). Every lookup is reported as 'hit' or
+'miss' to the listeners added with add_lookup_listener(); performance_monitor
+records it on the span that is running.
+figure_cache.py keeps rendered charts in a second FrameCache.
+"""
+import functools
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+DEFAULT_BUDGET_BYTES = int(float(os.environ.get("F1_CACHE_BUDGET_MB", 2048)) * 1024**2)
+DEFAULT_TTL = None
+
+
+def frame_nbytes(value):
+    """Approximate in-memory size of a cached value"""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(index=True, deep=True))
+    if isinstance(value, (str, bytes)):
+        return len(value)
+    nbytes = getattr(value, "nbytes", None)
+    return int(nbytes) if nbytes is not None else 0
+
+
+def _freeze(value):
+    """Turn call arguments into a hashable cache key"""
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, set):
+        return tuple(sorted(_freeze(v) for v in value))
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    return value
+
+
+class FrameCache:
+    """LRU cache with byte-size accounting and hit/miss/eviction counters."""
+
+    def __init__(self, budget_bytes=DEFAULT_BUDGET_BYTES):
+        self.budget_bytes = budget_bytes
+        self._entries = OrderedDict()  # key -> (value, nbytes, expires_at)
+        self._inflight = {}
+        self._listeners = []
+        self._lock = threading.Lock()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or (entry[2] is not None and entry[2] < time.monotonic()):
+                if entry is not None:
+                    self._drop(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, ttl=None):
+        nbytes = frame_nbytes(value)
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            if nbytes > self.budget_bytes:
+                return value
+            self._entries[key] = (value, nbytes, expires_at)
+            self.nbytes += nbytes
+            while self.nbytes > self.budget_bytes and self._entries:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+        return value
+
+    def get_or_load(self, key, loader, ttl=None):
+        """Return the cached value, loading it once even under concurrent misses"""
+        value = self.get(key)
+        if value is not None:
+            return value
+        with self._lock:
+            key_lock = self._inflight.setdefault(key, threading.Lock())
+        with key_lock:
+            with self._lock:
+                entry = self._entries.get(key)
+            if entry is not None:
+                return entry[0]
+            try:
+                return self.put(key, loader(), ttl=ttl)
+            finally:
+                with self._lock:
+                    self._inflight.pop(key, None)
+
+    def invalidate(self, predicate=None):
+        """Drop every entry, or those whose key matches predicate(key)"""
+        with self._lock:
+            for key in [k for k in self._entries if predicate is None or predicate(k)]:
+                self._drop(key)
+            listeners = list(self._listeners)
+        for listener in listeners:
+            listener()
+
+    def add_invalidation_listener(self, callback):
+        """Call callback() after every invalidate() (e.g. to re-warm the cache)"""
+        with self._lock:
+            if callback not in self._listeners:
+                self._listeners.append(callback)
+
+    def _drop(self, key):
+        _, nbytes, _ = self._entries.pop(key)
+        self.nbytes -= nbytes
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.nbytes,
+                "budget_bytes": self.budget_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+FRAME_CACHE = FrameCache()
+
+_lookup_listeners = []
+
+
+def add_lookup_listener(callback):
+    """Call callback('hit'/'miss') on the calling thread after every cached lookup"""
+    if callback not in _lookup_listeners:
+        _lookup_listeners.append(callback)
+
+
+def note_lookup(result):
+    """Report one cached lookup's 'hit'/'miss' to the lookup listeners"""
+    for listener in list(_lookup_listeners):
+        listener(result)
+
+
+def shared_frame_cache(func=None, *, cache=None, ttl=DEFAULT_TTL):
+    """Cache a loader's result in the shared FrameCache
+
+    The wrapped function keeps `.clear()` (like st.cache_data) and
+    `__wrapped__` for uncached calls.
+    """
+    if func is None:
+        return functools.partial(shared_frame_cache, cache=cache, ttl=ttl)
+    cache = cache or FRAME_CACHE
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        key = (func.__module__, func.__qualname__, _freeze(args), _freeze(kwargs))
+        loaded = []
+
+        def load():
+            loaded.append(True)
+            return func(*args, **kwargs)
+
+        value = cache.get_or_load(key, load, ttl=ttl)
+        note_lookup("miss" if loaded else "hit")
+        return value.copy(deep=False) if isinstance(value, pd.DataFrame) else value
+
+    def clear():
+        cache.invalidate(lambda k: k[:2] == (func.__module__, func.__qualname__))
+
+    wrapper.clear = clear
+    return wrapper
@@ -0,0 +1,313 @@
+"""Incremental raw -> cleaned -> annual ingestion pipeline.
+
+Importable version of the cleaning and annual-merge cells of
+data_scraping/Collab/Data_scraping.ipynb:
+
+1. Raw OpenF1 car_data CSVs in f1_data/ are cleaned in bounded-memory
+   chunks (one vectorized bounds mask per chunk, duplicates dropped across
+   chunks) and written to f1_cleaned_data/<year>/<session>/, then derived
+   signals (acceleration, braking zones, gear shifts, ...; see derived.py)
+   are added to each cleaned file.
+2. Cleaned rows are appended to f1_annual_data/f1_<year>_<session>.csv.
+3. Manifests, rollups, sketches, the memmap store and (when pyarrow is
+   installed) the columnar store are refreshed for every folder that changed.
+
+Only raw files that are new or changed since the last run (by mtime and
+size, or content hash with --hash) are processed, fanned out over a
+process pool.
+
+Usage:
+    python ingest.py
+    python ingest.py --raw path/to/f1_data --workers 4 --hash
+"""
+import argparse
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import columnar_store
+import derived
+import manifest
+import memmap_store
+import rollups
+import sketches
+import sql_store
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+RAW_DIR = os.path.join(ROOT_DIR, "f1_data")
+CLEANED_DIR = os.path.join(ROOT_DIR, "f1_cleaned_data")
+ANNUAL_DIR = os.path.join(ROOT_DIR, "f1_annual_data")
+COLUMNAR_DIR = os.path.join(ROOT_DIR, "f1_columnar_data")
+MEMMAP_DIR = os.path.join(ROOT_DIR, "f1_memmap_data")
+SQL_DIR = os.path.join(ROOT_DIR, "f1_sql_data")
+
+STATE_NAME = "_ingest_state.json"
+CHUNKSIZE = 200_000
+
+NUMERIC_COLUMNS = ["speed", "throttle", "rpm", "n_gear"]
+BOUNDS = {
+    "speed": (0, 400),
+    "throttle": (0, 100),
+    "rpm": (0, 20000),
+    "n_gear": (-1, 8),
+}
+
+
+def file_fingerprint(path, use_hash=False):
+    """Change marker for a raw file: mtime/size, or a content hash"""
+    stat = os.stat(path)
+    fingerprint = {"mtime": stat.st_mtime, "size": stat.st_size}
+    if use_hash:
+        digest = hashlib.sha1()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        fingerprint = {"size": stat.st_size, "sha1": digest.hexdigest()}
+    return fingerprint
+
+
+def load_state(raw_dir):
+    try:
+        with open(os.path.join(raw_dir, STATE_NAME), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_state(raw_dir, state):
+    path = os.path.join(raw_dir, STATE_NAME)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=1, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+
+def load_race_map(race_info_path):
+    """session_key -> session name ('Race'/'Sprint') from the race info CSV"""
+    if not race_info_path or not os.path.exists(race_info_path):
+        return {}
+    race_info = pd.read_csv(race_info_path)
+    return dict(zip(race_info["session_key"], race_info["session_name"]))
+
+
+def _name_parts(file_name):
+    """(year, session name) from '<year>_<race>_<Race|Sprint>_<key>_<driver>.csv'"""
+    parts = os.path.splitext(file_name)[0].split("_")
+    year = parts[0] if parts and parts[0].isdigit() else None
+    session_name = next((p for p in parts if p in ("Race", "Sprint")), None)
+    return year, session_name
+
+
+def clean_chunk(df):
+    """Coerce numeric columns and apply every bounds rule with one mask"""
+    mask = np.ones(len(df), dtype=bool)
+    for col in NUMERIC_COLUMNS:
+        if col not in df.columns:
+            continue
+        values = pd.to_numeric(df[col], errors="coerce")
+        df[col] = values
+        low, high = BOUNDS[col]
+        mask &= (values >= low).to_numpy() & (values <= high).to_numpy()
+    present = [c for c in NUMERIC_COLUMNS if c in df.columns]
+    mask &= df[present].notna().all(axis=1).to_numpy()
+    return df[mask]
+
+
+def clean_file(raw_path, cleaned_dir=CLEANED_DIR, race_map=None, chunksize=CHUNKSIZE):
+    """Clean one raw CSV in chunks; returns (output path, rows written)"""
+    file_name = os.path.basename(raw_path)
+    name_year, name_session = _name_parts(file_name)
+    seen = np.empty(0, dtype=np.uint64)
+    out_path = tmp_path = None
+    rows = 0
+
+    for chunk in pd.read_csv(raw_path, chunksize=chunksize):
+        # Exact duplicates, also across chunk boundaries
+        hashes = pd.util.hash_pandas_object(chunk, index=False).to_numpy()
+        keep = ~pd.Series(hashes).duplicated().to_numpy() & ~np.isin(hashes, seen)
+        seen = np.union1d(seen, hashes[keep])
+        chunk = clean_chunk(chunk[keep])
+
+        if out_path is None:
+            if chunk.empty:
+                continue
+            session_key = chunk["session_key"].iloc[0] if "session_key" in chunk.columns else None
+            session_name = (race_map or {}).get(session_key) or name_session or "Unknown"
+            year = str(chunk["year"].iloc[0]) if "year" in chunk.columns else name_year
+            save_dir = os.path.join(cleaned_dir, str(year), session_name.lower())
+            os.makedirs(save_dir, exist_ok=True)
+            out_path = os.path.join(save_dir, file_name)
+            tmp_path = out_path + ".tmp"
+            chunk.to_csv(tmp_path, index=False)
+        else:
+            chunk.to_csv(tmp_path, mode="a", header=False, index=False)
+        rows += len(chunk)
+
+    if out_path is None:
+        return None, 0
+    os.replace(tmp_path, out_path)
+    return out_path, rows
+
+
+def _clean_job(args):
+    raw_path, cleaned_dir, race_map, chunksize = args
+    try:
+        out_path, rows = clean_file(raw_path, cleaned_dir, race_map, chunksize)
+        if out_path:
+            derived.derive_file(out_path, force=True)
+        return raw_path, out_path, rows, None
+    except Exception as e:
+        return raw_path, None, 0, str(e)
+
+
+def _annual_path(annual_dir, year, session_type):
+    return os.path.join(annual_dir, f"f1_{year}_{session_type}.csv")
+
+
+def _csv_columns(path):
+    """Header of a CSV without reading its rows"""
+    return list(pd.read_csv(path, nrows=0).columns)
+
+
+def _write_annual(cleaned_path, target, columns, chunksize=CHUNKSIZE):
+    """Append a cleaned file's rows to target in the given column order"""
+    for chunk in pd.read_csv(cleaned_path, chunksize=chunksize):
+        chunk.reindex(columns=columns).to_csv(target, mode="a", header=not os.path.exists(target), index=False)
+
+
+def append_annual(cleaned_path, annual_dir=ANNUAL_DIR, chunksize=CHUNKSIZE):
+    """Append one cleaned file to its f1_<year>_<session>.csv annual output.
+
+    Rows are written in the order of the annual file's header; a file with
+    columns the header lacks triggers a rebuild_annual instead."""
+    session_dir = os.path.dirname(cleaned_path)
+    session_type = os.path.basename(session_dir)
+    year = os.path.basename(os.path.dirname(session_dir))
+    os.makedirs(annual_dir, exist_ok=True)
+    target = _annual_path(annual_dir, year, session_type)
+    columns = _csv_columns(cleaned_path)
+    if os.path.exists(target):
+        header = _csv_columns(target)
+        if not set(columns) <= set(header):
+            return rebuild_annual(year, session_type, os.path.dirname(os.path.dirname(session_dir)), annual_dir,
+                                  chunksize)
+        columns = header
+    _write_annual(cleaned_path, target, columns, chunksize)
+    return target
+
+
+def rebuild_annual(year, session_type, cleaned_dir=CLEANED_DIR, annual_dir=ANNUAL_DIR, chunksize=CHUNKSIZE):
+    """Rewrite one annual output from its cleaned folder (after a file changed), with the
+    union of the files' columns"""
+    target = _annual_path(annual_dir, year, session_type)
+    folder = os.path.join(cleaned_dir, str(year), session_type)
+    paths = [os.path.join(folder, f) for f in sorted(os.listdir(folder)) if f.lower().endswith(".csv")]
+    columns = []
+    for path in paths:
+        columns += [c for c in _csv_columns(path) if c not in columns]
+    os.makedirs(annual_dir, exist_ok=True)
+    if os.path.exists(target):
+        os.remove(target)
+    for path in paths:
+        _write_annual(path, target, columns, chunksize)
+    return target
+
+
+def refresh_folder(year, session_type, cleaned_dir=CLEANED_DIR, columnar_dir=COLUMNAR_DIR,
+                   memmap_dir=MEMMAP_DIR, sql_dir=SQL_DIR):
+    """Bring a cleaned folder's manifest, columnar copy, rollups, sketches, memmap store and
+    (once built with sql_store.py) SQL store up to date"""
+    manifest.load_manifest(os.path.join(cleaned_dir, year, session_type))
+    if columnar_store.is_available():
+        columnar_store.convert_folder(year, session_type, cleaned_dir, columnar_dir)
+    rollups.load_rollups(year, session_type, cleaned_dir, columnar_dir)
+    sketches.load_sketches(year, session_type, cleaned_dir, columnar_dir)
+    memmap_store.build_season(year, session_type, cleaned_dir, columnar_dir, memmap_dir)
+    if os.path.exists(sql_store.db_path(sql_dir)):
+        sql_store.refresh_folder(year, session_type, cleaned_dir, columnar_dir, sql_dir)
+
+
+def ingest(raw_dir=RAW_DIR, cleaned_dir=CLEANED_DIR, annual_dir=ANNUAL_DIR, columnar_dir=COLUMNAR_DIR,
+           memmap_dir=MEMMAP_DIR, race_info_path=None, workers=None, chunksize=CHUNKSIZE, use_hash=False, annual=True):
+    """Process new/changed raw files; returns a summary dict"""
+    state = load_state(raw_dir)
+    race_map = load_race_map(race_info_path)
+
+    pending = []
+    for fname in sorted(os.listdir(raw_dir)):
+        if not fname.lower().endswith(".csv"):
+            continue
+        fingerprint = file_fingerprint(os.path.join(raw_dir, fname), use_hash)
+        old = state.get(fname, {})
+        if {k: old.get(k) for k in fingerprint} != fingerprint:
+            pending.append((fname, fingerprint))
+
+    summary = {"pending": len(pending), "cleaned": 0, "rows": 0, "failed": 0}
+    if not pending:
+        return summary
+
+    jobs = [(os.path.join(raw_dir, fname), cleaned_dir, race_map, chunksize) for fname, _ in pending]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(_clean_job, jobs))
+
+    touched = set()
+    rebuild = set()
+    for (fname, fingerprint), (raw_path, out_path, rows, error) in zip(pending, results):
+        if error:
+            print(f"error {fname}: {error}")
+            summary["failed"] += 1
+            continue
+        old = state.get(fname, {})
+        entry = dict(fingerprint)
+        if out_path:
+            session_dir = os.path.dirname(out_path)
+            key = (os.path.basename(os.path.dirname(session_dir)), os.path.basename(session_dir))
+            touched.add(key)
+            entry["output"] = os.path.relpath(out_path, cleaned_dir)
+            if annual:
+                if old.get("annual"):
+                    # Previously appended rows are now stale
+                    rebuild.add(key)
+                elif key not in rebuild:
+                    append_annual(out_path, annual_dir, chunksize)
+                entry["annual"] = True
+            summary["cleaned"] += 1
+            summary["rows"] += rows
+            print(f" done {fname} -> {entry['output']} ({rows} rows)")
+        state[fname] = entry
+
+    for year, session_type in sorted(rebuild):
+        rebuild_annual(year, session_type, cleaned_dir, annual_dir, chunksize)
+
+    for year, session_type in sorted(touched):
+        refresh_folder(year, session_type, cleaned_dir, columnar_dir, memmap_dir)
+
+    save_state(raw_dir, state)
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Incremental F1 telemetry ingestion")
+    parser.add_argument("--raw", default=RAW_DIR, help="folder with raw OpenF1 CSVs")
+    parser.add_argument("--cleaned", default=CLEANED_DIR)
+    parser.add_argument("--annual", default=ANNUAL_DIR)
+    parser.add_argument("--race-info", default=os.path.join(ROOT_DIR, "data_scraping", "f1_races_2023_2025.csv"),
+                        help="CSV mapping session_key -> session_name (optional)")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--chunksize", type=int, default=CHUNKSIZE)
+    parser.add_argument("--hash", action="store_true", help="detect changes by content hash")
+    parser.add_argument("--no-annual", action="store_true", help="skip f1_annual_data outputs")
+    args = parser.parse_args(argv)
+
+    summary = ingest(args.raw, args.cleaned, args.annual, race_info_path=args.race_info,
+                     workers=args.workers, chunksize=args.chunksize, use_hash=args.hash,
+                     annual=not args.no_annual)
+    print(f"{summary['pending']} new/changed, {summary['cleaned']} cleaned "
+          f"({summary['rows']:,} rows), {summary['failed']} failed")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,9 @@
 import streamlit as st
 import plotly.express as px
 from utils import *
+from performance_monitor import add_performance_metrics
+from warmup import warm_around
+import rollups
 
 st.set_page_config(
     page_title="F1 Performance Overview",
@@ -8,13 +11,16 @@ st.set_page_config(
     layout="wide"
 )
 
+perf = add_performance_metrics()
+
 st.sidebar.header("F1 Data Control Panel")
 year = st.sidebar.selectbox("Select Year", get_available_years())
 session_type = st.sidebar.radio("Session Type", ["race", "sprint"])
+warm_around(year, session_type)
 
-df = load_data(year, session_type)
+rollup = get_rollups(year, session_type)
 
-if df.empty:
+if rollup.empty:
     st.error("❌ No data available")
     st.stop()
 
@@ -22,24 +28,27 @@ all_drivers = get_available_drivers(year, session_type)
 selected_driver = st.sidebar.selectbox("Select Driver (optional)", ["All"] + all_drivers)
 
 if selected_driver != "All":
-    df = df[df['driver_name'] == selected_driver]
+    rollup = rollup[rollup['driver_name'] == selected_driver]
+
+driver_stats = rollups.summarize(rollup, 'driver_name')
 
 st.title(f"🏎️ F1 {year} {session_type.capitalize()} Performance Overview")
 
 col1, col2, col3 = st.columns(3)
 with col1:
-    if 'race' in df.columns:
-        n_races = df['race'].nunique()
+    races = rollup.loc[~rollups.is_missing(rollup['race']), 'race']
+    if not races.empty:
+        n_races = races.nunique()
         st.metric("Total Races/Sprints", f"{n_races:,}")
     else:
         st.metric("Total Sessions", "1")
 
 with col2:
-    n_drivers = df['driver_name'].nunique()
+    n_drivers = rollup['driver_name'].nunique()
     st.metric("Total Drivers", f"{n_drivers:,}")
 
 with col3:
-    n_datapoints = len(df)
+    n_datapoints = int(rollup['rows'].sum())
     st.metric("Total Data Points", f"{n_datapoints:,}")
 
 st.divider()
@@ -48,12 +57,12 @@ col1, col2 = st.columns(2)
 
 with col1:
     st.subheader("📈 Average Speed per Driver")
-    fig = create_average_speed_bar(df)
+    fig = create_average_speed_bar(driver_stats.rename(columns={'speed_mean': 'speed'}))
     st.plotly_chart(fig, width='stretch')
 
 with col2:
     st.subheader("⚙️ Average RPM per Driver")
-    avg_rpm = df.groupby('driver_name')['rpm'].mean().reset_index()
+    avg_rpm = driver_stats[['driver_name', 'rpm_mean']].rename(columns={'rpm_mean': 'rpm'})
     fig = px.bar(avg_rpm,
                 x='driver_name',
                 y='rpm',
@@ -62,8 +71,10 @@ with col2:
     st.plotly_chart(fig, width='stretch')
 
 st.subheader("🏁 Top Speed per Race")
-if 'race' in df.columns:
-    top_speeds = df.groupby(['race', 'driver_name'])['speed'].max().reset_index()
+if not races.empty:
+    top_speeds = rollups.summarize(rollup[~rollups.is_missing(rollup['race'])],
+                                   ['race', 'driver_name'], metrics=['speed'])
+    top_speeds = top_speeds[['race', 'driver_name', 'speed_max']].rename(columns={'speed_max': 'speed'})
     fig = px.bar(top_speeds, 
                 x='race', 
                 y='speed', 
@@ -78,7 +89,7 @@ st.subheader("⏱️ Throttle & Brake Usage")
 col1, col2 = st.columns(2)
 
 with col1:
-    avg_throttle = df.groupby('driver_name')['throttle'].mean().reset_index()
+    avg_throttle = driver_stats[['driver_name', 'throttle_mean']].rename(columns={'throttle_mean': 'throttle'})
     fig = px.bar(avg_throttle, 
                 x='driver_name', 
                 y='throttle',
@@ -87,10 +98,12 @@ with col1:
     st.plotly_chart(fig, width='stretch')
 
 with col2:
-    avg_brake = df.groupby('driver_name')['brake'].mean().reset_index()
+    avg_brake = driver_stats[['driver_name', 'brake_mean']].rename(columns={'brake_mean': 'brake'})
     fig = px.bar(avg_brake, 
                 x='driver_name', 
                 y='brake',
                 title="Average Brake Usage per Driver",
                 color='driver_name')
-    st.plotly_chart(fig, width='stretch')
\ No newline at end of file
+    st.plotly_chart(fig, width='stretch')
+
+perf.display_sidebar()
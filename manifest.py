@@ -0,0 +1,149 @@
+"""Per-folder dataset manifest for f1_cleaned_data.
+
+Each f1_cleaned_data/<year>/<session>/ folder gets a `_manifest.json`
+sidecar describing every CSV in it (driver, race, session_key, row count,
+columns, speed/rpm/date/lap ranges, mtime and size). The manifest is
+refreshed incrementally: only files whose mtime or size changed are
+re-read, and entries for deleted files are dropped. Files that cannot be
+read are logged and listed under "failed" (with their mtime, size and
+error), so they are retried only once they change.
+
+Usage:
+    python manifest.py               # refresh every year/session
+    python manifest.py 2024 race     # refresh one folder
+"""
+import json
+import logging
+import os
+import sys
+
+import pandas as pd
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+CLEANED_DIR = os.path.join(ROOT_DIR, "f1_cleaned_data")
+
+MANIFEST_NAME = "_manifest.json"
+MANIFEST_VERSION = 2
+KEY_COLUMNS = ("driver_name", "race", "session_key")
+RANGE_COLUMNS = ("speed", "rpm", "date", "lap")
+
+logger = logging.getLogger(__name__)
+
+
+def _first_value(df, col):
+    if col not in df.columns or df.empty:
+        return None
+    value = df[col].iloc[0]
+    if pd.isna(value):
+        return None
+    return value.item() if hasattr(value, "item") else value
+
+
+def _range(series, col):
+    if col == "date":
+        series = pd.to_datetime(series.astype(str), errors="coerce", utc=True, format="ISO8601")
+        series = series.dropna()
+        if series.empty:
+            return None, None
+        return series.min().isoformat(), series.max().isoformat()
+    series = pd.to_numeric(series, errors="coerce").dropna()
+    if series.empty:
+        return None, None
+    return float(series.min()), float(series.max())
+
+
+def describe_file(path):
+    """Build the manifest entry for one CSV"""
+    stat = os.stat(path)
+    columns = pd.read_csv(path, nrows=0).columns.tolist()
+    wanted = [c for c in KEY_COLUMNS + RANGE_COLUMNS if c in columns]
+    df = pd.read_csv(path, usecols=wanted) if wanted else pd.read_csv(path, usecols=columns[:1])
+
+    entry = {
+        "mtime": stat.st_mtime,
+        "size": stat.st_size,
+        "rows": int(len(df)),
+        "columns": columns,
+    }
+    for col in KEY_COLUMNS:
+        value = _first_value(df, col)
+        entry[col] = str(value) if value is not None and col != "session_key" else value
+    for col in RANGE_COLUMNS:
+        low, high = _range(df[col], col) if col in df.columns else (None, None)
+        entry[f"{col}_min"] = low
+        entry[f"{col}_max"] = high
+    return entry
+
+
+def _read(manifest_path):
+    """(files, failed) recorded in a manifest"""
+    try:
+        with open(manifest_path, encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}, {}
+    if data.get("version") != MANIFEST_VERSION:
+        return {}, {}
+    return data.get("files", {}), data.get("failed", {})
+
+
+def _write(manifest_path, files, failed):
+    tmp_path = manifest_path + ".tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": MANIFEST_VERSION, "files": files, "failed": failed}, f,
+                      indent=1, sort_keys=True)
+        os.replace(tmp_path, manifest_path)
+    except OSError:
+        # Read-only data folders still get an in-memory manifest
+        pass
+
+
+def load_manifest(folder):
+    """Return {csv filename: entry} for a folder, refreshing stale entries"""
+    if not os.path.isdir(folder):
+        return {}
+    manifest_path = os.path.join(folder, MANIFEST_NAME)
+    old, old_failed = _read(manifest_path)
+    files, failed = {}, {}
+    changed = False
+
+    with os.scandir(folder) as it:
+        for item in it:
+            if not item.name.lower().endswith(".csv") or not item.is_file():
+                continue
+            stat = item.stat()
+            entry = old.get(item.name)
+            if entry and entry.get("mtime") == stat.st_mtime and entry.get("size") == stat.st_size:
+                files[item.name] = entry
+                continue
+            error = old_failed.get(item.name)
+            if error and error.get("mtime") == stat.st_mtime and error.get("size") == stat.st_size:
+                failed[item.name] = error
+                continue
+            changed = True
+            try:
+                files[item.name] = describe_file(item.path)
+            except (OSError, ValueError) as e:
+                logger.warning("skipping unreadable file %s: %s", item.path, e)
+                failed[item.name] = {"mtime": stat.st_mtime, "size": stat.st_size, "error": str(e)}
+
+    if changed or set(old) != set(files) or set(old_failed) != set(failed):
+        _write(manifest_path, files, failed)
+    return files
+
+
+def refresh_all(cleaned_dir=CLEANED_DIR, years=None, sessions=None):
+    if years is None:
+        years = sorted(n for n in os.listdir(cleaned_dir) if n.isdigit()) if os.path.isdir(cleaned_dir) else []
+    for year in years:
+        year_dir = os.path.join(cleaned_dir, str(year))
+        year_sessions = sessions or (sorted(os.listdir(year_dir)) if os.path.isdir(year_dir) else [])
+        for session_type in year_sessions:
+            files = load_manifest(os.path.join(year_dir, session_type))
+            print(f"{year} {session_type}: {len(files)} files")
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    refresh_all(years=args[:1] or None, sessions=args[1:2] or None)
@@ -0,0 +1,317 @@
+"""Memory-mapped NumPy column store for zero-copy telemetry access.
+
+Each season is laid out as f1_memmap_data/<year>/<session>/ with:
+
+- one `<column>.npy` per column (compact dtypes; `date` as int64 ns UTC,
+  string columns as integer codes plus `<column>.categories.json`),
+- `offsets.csv`: start/stop row of every (driver_name, race) block, the
+  rows being sorted by driver, race and date (a driver's races in
+  chronological order, so each driver's rows are sorted by date),
+- `_file.npy` / `_file.categories.json`: the source file of every row
+  (not a telemetry column, so readers never see it),
+- `meta.json`: row count, dtypes, layout version, the manifest
+  fingerprint the store was built from and each file's mtime/size.
+
+Rebuilds are incremental: rows of unchanged files are taken from the
+existing memmap, and only new or changed files are read and parsed.
+
+Readers open the columns with np.load(mmap_mode='r'), so every Streamlit
+worker process shares the same pages through the OS cache. Slicing one
+driver (or driver/race) out of a season is a view, not a scan, and a time
+window is a binary search on `date` inside each selected block.
+
+Usage:
+    python memmap_store.py               # build every year/session
+    python memmap_store.py 2024 race     # build one folder
+"""
+import hashlib
+import json
+import os
+import shutil
+import sys
+
+import numpy as np
+import pandas as pd
+
+import columnar_store
+import manifest
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+CLEANED_DIR = os.path.join(ROOT_DIR, "f1_cleaned_data")
+COLUMNAR_DIR = os.path.join(ROOT_DIR, "f1_columnar_data")
+MEMMAP_DIR = os.path.join(ROOT_DIR, "f1_memmap_data")
+
+SORT_COLUMNS = ["driver_name", "race", "date"]
+LAYOUT_VERSION = 3
+FILE_COLUMN = "_file"
+COLUMN_DTYPES = {
+    "speed": "float32",
+    "throttle": "float32",
+    "brake": "float32",
+    "rpm": "int16",
+    "n_gear": "int8",
+    "lap": "int16",
+    "accel_ms2": "float32",
+    "brake_start": "int8",
+    "brake_end": "int8",
+    "brake_zone_s": "float32",
+    "gear_shift": "int8",
+    "full_throttle_frac": "float32",
+}
+
+
+def manifest_fingerprint(entries):
+    """Stable hash of a folder manifest's file names, mtimes and sizes"""
+    digest = hashlib.sha1()
+    for fname in sorted(entries):
+        entry = entries[fname]
+        digest.update(f"{fname}:{entry['mtime']}:{entry['size']};".encode())
+    return digest.hexdigest()
+
+
+def _parse_dates(series):
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series.dt.tz_convert("UTC") if series.dt.tz is not None else series.dt.tz_localize("UTC")
+    return pd.to_datetime(series.astype(str), errors="coerce", utc=True, format="ISO8601")
+
+
+def _read_files(year, session_type, fnames, cleaned_dir, columnar_dir):
+    """Concatenated rows of some files of a folder, tagged with FILE_COLUMN"""
+    folder = os.path.join(cleaned_dir, str(year), session_type)
+    fnames = sorted(fnames)
+    paths = [os.path.join(folder, fname) for fname in fnames]
+    sources = columnar_store.resolve_sources(paths, os.path.join(columnar_dir, str(year), session_type))
+    dfs = []
+    for fname, path in zip(fnames, sources):
+        try:
+            df = columnar_store.read_parquet(path) if path.endswith(".parquet") else pd.read_csv(path)
+        except Exception:
+            continue
+        dfs.append(df.assign(**{FILE_COLUMN: fname}))
+    df = pd.concat(dfs, ignore_index=True) if dfs else pd.DataFrame()
+    if "date" in df.columns:
+        df["date"] = _parse_dates(df["date"])
+    return df
+
+
+def _kept_rows(season, files):
+    """All columns of the rows of an existing store that came from `files`"""
+    codes, names = season.array(FILE_COLUMN), season.categories(FILE_COLUMN)
+    keep = np.flatnonzero(np.isin(codes, [i for i, f in enumerate(names) if f in files]))
+    df = season.frame().take(keep).reset_index(drop=True)
+    df[FILE_COLUMN] = np.asarray(names, dtype=object)[codes[keep]]
+    return df
+
+
+def _column_array(series, col):
+    """(array to store, categories or None) for one column"""
+    if col == "date":
+        dates = _parse_dates(series)
+        return dates.dt.tz_convert(None).to_numpy(dtype="datetime64[ns]").view(np.int64), None
+    if col in COLUMN_DTYPES:
+        values = pd.to_numeric(series, errors="coerce")
+        if COLUMN_DTYPES[col].startswith("int") and values.isna().any():
+            return values.to_numpy(dtype="float32"), None
+        return values.to_numpy(dtype=COLUMN_DTYPES[col]), None
+    if pd.api.types.is_numeric_dtype(series):
+        return pd.to_numeric(series, downcast="integer" if pd.api.types.is_integer_dtype(series)
+                             else "float").to_numpy(), None
+    codes, categories = pd.factorize(series.astype("string"), sort=True)
+    code_dtype = np.int16 if len(categories) < np.iinfo(np.int16).max else np.int32
+    return codes.astype(code_dtype), [str(c) for c in categories]
+
+
+def build_season(year, session_type, cleaned_dir=CLEANED_DIR, columnar_dir=COLUMNAR_DIR,
+                 memmap_dir=MEMMAP_DIR, force=False):
+    """(Re)build one year/session store; returns the row count, or None if unchanged/empty
+
+    Only files that are new or whose mtime/size changed since the last
+    build are read; the other rows are copied from the existing store.
+    """
+    entries = manifest.load_manifest(os.path.join(cleaned_dir, str(year), session_type))
+    target = os.path.join(memmap_dir, str(year), session_type)
+    fingerprint = manifest_fingerprint(entries)
+    meta = read_meta(target)
+    current = meta.get("layout") == LAYOUT_VERSION
+    if not entries or (not force and current and meta.get("fingerprint") == fingerprint):
+        return None
+
+    stamps = {fname: [e["mtime"], e["size"]] for fname, e in entries.items()}
+    built = meta.get("files", {}) if current and not force else {}
+    kept = {fname for fname, stamp in built.items() if stamps.get(fname) == stamp}
+    parts = [_kept_rows(MemmapSeason(target), kept)] if kept else []
+    parts.append(_read_files(year, session_type, set(entries) - kept, cleaned_dir, columnar_dir))
+    parts = [part for part in parts if not part.empty]
+    if not parts:
+        return None
+    df = parts[0] if len(parts) == 1 else pd.concat(parts, ignore_index=True)
+    sort_by = [c for c in SORT_COLUMNS if c in df.columns]
+    if "race" in sort_by and "date" in df.columns:
+        # Within a driver, order races by their start so the driver's rows are date-sorted
+        df["_race_start"] = df.groupby("race", dropna=False)["date"].transform("min")
+        sort_by.insert(sort_by.index("race"), "_race_start")
+    if sort_by:
+        # Missing dates first: as int64 they are the smallest value, keeping `date` sorted per block
+        df = df.sort_values(sort_by, kind="stable", ignore_index=True, na_position="first")
+        df = df.drop(columns="_race_start", errors="ignore")
+
+    tmp = target + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    dtypes = {}
+    for col in df.columns:
+        values, categories = _column_array(df[col], col)
+        np.save(os.path.join(tmp, f"{col}.npy"), values)
+        if col != FILE_COLUMN:
+            dtypes[col] = "category" if categories is not None else ("date" if col == "date" else str(values.dtype))
+        if categories is not None:
+            with open(os.path.join(tmp, f"{col}.categories.json"), "w", encoding="utf-8") as f:
+                json.dump(categories, f)
+
+    keys = [c for c in ("driver_name", "race") if c in df.columns]
+    if keys:
+        blocks = df.groupby(keys, sort=False, dropna=False).size().reset_index(name="rows")
+        blocks["stop"] = blocks["rows"].cumsum()
+        blocks["start"] = blocks["stop"] - blocks["rows"]
+        blocks[keys + ["start", "stop"]].to_csv(os.path.join(tmp, "offsets.csv"), index=False)
+
+    with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({"rows": len(df), "dtypes": dtypes, "fingerprint": fingerprint, "layout": LAYOUT_VERSION,
+                   "files": {fname: stamps[fname] for fname in df[FILE_COLUMN].unique()}}, f, indent=1)
+
+    shutil.rmtree(target, ignore_errors=True)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    os.replace(tmp, target)
+    return len(df)
+
+
+def read_meta(folder):
+    try:
+        with open(os.path.join(folder, "meta.json"), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _utc_dates(int_ns):
+    """tz-aware UTC datetimes over int64 nanoseconds, without copying when possible"""
+    naive = int_ns.view("datetime64[ns]")
+    try:
+        return pd.arrays.DatetimeArray._simple_new(naive, dtype=pd.DatetimeTZDtype("ns", "UTC"))
+    except (AttributeError, TypeError):
+        return pd.Series(naive, copy=False).dt.tz_localize("UTC").array
+
+
+class MemmapSeason:
+    """Read-only, memory-mapped view of one year/session."""
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.meta = read_meta(folder)
+        self.rows = self.meta.get("rows", 0)
+        self.dtypes = self.meta.get("dtypes", {})
+        self._arrays = {}
+        self._categories = {}
+        offsets_path = os.path.join(folder, "offsets.csv")
+        self.offsets = pd.read_csv(offsets_path) if os.path.exists(offsets_path) else pd.DataFrame()
+
+    @property
+    def columns(self):
+        return list(self.dtypes)
+
+    def array(self, col):
+        """The raw memory-mapped array of a column (codes for categoricals)"""
+        if col not in self._arrays:
+            self._arrays[col] = np.load(os.path.join(self.folder, f"{col}.npy"), mmap_mode="r")
+        return self._arrays[col]
+
+    def categories(self, col):
+        if col not in self._categories:
+            with open(os.path.join(self.folder, f"{col}.categories.json"), encoding="utf-8") as f:
+                self._categories[col] = json.load(f)
+        return self._categories[col]
+
+    def _time_slice(self, start, stop, time_range):
+        """Narrow a block to rows within time_range by binary search on its sorted dates"""
+        dates = self.array("date")[start:stop]
+        low, high = time_range
+        if low is not None:
+            first = np.searchsorted(dates, pd.Timestamp(low).value, side="left")
+        else:  # skip missing dates: NaT is the smallest int64 and sorts first
+            first = np.searchsorted(dates, np.iinfo(np.int64).min, side="right")
+        last = np.searchsorted(dates, pd.Timestamp(high).value, side="right") if high is not None else len(dates)
+        return start + int(first), start + int(max(first, last))
+
+    def row_ranges(self, drivers=None, races=None, time_range=None):
+        """(start, stop) row blocks for the given drivers/races (None = all) and (start, end) time window"""
+        if self.offsets.empty or (not drivers and not races and not time_range):
+            blocks = [(0, self.rows)]
+        else:
+            table = self.offsets
+            if drivers and "driver_name" in table.columns:
+                table = table[table["driver_name"].astype(str).isin([str(d) for d in drivers])]
+            if races and "race" in table.columns:
+                table = table[table["race"].astype(str).isin([str(r) for r in races])]
+            blocks = list(zip(table["start"], table["stop"]))
+        if time_range and "date" in self.dtypes:
+            blocks = [self._time_slice(start, stop, time_range) for start, stop in blocks]
+        ranges = []
+        for start, stop in blocks:
+            if start == stop:
+                continue
+            if ranges and ranges[-1][1] == start:
+                ranges[-1] = (ranges[-1][0], stop)
+            else:
+                ranges.append((start, stop))
+        return ranges
+
+    def series(self, col, start=0, stop=None):
+        """One column over rows [start, stop) as a Series backed by the memmap"""
+        values = self.array(col)[start:stop]
+        kind = self.dtypes.get(col)
+        if kind == "category":
+            values = pd.Categorical.from_codes(values, categories=self.categories(col))
+        elif kind == "date":
+            values = _utc_dates(values)
+        return pd.Series(values, name=col, copy=False)
+
+    def frame(self, columns=None, drivers=None, races=None, time_range=None):
+        """DataFrame over the memmap; zero-copy when the selection is one contiguous block"""
+        columns = [c for c in (columns or self.columns) if c in self.dtypes]
+        ranges = self.row_ranges(drivers, races, time_range)
+        parts = []
+        for start, stop in ranges:
+            parts.append(pd.concat([self.series(c, start, stop) for c in columns], axis=1)
+                         if columns else pd.DataFrame(index=range(stop - start)))
+        if not parts:
+            return pd.DataFrame(columns=columns)
+        return parts[0] if len(parts) == 1 else pd.concat(parts, ignore_index=True)
+
+
+def open_season(year, session_type, memmap_dir=MEMMAP_DIR, fingerprint=None):
+    """MemmapSeason for a year/session, or None if missing or built from other files"""
+    folder = os.path.join(memmap_dir, str(year), session_type)
+    meta = read_meta(folder)
+    if not meta or meta.get("layout") != LAYOUT_VERSION:
+        return None
+    if fingerprint is not None and meta.get("fingerprint") != fingerprint:
+        return None
+    return MemmapSeason(folder)
+
+
+def build_all(cleaned_dir=CLEANED_DIR, memmap_dir=MEMMAP_DIR, years=None, sessions=None, force=False):
+    if years is None:
+        years = sorted(n for n in os.listdir(cleaned_dir) if n.isdigit()) if os.path.isdir(cleaned_dir) else []
+    for year in years:
+        year_dir = os.path.join(cleaned_dir, str(year))
+        year_sessions = sessions or (sorted(os.listdir(year_dir)) if os.path.isdir(year_dir) else [])
+        for session_type in year_sessions:
+            rows = build_season(year, session_type, cleaned_dir, memmap_dir=memmap_dir, force=force)
+            print(f"{year} {session_type}: " + (f"{rows:,} rows" if rows is not None else "up to date"))
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    force = "--force" in args
+    args = [a for a in args if a != "--force"]
+    build_all(years=args[:1] or None, sessions=args[1:2] or None, force=force)
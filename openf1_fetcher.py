@@ -0,0 +1,356 @@
+"""Async OpenF1 fetcher for car telemetry.
+
+Replaces the serial `requests.get` loop of Data_scraping.ipynb:
+
+- one pooled aiohttp session (keep-alive connections, bounded concurrency),
+- a token-bucket rate limiter so requests are paced *before* hitting 429,
+- retries with exponential backoff and jitter (honouring Retry-After),
+- an on-disk content-addressed cache of raw responses, so re-runs never
+  re-download a session/driver/car_data payload,
+- car_data responses are parsed one record at a time (iter_records) and
+  cleaned chunk by chunk (ingest.clean_chunk), so a driver's telemetry is
+  never held as one list of dicts, then written straight to f1_cleaned_data/<year>/<session>/ and given their
+  derived signal columns (derived.py).
+
+OpenF1 lists sprints as session_type "Race" with session_name "Sprint",
+so race-type sessions are fetched once and sorted into race/ and sprint/
+by session_name, as the notebook's race_map did.
+
+Requires aiohttp (in requirements.txt).
+
+Usage:
+    python openf1_fetcher.py --years 2024 2025 --sessions Race Sprint
+    python openf1_fetcher.py --base-url http://127.0.0.1:8765/v1 --no-cache   # openf1_stub.py
+"""
+import argparse
+import asyncio
+import hashlib
+import itertools
+import json
+import os
+import random
+import re
+import time
+from urllib.parse import urlencode
+
+import pandas as pd
+
+import derived
+import ingest
+
+try:
+    import aiohttp
+    import yarl
+except ImportError:  # optional dependency, only needed for scraping
+    aiohttp = None
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+CLEANED_DIR = os.path.join(ROOT_DIR, "f1_cleaned_data")
+CACHE_DIR = os.path.join(ROOT_DIR, "f1_data", "_http_cache")
+
+BASE_URL = "https://api.openf1.org/v1"
+RATE_PER_SECOND = 3.0
+BURST = 6
+CONCURRENCY = 8
+MAX_RETRIES = 5
+BASE_DELAY = 1.0
+CAR_DATA_CHUNK = 50_000
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+_WHITESPACE = re.compile(r"\s*")
+
+
+class TokenBucket:
+    """Async token bucket: `rate` tokens per second, up to `capacity` banked."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class ResponseCache:
+    """Content-addressed store of raw response bodies.
+
+    Bodies live in objects/<sha[:2]>/<sha256 of body>; urls/<sha256 of key>
+    points at the body hash, so identical payloads are stored once. Keys are
+    request paths relative to the API base ('/car_data?session_key=...'),
+    which lets openf1_stub.py replay a cache directory as fixtures.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR):
+        self.cache_dir = cache_dir
+
+    def _url_path(self, key):
+        return os.path.join(self.cache_dir, "urls", hashlib.sha256(key.encode()).hexdigest())
+
+    def _object_path(self, digest):
+        return os.path.join(self.cache_dir, "objects", digest[:2], digest)
+
+    def get(self, key):
+        try:
+            with open(self._url_path(key), encoding="utf-8") as f:
+                digest = f.read().strip()
+            with open(self._object_path(digest), "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def put(self, key, body):
+        digest = hashlib.sha256(body).hexdigest()
+        obj = self._object_path(digest)
+        if not os.path.exists(obj):
+            os.makedirs(os.path.dirname(obj), exist_ok=True)
+            with open(obj + ".tmp", "wb") as f:
+                f.write(body)
+            os.replace(obj + ".tmp", obj)
+        url_path = self._url_path(key)
+        os.makedirs(os.path.dirname(url_path), exist_ok=True)
+        with open(url_path, "w", encoding="utf-8") as f:
+            f.write(digest)
+        return digest
+
+
+def build_url(base_url, endpoint, params=None, filters=()):
+    """URL with encoded params plus raw OpenF1 filters such as 'speed>=100'"""
+    query = urlencode(params or {})
+    extra = "&".join(filters)
+    query = "&".join(q for q in (query, extra) if q)
+    return f"{base_url}/{endpoint}" + (f"?{query}" if query else "")
+
+
+class OpenF1Fetcher:
+    """Pooled, rate-limited, cached OpenF1 client. Use as an async context manager."""
+
+    def __init__(self, base_url=BASE_URL, rate=RATE_PER_SECOND, burst=BURST, concurrency=CONCURRENCY,
+                 max_retries=MAX_RETRIES, base_delay=BASE_DELAY, cache_dir=CACHE_DIR, use_cache=True):
+        if aiohttp is None:
+            raise RuntimeError("aiohttp is required for the OpenF1 fetcher (pip install aiohttp)")
+        self.base_url = base_url.rstrip("/")
+        self.bucket = TokenBucket(rate, burst)
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.cache = ResponseCache(cache_dir) if use_cache else None
+        self.session = None
+        self.stats = {"requests": 0, "cache_hits": 0, "retries": 0, "failures": 0}
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(limit=self.concurrency, keepalive_timeout=30)
+        self.session = aiohttp.ClientSession(connector=connector,
+                                             timeout=aiohttp.ClientTimeout(total=120))
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.session.close()
+
+    def _backoff(self, attempt, retry_after=None):
+        if retry_after:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+        return self.base_delay * 2 ** (attempt - 1) * random.uniform(0.5, 1.5)
+
+    async def get_raw(self, endpoint, params=None, filters=()):
+        """Response body bytes (from cache when available), or None on failure"""
+        key = build_url("", endpoint, params, filters)
+        url = self.base_url + key
+        if self.cache is not None:
+            body = self.cache.get(key)
+            if body is not None:
+                self.stats["cache_hits"] += 1
+                return body
+
+        for attempt in range(1, self.max_retries + 1):
+            await self.bucket.acquire()
+            retry_after = None
+            try:
+                async with self.semaphore:
+                    self.stats["requests"] += 1
+                    async with self.session.get(yarl.URL(url, encoded=True)) as res:
+                        body = await res.read()
+                        status = res.status
+                        retry_after = res.headers.get("Retry-After")
+                if status == 200 and b'"Too Many Requests"' not in body[:200]:
+                    if self.cache is not None:
+                        self.cache.put(key, body)
+                    return body
+                if status not in RETRY_STATUSES and status != 200:
+                    break
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                pass
+            if attempt < self.max_retries:
+                self.stats["retries"] += 1
+                await asyncio.sleep(self._backoff(attempt, retry_after))
+        self.stats["failures"] += 1
+        return None
+
+    async def get_json(self, endpoint, params=None, filters=()):
+        body = await self.get_raw(endpoint, params, filters)
+        if body is None:
+            return None
+        try:
+            return json.loads(body)
+        except ValueError:
+            return None
+
+    async def fetch_sessions(self, year, session_type="Race"):
+        data = await self.get_json("sessions", {"year": year, "session_type": session_type})
+        return data if isinstance(data, list) else []
+
+    async def fetch_drivers(self, session_key):
+        data = await self.get_json("drivers", {"session_key": session_key})
+        return data if isinstance(data, list) else []
+
+    async def fetch_car_data(self, session_key, driver_number, min_speed=100):
+        """Lazy iterator over the car_data records (see iter_records)"""
+        filters = (f"speed>={min_speed}",) if min_speed is not None else ()
+        body = await self.get_raw("car_data", {"session_key": session_key, "driver_number": driver_number},
+                                  filters)
+        return iter_records(body) if body is not None else iter(())
+
+
+def iter_records(body):
+    """Yield the objects of a JSON array body one at a time instead of json.loads-ing the whole list.
+
+    Anything other than an array (e.g. an OpenF1 error object) yields nothing;
+    a malformed array raises ValueError once the bad element is reached."""
+    text = body.decode("utf-8") if isinstance(body, bytes) else body
+    decoder = json.JSONDecoder()
+    pos = _WHITESPACE.match(text, 0).end()
+    if not text.startswith("[", pos):
+        return
+    pos = _WHITESPACE.match(text, pos + 1).end()
+    if text.startswith("]", pos):
+        return
+    while True:
+        item, pos = decoder.raw_decode(text, pos)
+        yield item
+        pos = _WHITESPACE.match(text, pos).end()
+        if text.startswith("]", pos):
+            return
+        if not text.startswith(",", pos):
+            raise ValueError(f"expected ',' or ']' at offset {pos}")
+        pos = _WHITESPACE.match(text, pos + 1).end()
+
+
+def write_cleaned(records, out_path, extra_columns, chunk_rows=CAR_DATA_CHUNK):
+    """Clean car_data records (any iterable) chunk by chunk into a cleaned CSV; returns rows written"""
+    rows = 0
+    tmp_path = out_path + ".tmp"
+    wrote_header = False
+    records = iter(records)
+    try:
+        while True:
+            batch = list(itertools.islice(records, chunk_rows))
+            if not batch:
+                break
+            chunk = pd.DataFrame.from_records(batch)
+            for col, value in extra_columns.items():
+                chunk[col] = value
+            chunk = ingest.clean_chunk(chunk.drop_duplicates())
+            if chunk.empty:
+                continue
+            if not wrote_header:
+                os.makedirs(os.path.dirname(out_path), exist_ok=True)
+            chunk.to_csv(tmp_path, mode="a" if wrote_header else "w", header=not wrote_header, index=False)
+            wrote_header = True
+            rows += len(chunk)
+    except Exception:
+        if wrote_header:
+            os.remove(tmp_path)
+        raise
+    if wrote_header:
+        os.replace(tmp_path, out_path)
+        derived.derive_file(out_path, force=True)
+    return rows
+
+
+async def _fetch_driver(fetcher, year, session, driver, cleaned_dir, overwrite):
+    session_key = session.get("session_key")
+    race_name = str(session.get("circuit_short_name", "Unknown")).replace(" ", "_")
+    session_name = session.get("session_name", "Unknown")
+    driver_number = driver.get("driver_number")
+    driver_name = str(driver.get("full_name", "Unknown")).replace(" ", "_")
+    if not driver_number:
+        return 0
+
+    save_dir = os.path.join(cleaned_dir, str(year), session_name.lower())
+    out_path = os.path.join(save_dir, f"{year}_{race_name}_{session_name}_{session_key}_{driver_number}.csv")
+    if os.path.exists(out_path) and not overwrite:
+        return 0
+
+    records = await fetcher.fetch_car_data(session_key, driver_number)
+    # CPU-bound parsing and cleaning run off the event loop so downloads keep flowing
+    try:
+        rows = await asyncio.to_thread(write_cleaned, records, out_path, {
+            "year": year, "race": race_name, "driver_number": driver_number, "driver_name": driver_name,
+        })
+    except ValueError as e:
+        print(f"bad car data for {driver_name} ({session_key}): {e}")
+        return 0
+    if not rows:
+        print(f"no car data found for {driver_name} ({session_key})")
+        return 0
+    print(f"data {driver_name} {race_name} saved ({rows} rows)")
+    return rows
+
+
+async def fetch_season(fetcher, year, session_names=("Race", "Sprint"), cleaned_dir=CLEANED_DIR, overwrite=False):
+    """Fetch every race/sprint session and driver of a year into f1_cleaned_data; returns rows written"""
+    sessions = [s for s in await fetcher.fetch_sessions(year, "Race") if s.get("session_name") in session_names]
+    driver_lists = await asyncio.gather(*(fetcher.fetch_drivers(s.get("session_key")) for s in sessions))
+    tasks = [_fetch_driver(fetcher, year, session, driver, cleaned_dir, overwrite)
+             for session, drivers in zip(sessions, driver_lists)
+             for driver in drivers if isinstance(driver, dict)]
+    return sum(await asyncio.gather(*tasks))
+
+
+async def run(years, session_names=("Race", "Sprint"), cleaned_dir=CLEANED_DIR, overwrite=False, **fetcher_kwargs):
+    async with OpenF1Fetcher(**fetcher_kwargs) as fetcher:
+        total = 0
+        for year in years:
+            total += await fetch_season(fetcher, year, session_names, cleaned_dir, overwrite)
+        return total, fetcher.stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fetch OpenF1 car telemetry into f1_cleaned_data")
+    parser.add_argument("--years", type=int, nargs="+", default=[2023, 2024, 2025])
+    parser.add_argument("--sessions", "--session-types", dest="sessions", nargs="+", default=["Race", "Sprint"],
+                        help="session names (race-type sessions: Race, Sprint)")
+    parser.add_argument("--base-url", default=BASE_URL)
+    parser.add_argument("--cleaned", default=CLEANED_DIR)
+    parser.add_argument("--cache-dir", default=CACHE_DIR)
+    parser.add_argument("--no-cache", action="store_true")
+    parser.add_argument("--rate", type=float, default=RATE_PER_SECOND, help="requests per second")
+    parser.add_argument("--burst", type=int, default=BURST)
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY)
+    parser.add_argument("--overwrite", action="store_true", help="re-write existing cleaned files")
+    args = parser.parse_args(argv)
+
+    total, stats = asyncio.run(run(
+        args.years, args.sessions, args.cleaned, args.overwrite,
+        base_url=args.base_url, rate=args.rate, burst=args.burst, concurrency=args.concurrency,
+        cache_dir=args.cache_dir, use_cache=not args.no_cache,
+    ))
+    print(f"{total:,} rows written; {stats['requests']} requests, {stats['cache_hits']} cache hits, "
+          f"{stats['retries']} retries, {stats['failures']} failures")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Local OpenF1 stub server replaying recorded fixtures.
+
+Serves responses from a ResponseCache directory (as written by
+openf1_fetcher.py), so the fetcher can be exercised offline: record once
+against the real API, then point the fetcher at the stub.
+
+Usage:
+    python openf1_stub.py --fixtures f1_data/_http_cache --port 8765
+    python openf1_stub.py --fixtures fixtures/ --fail-every 5   # inject 429s
+
+Hand-written fixtures can be added with record_fixture().
+"""
+import argparse
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from openf1_fetcher import CACHE_DIR, ResponseCache
+
+API_PREFIX = "/v1"
+
+
+def record_fixture(fixtures_dir, path, payload):
+    """Store a JSON payload for a request path such as '/sessions?year=2024&session_type=Race'"""
+    return ResponseCache(fixtures_dir).put(path, json.dumps(payload).encode())
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.request_count += 1
+            throttle = server.fail_every and server.request_count % server.fail_every == 0
+        if throttle:
+            self._send(429, b'{"error": "Too Many Requests"}', {"Retry-After": "0"})
+            return
+        path = self.path[len(API_PREFIX):] if self.path.startswith(API_PREFIX) else self.path
+        body = server.fixtures.get(path)
+        if body is None:
+            self._send(404, b'{"detail": "No fixture"}')
+        else:
+            self._send(200, body)
+
+    def _send(self, status, body, headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class OpenF1StubServer(ThreadingHTTPServer):
+    """Threaded HTTP server; `base_url` is what to pass to OpenF1Fetcher."""
+
+    daemon_threads = True
+
+    def __init__(self, fixtures_dir=CACHE_DIR, host="127.0.0.1", port=0, fail_every=0):
+        super().__init__((host, port), _Handler)
+        self.fixtures = ResponseCache(fixtures_dir)
+        self.fail_every = fail_every
+        self.request_count = 0
+        self.lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}{API_PREFIX}"
+
+    def start(self):
+        """Serve in a background thread (for scripts and offline checks)"""
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay recorded OpenF1 responses")
+    parser.add_argument("--fixtures", default=CACHE_DIR)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--fail-every", type=int, default=0, help="answer every Nth request with 429")
+    args = parser.parse_args(argv)
+
+    server = OpenF1StubServer(args.fixtures, args.host, args.port, args.fail_every)
+    print(f"Serving fixtures from {args.fixtures} at {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
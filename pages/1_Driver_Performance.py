@@ -1,6 +1,8 @@
 import streamlit as st
 import plotly.express as px
 from utils import *
+from performance_monitor import add_performance_metrics
+from warmup import warm_around
 
 st.set_page_config(
     page_title="Driver Performance Analysis",
@@ -8,9 +10,12 @@ st.set_page_config(
     layout="wide"
 )
 
+perf = add_performance_metrics()
+
 st.sidebar.header("Driver Analysis Controls")
 year = st.sidebar.selectbox("Choose Year", get_available_years())
 session_type = st.sidebar.radio("Session Type", ["race", "sprint"])
+warm_around(year, session_type)
 
 available_drivers = get_available_drivers(year, session_type)
 if not available_drivers:
@@ -19,7 +24,7 @@ if not available_drivers:
 
 selected_driver = st.sidebar.selectbox("Select Driver", available_drivers)
 
-df_driver = load_data_filtered(year, session_type, driver_name=selected_driver)
+df_driver = query(year, session_type, columns=DRIVER_COLUMNS, drivers=selected_driver)
 
 if df_driver.empty:
     st.error("❌ No data available for this driver")
@@ -34,20 +39,20 @@ with col2:
 st.divider()
 
 st.subheader("📊 Speed vs RPM Analysis")
-fig = create_speed_rpm_scatter(df_driver)
+fig = create_speed_rpm_scatter(df_driver, data_key=frame_key(df_driver))
 st.plotly_chart(fig, width='stretch')
 
 st.subheader("🦶 Throttle vs Brake Analysis")
-fig = create_throttle_brake_map(df_driver)
+fig = create_throttle_brake_map(df_driver, data_key=frame_key(df_driver))
 st.plotly_chart(fig, width='stretch')
 
 st.subheader("⚙️ Gear Usage Distribution")
-fig = create_gear_distribution(df_driver)
+fig = create_gear_distribution(df_driver, data_key=frame_key(df_driver))
 st.plotly_chart(fig, width='stretch')
 
 if 'race' in df_driver.columns:
     st.subheader("🧭 Average Speed per Circuit")
-    avg_speed_circuit = df_driver.groupby('race')['speed'].mean().reset_index()
+    avg_speed_circuit = df_driver.groupby('race', observed=True)['speed'].mean().reset_index()
     avg_speed_circuit = avg_speed_circuit.sort_values('speed', ascending=False)
 
     fig = px.bar(avg_speed_circuit,
@@ -60,43 +65,22 @@ if 'race' in df_driver.columns:
 
 st.subheader("📉 Speed Over Time")
 
-col1, col2 = st.columns([4, 1])
-with col2:
-    if len(df_driver) > 2000:
-        show_sampled = st.checkbox("Use sampling", value=False, 
-                                   help="Sampling prevents browser freeze")
-    else:
-        show_sampled = True
-
-if 'lap' in df_driver.columns:
+has_laps = 'lap' in df_driver.columns and df_driver['lap'].notna().any()
+if has_laps:
     avg_speed_lap = df_driver.groupby('lap')['speed'].mean().reset_index()
-    fig = px.line(avg_speed_lap,
-                 x='lap',
-                 y='speed',
-                 title=f"Average Speed per Lap - {selected_driver}")
+    fig = create_line_chart(avg_speed_lap,
+                            x='lap',
+                            y='speed',
+                            title=f"Average Speed per Lap - {selected_driver}")
     st.plotly_chart(fig, width='stretch')
 else:
     if 'date' in df_driver.columns:
-        df_sorted = df_driver.sort_values('date')
-        
-        if show_sampled and len(df_sorted) > 2000:
-            max_points = 2000
-            step = len(df_sorted) // max_points
-            df_plot = df_sorted.iloc[::step]
-            title_suffix = f" (showing {len(df_plot):,} of {len(df_sorted):,} points)"
-        else:
-            df_plot = df_sorted
-            title_suffix = ""
-        
-        fig = px.line(df_plot,
-                     x='date',
-                     y='speed',
-                     title=f"Speed Over Time - {selected_driver}{title_suffix}")
+        fig = create_line_chart(df_driver,
+                                x='date',
+                                y='speed',
+                                title=f"Speed Over Time - {selected_driver}",
+                                data_key=frame_key(df_driver))
         st.plotly_chart(fig, width='stretch')
-        
-        if not show_sampled and len(df_sorted) > 5000:
-            st.warning("⚠️ Large dataset may be slow. Consider enabling sampling.")
-            st.warning("⚠️ Large dataset may be slow. Consider enabling sampling.")
 
 st.subheader("🎯 Driving Style Insights")
 col1, col2, col3 = st.columns(3)
@@ -112,3 +96,28 @@ with col2:
 with col3:
     avg_speed = df_driver['speed'].mean()
     st.metric("Average Speed", f"{avg_speed:.1f} km/h")
+
+derived_columns = {'accel_ms2', 'brake_start', 'gear_shift', 'full_throttle_frac'}
+if derived_columns.issubset(df_driver.columns) and has_laps:
+    laps = df_driver.groupby(['race', 'lap'], observed=True)
+    n_laps = max(laps.ngroups, 1)
+    col1, col2, col3, col4 = st.columns(4)
+
+    with col1:
+        full_throttle = laps['full_throttle_frac'].first().mean() * 100
+        st.metric("Full Throttle per Lap", f"{full_throttle:.1f}%")
+
+    with col2:
+        zones_per_lap = df_driver['brake_start'].sum() / n_laps
+        st.metric("Braking Zones per Lap", f"{zones_per_lap:.1f}")
+
+    with col3:
+        shifts_per_lap = (df_driver['gear_shift'] != 0).sum() / n_laps
+        st.metric("Gear Shifts per Lap", f"{shifts_per_lap:.1f}")
+
+    with col4:
+        peak_decel = -df_driver['accel_ms2'].min() / 9.81
+        st.metric("Peak Deceleration", f"{peak_decel:.1f} g")
+
+
+perf.display_sidebar(df_driver)
@@ -1,6 +1,8 @@
 import streamlit as st
 import plotly.express as px
 from utils import *
+from performance_monitor import add_performance_metrics
+from warmup import warm_around
 
 st.set_page_config(
     page_title="Car Performance Analysis",
@@ -8,12 +10,14 @@ st.set_page_config(
     layout="wide"
 )
 
+perf = add_performance_metrics()
+
 st.sidebar.header("Car Performance Controls")
 year = st.sidebar.selectbox("Select Year", get_available_years())
 session_type = st.sidebar.radio("Session Type", ["race", "sprint"])
+warm_around(year, session_type)
 
-needed_columns = ['driver_name', 'speed', 'rpm', 'n_gear', 'throttle', 'brake']
-df = load_data(year, session_type, columns=needed_columns)
+df = query(year, session_type, columns=CAR_COLUMNS)
 
 if df.empty:
     st.error("❌ No data available")
@@ -22,29 +26,30 @@ if df.empty:
 st.title(f"🧱 Car Performance Analysis - {year} {session_type.capitalize()}")
 
 st.subheader("📊 Engine RPM vs Speed Efficiency")
-fig = px.scatter(df, 
-                x="rpm", 
-                y="speed",
-                color="driver_name",
-                title="Engine Efficiency Curve",
-                labels={"rpm": "Engine RPM", "speed": "Speed (km/h)"})
+fig = create_density_heatmap(df,
+                             x="rpm",
+                             y="speed",
+                             by="driver_name",
+                             title="Engine Efficiency Curve",
+                             labels={"rpm": "Engine RPM", "speed": "Speed (km/h)"},
+                             data_key=frame_key(df))
 st.plotly_chart(fig, width='stretch')
 
 st.subheader("⚙️ Gear Shift Patterns")
 col1, col2 = st.columns(2)
 
 with col1:
-    avg_speed_gear = df.groupby(['driver_name', 'n_gear'])['speed'].mean().reset_index()
-    fig = px.line(avg_speed_gear,
-                  x='n_gear',
-                  y='speed',
-                  color='driver_name',
-                  title="Average Speed per Gear",
-                  labels={'n_gear': 'Gear', 'speed': 'Average Speed (km/h)'})
+    avg_speed_gear = df.groupby(['driver_name', 'n_gear'], observed=True)['speed'].mean().reset_index()
+    fig = create_line_chart(avg_speed_gear,
+                            x='n_gear',
+                            y='speed',
+                            color='driver_name',
+                            title="Average Speed per Gear",
+                            labels={'n_gear': 'Gear', 'speed': 'Average Speed (km/h)'})
     st.plotly_chart(fig, width='stretch')
 
 with col2:
-    gear_dist = df.groupby(['driver_name', 'n_gear']).size().reset_index(name='count')
+    gear_dist = df.groupby(['driver_name', 'n_gear'], observed=True).size().reset_index(name='count')
     fig = px.bar(gear_dist,
                  x='n_gear',
                  y='count',
@@ -54,7 +59,7 @@ with col2:
     st.plotly_chart(fig, width='stretch')
 
 st.subheader("🏎️ Top Speed Analysis")
-top_speeds = df.groupby('driver_name')['speed'].max().reset_index()
+top_speeds = df.groupby('driver_name', observed=True)['speed'].max().reset_index()
 top_speeds = top_speeds.sort_values('speed', ascending=False)
 
 fig = px.bar(top_speeds,
@@ -74,19 +79,20 @@ with col1:
         'driver_name': 'first'
     }).reset_index()
     
-    fig = px.scatter(avg_speed_throttle,
-                    x='throttle',
-                    y='speed',
-                    title="Speed vs Throttle Response",
-                    labels={'throttle': 'Throttle %', 'speed': 'Speed (km/h)'})
+    fig = create_scatter(avg_speed_throttle,
+                         x='throttle',
+                         y='speed',
+                         title="Speed vs Throttle Response",
+                         labels={'throttle': 'Throttle %', 'speed': 'Speed (km/h)'})
     st.plotly_chart(fig, width='stretch')
 
 with col2:
-    fig = px.histogram(df,
-                      x='rpm',
-                      color='driver_name',
-                      title="Engine RPM Distribution",
-                      labels={'rpm': 'Engine RPM'})
+    fig = create_binned_histogram(df,
+                                  x='rpm',
+                                  color='driver_name',
+                                  title="Engine RPM Distribution",
+                                  labels={'rpm': 'Engine RPM'},
+                                  data_key=frame_key(df))
     st.plotly_chart(fig, width='stretch')
 
 st.subheader("📊 Key Performance Metrics")
@@ -107,4 +113,6 @@ with col3:
 
 with col4:
     max_rpm = df['rpm'].max()
-    st.metric("Maximum RPM", f"{max_rpm:.0f}")
\ No newline at end of file
+    st.metric("Maximum RPM", f"{max_rpm:.0f}")
+
+perf.display_sidebar(df)
@@ -2,6 +2,9 @@ import streamlit as st
 import plotly.express as px
 import pandas as pd
 from utils import *
+from performance_monitor import add_performance_metrics, cache_data
+from warmup import start_warmup
+import rollups
 
 st.set_page_config(
     page_title="Race vs Sprint Comparison",
@@ -9,30 +12,40 @@ st.set_page_config(
     layout="wide"
 )
 
-st.title("📅 Race vs Sprint Comparison (2023-2025)")
+perf = add_performance_metrics()
+start_warmup()
 
-@st.cache_data(ttl=3600)
-def load_comparison_data():
-    comparison_data = []
-    
-    for year in [2023, 2024, 2025]:
-        for session_type in ['race', 'sprint']:
-            df = load_data(year, session_type, 
-                          columns=['speed', 'rpm', 'driver_name'])
-            if not df.empty:
-                comparison_data.append({
-                    'year': year,
-                    'session_type': session_type,
-                    'avg_speed': df['speed'].mean(),
-                    'max_speed': df['speed'].max(),
-                    'avg_rpm': df['rpm'].mean(),
-                    'data_points': len(df),
-                    'n_drivers': df['driver_name'].nunique()
-                })
-    
-    return pd.DataFrame(comparison_data)
-
-comp_df = load_comparison_data()
+available_years = get_available_years()
+years = st.sidebar.multiselect("Years", available_years, default=available_years)
+if not years:
+    st.warning("Select at least one year")
+    st.stop()
+years = sorted(years)
+year_label = f"{years[0]}-{years[-1]}" if len(years) > 1 else str(years[0])
+
+st.title(f"📅 Race vs Sprint Comparison ({year_label})")
+
+@versioned
+@cache_data(max_entries=CACHE_MAX_ENTRIES)
+def load_comparison_data(years, session_types, dataset_version=None):
+    rollup = get_rollups(years, session_types)
+    if rollup.empty:
+        return pd.DataFrame()
+
+    stats = rollups.summarize(rollup, ['year', 'session_type'], metrics=['speed', 'rpm'])
+    n_drivers = rollup.groupby(['year', 'session_type'])['driver_name'].nunique().reset_index(name='n_drivers')
+    stats = stats.merge(n_drivers, on=['year', 'session_type'])
+    return pd.DataFrame({
+        'year': stats['year'],
+        'session_type': stats['session_type'],
+        'avg_speed': stats['speed_mean'],
+        'max_speed': stats['speed_max'],
+        'avg_rpm': stats['rpm_mean'],
+        'data_points': stats['count'],
+        'n_drivers': stats['n_drivers'],
+    })
+
+comp_df = load_comparison_data(years, ['race', 'sprint'])
 
 if comp_df.empty:
     st.error("❌ No comparison data available")
@@ -72,58 +85,48 @@ fig = px.bar(comp_df,
 st.plotly_chart(fig, width='stretch')
 
 st.subheader("📉 Average RPM Evolution")
-fig = px.line(comp_df,
-             x='year',
-             y='avg_rpm',
-             color='session_type',
-             markers=True,
-             title="Average RPM Evolution (2023-2025)",
-             labels={'avg_rpm': 'Average RPM'})
+fig = create_line_chart(comp_df,
+                       x='year',
+                       y='avg_rpm',
+                       color='session_type',
+                       markers=True,
+                       title=f"Average RPM Evolution ({year_label})",
+                       labels={'avg_rpm': 'Average RPM'})
 st.plotly_chart(fig, width='stretch')
 
 st.subheader("🏎️ Driver Performance Evolution")
 
-available_drivers_sample = get_available_drivers(2023, 'race')
-if not available_drivers_sample:
+evolution = get_evolution_table(years, ['race', 'sprint'])
+drivers = sorted(evolution['driver_name'].dropna().unique()) if not evolution.empty else []
+if not drivers:
     st.warning("No driver data available")
     st.stop()
 
-selected_driver = st.selectbox("Select Driver for Analysis", available_drivers_sample)
+selected_driver = st.selectbox("Select Driver for Analysis", drivers)
 
-driver_data = []
-for year in [2023, 2024, 2025]:
-    for session_type in ['race', 'sprint']:
-        driver_df = load_data_filtered(year, session_type, driver_name=selected_driver)
-        if not driver_df.empty:
-            driver_data.append({
-                'year': year,
-                'session_type': session_type,
-                'avg_speed': driver_df['speed'].mean(),
-                'avg_throttle': driver_df['throttle'].mean(),
-                'avg_brake': driver_df['brake'].mean()
-            })
-
-driver_comp_df = pd.DataFrame(driver_data)
+driver_comp_df = driver_evolution(selected_driver, years, ['race', 'sprint'])
 
 if not driver_comp_df.empty:
     col1, col2 = st.columns(2)
     
     with col1:
-        fig = px.line(driver_comp_df,
-                     x='year',
-                     y='avg_speed',
-                     color='session_type',
-                     markers=True,
-                     title=f"{selected_driver}'s Average Speed Evolution",
-                     labels={'avg_speed': 'Average Speed (km/h)'})
+        fig = create_line_chart(driver_comp_df,
+                               x='year',
+                               y='avg_speed',
+                               color='session_type',
+                               markers=True,
+                               title=f"{selected_driver}'s Average Speed Evolution",
+                               labels={'avg_speed': 'Average Speed (km/h)'})
         st.plotly_chart(fig, width='stretch')
     
     with col2:
-        fig = px.line(driver_comp_df,
-                     x='year',
-                     y='avg_throttle',
-                     color='session_type',
-                     markers=True,
-                     title=f"{selected_driver}'s Throttle Usage Evolution",
-                     labels={'avg_throttle': 'Average Throttle %'})
-        st.plotly_chart(fig, width='stretch')
\ No newline at end of file
+        fig = create_line_chart(driver_comp_df,
+                               x='year',
+                               y='avg_throttle',
+                               color='session_type',
+                               markers=True,
+                               title=f"{selected_driver}'s Throttle Usage Evolution",
+                               labels={'avg_throttle': 'Average Throttle %'})
+        st.plotly_chart(fig, width='stretch')
+
+perf.display_sidebar(comp_df)
@@ -1,6 +1,8 @@
 import streamlit as st
 import plotly.express as px
 from utils import *
+from performance_monitor import add_performance_metrics
+from warmup import warm_around
 
 st.set_page_config(
     page_title="Circuit Analysis",
@@ -8,9 +10,12 @@ st.set_page_config(
     layout="wide"
 )
 
+perf = add_performance_metrics()
+
 st.sidebar.header("Circuit Analysis Controls")
 year = st.sidebar.selectbox("Select Year", get_available_years())
 session_type = st.sidebar.radio("Session Type", ["race", "sprint"])
+warm_around(year, session_type)
 
 circuits = get_available_circuits(year, session_type)
 if not circuits:
@@ -19,7 +24,7 @@ if not circuits:
 
 selected_circuit = st.sidebar.selectbox("Select Circuit", circuits)
 
-df_circuit = load_data_filtered(year, session_type, circuit=selected_circuit)
+df_circuit = query(year, session_type, columns=CIRCUIT_COLUMNS, circuits=selected_circuit)
 
 if df_circuit.empty:
     st.error("❌ No data available for this circuit")
@@ -28,29 +33,58 @@ if df_circuit.empty:
 st.title(f"🧩 Circuit Analysis: {selected_circuit}")
 
 st.subheader("📊 Speed Distribution")
-fig = px.histogram(df_circuit,
-                  x="speed",
-                  color="driver_name",
-                  nbins=50,
-                  title=f"Speed Distribution at {selected_circuit}")
+fig = create_binned_histogram(df_circuit,
+                              x="speed",
+                              color="driver_name",
+                              bins=50,
+                              title=f"Speed Distribution at {selected_circuit}",
+                              data_key=frame_key(df_circuit))
 st.plotly_chart(fig, width='stretch')
 
+st.subheader("🏁 Fastest Lap Overlay")
+circuit_drivers = sorted(df_circuit['driver_name'].dropna().unique())
+overlay_drivers = st.multiselect("Compare drivers", circuit_drivers, default=circuit_drivers[:2])
+laps_df = compare_fastest_laps(year, session_type, overlay_drivers, selected_circuit) if overlay_drivers else pd.DataFrame()
+
+if laps_df.empty:
+    st.info("No complete laps to compare for the selected drivers")
+else:
+    col1, col2 = st.columns(2)
+    with col1:
+        fig = create_line_chart(laps_df,
+                                x='distance',
+                                y='speed',
+                                color='driver_name',
+                                title="Speed over Fastest Lap",
+                                labels={'distance': 'Distance (m)', 'speed': 'Speed (km/h)'})
+        st.plotly_chart(fig, width='stretch')
+    with col2:
+        fig = create_line_chart(laps_df,
+                                x='distance',
+                                y='delta_s',
+                                color='driver_name',
+                                title=f"Gap to {overlay_drivers[0]}",
+                                labels={'distance': 'Distance (m)', 'delta_s': 'Delta (s)'})
+        st.plotly_chart(fig, width='stretch')
+
 st.subheader("⚙️ Gear vs Speed Analysis")
 col1, col2 = st.columns(2)
 
+gear_stats = aggregate(year, session_type, ['driver_name', 'n_gear'],
+                       {'speed': ('speed', 'mean'), 'count': ('*', 'count')}, circuits=selected_circuit,
+                       columns=CIRCUIT_COLUMNS)
+
 with col1:
-    avg_speed_gear = df_circuit.groupby(['driver_name', 'n_gear'])['speed'].mean().reset_index()
-    fig = px.line(avg_speed_gear,
-                  x='n_gear',
-                  y='speed',
-                  color='driver_name',
-                  title="Average Speed per Gear",
-                  labels={'n_gear': 'Gear', 'speed': 'Speed (km/h)'})
+    fig = create_line_chart(gear_stats,
+                            x='n_gear',
+                            y='speed',
+                            color='driver_name',
+                            title="Average Speed per Gear",
+                            labels={'n_gear': 'Gear', 'speed': 'Speed (km/h)'})
     st.plotly_chart(fig, width='stretch')
 
 with col2:
-    gear_dist = df_circuit.groupby(['driver_name', 'n_gear']).size().reset_index(name='count')
-    fig = px.bar(gear_dist,
+    fig = px.bar(gear_stats,
                  x='n_gear',
                  y='count',
                  color='driver_name',
@@ -59,21 +93,24 @@ with col2:
     st.plotly_chart(fig, width='stretch')
 
 st.subheader("🔄 RPM vs Throttle Pattern")
-fig = px.scatter(df_circuit.sample(min(len(df_circuit), 5000)),
-                x="rpm",
-                y="throttle",
-                color="driver_name",
-                opacity=0.6,
-                title="RPM vs Throttle Pattern")
+fig = create_density_heatmap(df_circuit,
+                             x="rpm",
+                             y="throttle",
+                             by="driver_name",
+                             title="RPM vs Throttle Pattern",
+                             data_key=frame_key(df_circuit))
 st.plotly_chart(fig, width='stretch')
 
 st.subheader("📊 Circuit Performance Metrics")
 
+driver_stats = aggregate(year, session_type, ['driver_name'],
+                         {m: (m, 'mean') for m in ('speed', 'throttle', 'brake')}, circuits=selected_circuit,
+                         columns=CIRCUIT_COLUMNS)
+
 col1, col2, col3 = st.columns(3)
 
 with col1:
-    avg_speed = df_circuit.groupby('driver_name')['speed'].mean().reset_index()
-    fig = px.bar(avg_speed.sort_values('speed', ascending=False),
+    fig = px.bar(driver_stats.sort_values('speed', ascending=False),
                  x='driver_name',
                  y='speed',
                  title="Average Speed per Driver",
@@ -81,8 +118,7 @@ with col1:
     st.plotly_chart(fig, width='stretch')
 
 with col2:
-    avg_throttle = df_circuit.groupby('driver_name')['throttle'].mean().reset_index()
-    fig = px.bar(avg_throttle.sort_values('throttle', ascending=False),
+    fig = px.bar(driver_stats.sort_values('throttle', ascending=False),
                  x='driver_name',
                  y='throttle',
                  title="Average Throttle Usage",
@@ -90,8 +126,7 @@ with col2:
     st.plotly_chart(fig, width='stretch')
 
 with col3:
-    avg_brake = df_circuit.groupby('driver_name')['brake'].mean().reset_index()
-    fig = px.bar(avg_brake.sort_values('brake', ascending=False),
+    fig = px.bar(driver_stats.sort_values('brake', ascending=False),
                  x='driver_name',
                  y='brake',
                  title="Average Brake Usage",
@@ -100,10 +135,13 @@ with col3:
 
 st.subheader("💡 Circuit Insights")
 
-avg_speed = df_circuit['speed'].mean()
-max_speed = df_circuit['speed'].max()
-avg_gear = df_circuit['n_gear'].mean()
-most_used_gear = df_circuit['n_gear'].mode().iloc[0]
+# Answered from the per-file sketches (see sketches.py) instead of scanning df_circuit
+sketch = get_sketch(year, session_type, circuits=selected_circuit)
+speed_stats = sketch.stats('speed')
+avg_speed = speed_stats['mean']
+max_speed = speed_stats['max']
+avg_gear = sketch.gear_mean()
+most_used_gear = sketch.gear_mode()
 
 col1, col2, col3, col4 = st.columns(4)
 
@@ -128,10 +166,12 @@ elif avg_speed < 150:
 else:
     characteristics.append("Balanced circuit")
 
-if df_circuit['brake'].mean() > 30:
+if sketch.stats('brake')['mean'] > 30:
     characteristics.append("Heavy braking zones")
 
-if df_circuit['n_gear'].nunique() > 6:
+if sketch.nunique('n_gear') > 6:
     characteristics.append("Various gear combinations")
 
-st.info("Circuit Characteristics: " + ", ".join(characteristics))
\ No newline at end of file
+st.info("Circuit Characteristics: " + ", ".join(characteristics))
+
+perf.display_sidebar(df_circuit)
@@ -1,77 +1,388 @@
-import streamlit as st
+"""Performance instrumentation for Streamlit apps.
+
+Loaders and chart builders are timed with nested spans (time.perf_counter):
+
+    @timed()
+    def load_data(...): ...
+
+    with span("lap table") as s:
+        table = build_table(df)
+        s.add(rows=len(table))
+
+A span records its wall time, rows/bytes of the frame it produced (or, for
+chart builders, the frame it was given) and the hits and misses of the
+cached lookups made while it was the innermost running span: shared frames
+and figures (frame_cache.note_lookup) and functions decorated with
+cache_data, a drop-in for st.cache_data. Spans go to the session's
+PerformanceMonitor, which add_performance_metrics() resets at the start of
+every rerun; outside Streamlit (CLIs, benchmark.py, warm-up threads) each
+thread gets its own monitor, which keeps only the last MAX_SPANS top-level
+spans.
+
+Every finished span is also aggregated process-wide in SPAN_STATS, across
+all sessions. Set F1_PERF_EXPORT to a file path to have p50/p95 per span
+written there (Prometheus text for *.prom, JSON lines otherwise) at most
+every F1_PERF_EXPORT_INTERVAL seconds (default 30).
+"""
+import functools
+import json
+import os
+import threading
 import time
+from collections import deque
+from contextlib import contextmanager
+
+import numpy as np
 import pandas as pd
+import streamlit as st
+
+import frame_cache
+from frame_cache import FRAME_CACHE
+
+try:
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+except ImportError:  # older/newer Streamlit layouts: fall back to per-thread monitors
+    get_script_run_ctx = None
+
+SPAN_WINDOW = 1000
+MAX_SPANS = 500
+EXPORT_PATH = os.environ.get("F1_PERF_EXPORT")
+EXPORT_INTERVAL = float(os.environ.get("F1_PERF_EXPORT_INTERVAL", 30))
+
+
+class Span:
+    """One timed section; children are the spans opened while it was running."""
+
+    __slots__ = ("name", "start", "duration", "rows", "nbytes", "hits", "misses", "children")
+
+    def __init__(self, name):
+        self.name = name
+        self.start = 0.0
+        self.duration = None
+        self.rows = 0
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.children = []
+
+    def add(self, rows=0, nbytes=0):
+        self.rows += rows
+        self.nbytes += nbytes
+
+    def note_lookup(self, result):
+        if result == "hit":
+            self.hits += 1
+        elif result == "miss":
+            self.misses += 1
+
+
+class SpanStats:
+    """Process-wide per-span aggregates; quantiles over the last `window` calls."""
+
+    def __init__(self, window=SPAN_WINDOW):
+        self.window = window
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._last_export = 0.0
+
+    def record(self, span):
+        with self._lock:
+            stats = self._stats.get(span.name)
+            if stats is None:
+                stats = self._stats[span.name] = {
+                    "durations": deque(maxlen=self.window), "count": 0, "total": 0.0,
+                    "rows": 0, "bytes": 0, "hits": 0, "misses": 0,
+                }
+            stats["durations"].append(span.duration)
+            stats["count"] += 1
+            stats["total"] += span.duration
+            stats["rows"] += span.rows
+            stats["bytes"] += span.nbytes
+            stats["hits"] += span.hits
+            stats["misses"] += span.misses
+
+    def summary(self):
+        """One dict per span name: count, p50/p95/mean seconds, rows, bytes, cache hits/misses"""
+        with self._lock:
+            items = [(name, dict(s, durations=list(s["durations"]))) for name, s in self._stats.items()]
+        rows = []
+        for name, s in sorted(items):
+            p50, p95 = np.percentile(s["durations"], [50, 95]) if s["durations"] else (0.0, 0.0)
+            rows.append({
+                "span": name, "count": s["count"], "p50_s": float(p50), "p95_s": float(p95),
+                "mean_s": s["total"] / s["count"] if s["count"] else 0.0, "sum_s": s["total"],
+                "rows": s["rows"], "bytes": s["bytes"], "cache_hits": s["hits"], "cache_misses": s["misses"],
+            })
+        return rows
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+    def export(self, path, fmt=None):
+        """Write the summary as Prometheus text ('prom') or append it as JSON lines ('jsonl')"""
+        fmt = fmt or ("prom" if path.endswith(".prom") else "jsonl")
+        summary = self.summary()
+        if fmt == "prom":
+            tmp = path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(_prometheus_text(summary))
+            os.replace(tmp, path)
+        else:
+            stamp = time.strftime("%Y-%m-%dT%H:%M:%S")
+            with open(path, "a", encoding="utf-8") as f:
+                for row in summary:
+                    f.write(json.dumps(dict(row, timestamp=stamp, pid=os.getpid())) + "\n")
+        self._last_export = time.monotonic()
+
+    def maybe_export(self, path=None, interval=None):
+        """Export to F1_PERF_EXPORT if set and the last export is older than the interval"""
+        path = path or EXPORT_PATH
+        interval = EXPORT_INTERVAL if interval is None else interval
+        if path and time.monotonic() - self._last_export >= interval:
+            self.export(path)
+
+
+def _prometheus_text(summary):
+    lines = [
+        "# HELP f1_span_duration_seconds Wall time per span (quantiles over recent calls).",
+        "# TYPE f1_span_duration_seconds summary",
+    ]
+    for row in summary:
+        label = 'span="%s"' % row["span"].replace("\\", "\\\\").replace('"', '\\"')
+        lines.append(f'f1_span_duration_seconds{{{label},quantile="0.5"}} {row["p50_s"]:.6f}')
+        lines.append(f'f1_span_duration_seconds{{{label},quantile="0.95"}} {row["p95_s"]:.6f}')
+        lines.append(f'f1_span_duration_seconds_sum{{{label}}} {row["sum_s"]:.6f}')
+        lines.append(f'f1_span_duration_seconds_count{{{label}}} {row["count"]}')
+        lines.append(f'f1_span_rows_total{{{label}}} {row["rows"]}')
+        lines.append(f'f1_span_bytes_total{{{label}}} {row["bytes"]}')
+        lines.append(f'f1_span_cache_total{{{label},result="hit"}} {row["cache_hits"]}')
+        lines.append(f'f1_span_cache_total{{{label},result="miss"}} {row["cache_misses"]}')
+    return "\n".join(lines) + "\n"
+
+
+SPAN_STATS = SpanStats()
 
 
 class PerformanceMonitor:
     """Simple performance monitoring for Streamlit apps."""
-    
+
     def __init__(self):
-        self.start_time = time.time()
+        self.reset()
+
+    def reset(self):
+        self.start_time = time.perf_counter()
         self.checkpoints = {}
-    
+        self.spans = deque(maxlen=MAX_SPANS)
+        self._stack = []
+
     def checkpoint(self, name):
-        elapsed = time.time() - self.start_time
+        elapsed = time.perf_counter() - self.start_time
         self.checkpoints[name] = elapsed
         return elapsed
-    
+
+    @contextmanager
+    def span(self, name, rows=0, nbytes=0):
+        s = Span(name)
+        s.add(rows, nbytes)
+        (self._stack[-1].children if self._stack else self.spans).append(s)
+        self._stack.append(s)
+        s.start = time.perf_counter()
+        try:
+            yield s
+        finally:
+            s.duration = time.perf_counter() - s.start
+            self._stack.pop()
+            SPAN_STATS.record(s)
+
+    def walk(self):
+        """(depth, span) for every finished span, depth-first"""
+        stack = [(0, s) for s in reversed(self.spans)]
+        while stack:
+            depth, s = stack.pop()
+            if s.duration is not None:
+                yield depth, s
+            stack.extend((depth + 1, c) for c in reversed(s.children))
+
     def display_sidebar(self, df=None):
         st.sidebar.markdown("---")
         st.sidebar.subheader("⚡ Performance")
-        
-        total_time = time.time() - self.start_time
+
+        total_time = time.perf_counter() - self.start_time
         st.sidebar.metric("Total Load Time", f"{total_time:.2f}s")
-        
+
         if df is not None and not df.empty:
             st.sidebar.metric("Data Points", f"{len(df):,}")
             memory_mb = df.memory_usage(deep=True).sum() / 1024**2
             st.sidebar.metric("Memory Usage", f"{memory_mb:.1f} MB")
-        
+            skipped = df.attrs.get('files_skipped', 0)
+            if skipped:
+                st.sidebar.warning(f"⚠️ Skipped {skipped} unreadable file(s)")
+
+        spans = list(self.walk())
+        if spans:
+            with st.sidebar.expander("⏱️ Spans"):
+                st.markdown("\n".join(_span_line(depth, s) for depth, s in spans))
+
         if self.checkpoints:
             with st.sidebar.expander("📊 Checkpoints"):
                 for name, elapsed in self.checkpoints.items():
                     st.write(f"**{name}:** {elapsed:.2f}s")
 
+        _cache_caption()
+        SPAN_STATS.maybe_export()
+
+
+def _span_line(depth, s):
+    parts = [f"{s.duration * 1000:.1f} ms"]
+    if s.rows:
+        parts.append(f"{s.rows:,} rows")
+    if s.nbytes:
+        parts.append(f"{s.nbytes / 1024**2:.1f} MB")
+    if s.hits or s.misses:
+        parts.append(f"cache {s.hits} hit / {s.misses} miss")
+    return "  " * depth + f"- **{s.name}**: " + " · ".join(parts)
+
+
+def _cache_caption():
+    cache = FRAME_CACHE.stats()
+    st.sidebar.caption(
+        f"🗄️ Shared cache: {cache['entries']} frames, "
+        f"{cache['bytes'] / 1024**2:.0f} / {cache['budget_bytes'] / 1024**2:.0f} MB, "
+        f"{cache['hits']} hits / {cache['misses']} misses / {cache['evictions']} evictions"
+    )
+
+
+_local = threading.local()
+
+
+def current_monitor():
+    """The running session's monitor, or this thread's one outside a Streamlit script run"""
+    if get_script_run_ctx is not None and get_script_run_ctx(suppress_warning=True) is not None:
+        if 'perf_monitor' not in st.session_state:
+            st.session_state.perf_monitor = PerformanceMonitor()
+        return st.session_state.perf_monitor
+    monitor = getattr(_local, "monitor", None)
+    if monitor is None:
+        monitor = _local.monitor = PerformanceMonitor()
+    return monitor
+
+
+def span(name, rows=0, nbytes=0):
+    """Context manager timing a section in the current monitor"""
+    return current_monitor().span(name, rows, nbytes)
+
+
+def _record_lookup(result):
+    """Count a cached lookup on the innermost running span of this thread's monitor"""
+    stack = current_monitor()._stack
+    if stack:
+        stack[-1].note_lookup(result)
+
+
+frame_cache.add_lookup_listener(_record_lookup)
+
+
+def _frame_size(value):
+    if isinstance(value, pd.DataFrame):
+        return len(value), int(value.memory_usage(index=False, deep=False).sum())
+    if isinstance(value, (pd.Series, np.ndarray)):
+        return len(value), int(value.nbytes)
+    return None
+
+
+def timed(name=None):
+    """Decorator opening a span around each call (named after the function by default)"""
+    if callable(name):
+        return timed()(name)
+
+    def decorate(func):
+        label = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(label) as s:
+                result = func(*args, **kwargs)
+                size = _frame_size(result) or (_frame_size(args[0]) if args else None)
+                if size:
+                    s.add(*size)
+            return result
+        return wrapper
+    return decorate
+
+
+def cache_data(**cache_kwargs):
+    """st.cache_data(**cache_kwargs) that reports each call's hit or miss to the running span"""
+
+    def decorate(func):
+        ran = threading.local()
+
+        @functools.wraps(func)
+        def compute(*args, **kwargs):
+            ran.miss = True
+            return func(*args, **kwargs)
+
+        cached = st.cache_data(**cache_kwargs)(compute)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            ran.miss = False
+            result = cached(*args, **kwargs)
+            frame_cache.note_lookup("miss" if ran.miss else "hit")
+            return result
+
+        wrapper.clear = cached.clear
+        return wrapper
+    return decorate
+
 
 def add_performance_metrics(df=None):
     """
     Quick helper to add performance metrics to sidebar.
-    
+
+    Returns the session's monitor, reset for this rerun, so call it once at
+    the top of the page.
+
     Usage:
         from performance_monitor import add_performance_metrics
-        
+
         # At start of page
         perf = add_performance_metrics()
-        
+
         # After loading data
         df = load_data(2023, 'race')
         perf.checkpoint("Data Loaded")
-        
+
         # At end of page
         perf.display_sidebar(df)
     """
-    if 'perf_monitor' not in st.session_state:
-        st.session_state.perf_monitor = PerformanceMonitor()
-    
-    return st.session_state.perf_monitor
+    monitor = current_monitor()
+    monitor.reset()
+    return monitor
 
 def show_perf_metrics_inline(df):
     """
     Inline version - just copy this to bottom of any page:
-    
+
     # At end of page
     show_perf_metrics_inline(df)
     """
     st.sidebar.markdown("---")
     st.sidebar.subheader("⚡ Performance")
-    
+
     if df is not None and not df.empty:
         st.sidebar.metric("Data Points", f"{len(df):,}")
         memory_mb = df.memory_usage(deep=True).sum() / 1024**2
         st.sidebar.metric("Memory Usage", f"{memory_mb:.1f} MB")
 
+        skipped = df.attrs.get('files_skipped', 0)
+        if skipped:
+            st.sidebar.warning(f"⚠️ Skipped {skipped} unreadable file(s)")
+
         original_rows = len(df)
         if 'sample_info' in st.session_state:
             sample_info = st.session_state.sample_info
             original_rows = sample_info.get('original_rows', len(df))
             st.sidebar.info(f"🎯 Using {len(df):,} / {original_rows:,} rows")
+
+    _cache_caption()
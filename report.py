@@ -0,0 +1,232 @@
+"""Headless batch reports: the Driver Performance and Circuit Analysis figures
+for every (year, session, driver/circuit), without Streamlit.
+
+Each report is written as a self-contained HTML page and/or a JSON bundle
+of Plotly figures under reports/<year>/<session>/<drivers|circuits>/.
+Work fans out over a process pool; tasks are ordered by season and every
+worker keeps the season it is working on loaded, so a season is read once
+per worker rather than once per report. A report is skipped when the
+manifest entries of its input files (name, mtime, size) match the
+fingerprint stored next to it, unless --force is given.
+
+Usage:
+    python report.py                                  # everything
+    python report.py --years 2024 --sessions race --kinds driver
+    python report.py --format json --workers 4 --out reports
+"""
+import argparse
+import hashlib
+import inspect
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+import plotly.express as px
+
+REPORT_VERSION = 1
+KINDS = {"driver": "drivers", "circuit": "circuits"}
+OUT_DIR = "reports"
+
+_season = {}  # per worker: {(year, session_type): frame}, at most one season
+
+
+def _utils(data_root=None):
+    """Import utils quietly, optionally pointed at another data root"""
+    import streamlit.logger
+    streamlit.logger.set_log_level("error")  # "No runtime found" warnings outside `streamlit run`
+    import utils
+    if data_root:
+        utils.CLEANED_DIR = os.path.join(data_root, "f1_cleaned_data")
+        utils.COLUMNAR_DIR = os.path.join(data_root, "f1_columnar_data")
+        utils.MEMMAP_DIR = os.path.join(data_root, "f1_memmap_data")
+    return utils
+
+
+def _slug(name):
+    return re.sub(r"[^\w.-]+", "_", str(name)).strip("_") or "unknown"
+
+
+def report_paths(out_dir, year, session_type, kind, name):
+    stem = os.path.join(out_dir, str(year), session_type, KINDS[kind], _slug(name))
+    return {"html": stem + ".html", "json": stem + ".json", "meta": stem + ".meta.json"}
+
+
+def input_fingerprint(entries, kind, name):
+    """Hash of the manifest entries a report reads, plus the report version"""
+    key = "driver_name" if kind == "driver" else "race"
+    digest = hashlib.sha1(f"v{REPORT_VERSION}:{kind}:{name};".encode())
+    for fname in sorted(entries):
+        entry = entries[fname]
+        if entry.get(key) is None or str(entry.get(key)) == str(name):
+            digest.update(f"{fname}:{entry['mtime']}:{entry['size']};".encode())
+    return digest.hexdigest()
+
+
+def is_current(paths, fingerprint, formats):
+    try:
+        with open(paths["meta"], encoding="utf-8") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return False
+    return meta.get("fingerprint") == fingerprint and all(os.path.exists(paths[fmt]) for fmt in formats)
+
+
+def driver_figures(utils, df, driver):
+    """Figures of pages/1_Driver_Performance.py for one driver"""
+    figures = {
+        "Speed vs RPM": utils.create_speed_rpm_scatter(df),
+        "Throttle vs Brake": utils.create_throttle_brake_map(df),
+        "Gear Usage Distribution": utils.create_gear_distribution(df),
+    }
+    if "race" in df.columns:
+        avg_speed_circuit = df.groupby("race", observed=True)["speed"].mean().reset_index()
+        figures["Average Speed per Circuit"] = px.bar(avg_speed_circuit.sort_values("speed", ascending=False),
+                                                      x="race", y="speed", color="speed",
+                                                      color_continuous_scale="Viridis",
+                                                      title=f"Average Speed per Circuit - {driver}")
+    if "lap" in df.columns and df["lap"].notna().any():
+        avg_speed_lap = df.groupby("lap")["speed"].mean().reset_index()
+        figures["Speed Over Time"] = utils.create_line_chart(avg_speed_lap, x="lap", y="speed",
+                                                             title=f"Average Speed per Lap - {driver}")
+    elif "date" in df.columns:
+        figures["Speed Over Time"] = utils.create_line_chart(df, x="date", y="speed",
+                                                             title=f"Speed Over Time - {driver}")
+    return figures
+
+
+def circuit_figures(utils, df, circuit):
+    """Figures of pages/4_Circuit_Analysis.py for one circuit"""
+    figures = {
+        "Speed Distribution": utils.create_binned_histogram(df, x="speed", color="driver_name", bins=50,
+                                                            title=f"Speed Distribution at {circuit}"),
+    }
+    drivers = sorted(df["driver_name"].dropna().unique())[:2]
+    laps = utils.alignment.compare_fastest({
+        d: utils.alignment.align_laps(df[df["driver_name"] == d],
+                                      lap_length=utils.alignment.circuit_length(circuit))
+        for d in drivers
+    })
+    if not laps.empty:
+        figures["Speed over Fastest Lap"] = utils.create_line_chart(laps, x="distance", y="speed",
+                                                                    color="driver_name",
+                                                                    title="Speed over Fastest Lap")
+        figures["Gap to Reference"] = utils.create_line_chart(laps, x="distance", y="delta_s",
+                                                              color="driver_name", title=f"Gap to {drivers[0]}")
+    avg_speed_gear = df.groupby(["driver_name", "n_gear"], observed=True)["speed"].mean().reset_index()
+    figures["Average Speed per Gear"] = utils.create_line_chart(avg_speed_gear, x="n_gear", y="speed",
+                                                                color="driver_name", title="Average Speed per Gear")
+    gear_dist = df.groupby(["driver_name", "n_gear"], observed=True).size().reset_index(name="count")
+    figures["Gear Usage Distribution"] = px.bar(gear_dist, x="n_gear", y="count", color="driver_name",
+                                                title="Gear Usage Distribution")
+    figures["RPM vs Throttle Pattern"] = utils.create_density_heatmap(df, x="rpm", y="throttle", by="driver_name",
+                                                                      title="RPM vs Throttle Pattern")
+    for metric, title in (("speed", "Average Speed per Driver"), ("throttle", "Average Throttle Usage"),
+                          ("brake", "Average Brake Usage")):
+        avg = df.groupby("driver_name", observed=True)[metric].mean().reset_index()
+        figures[title] = px.bar(avg.sort_values(metric, ascending=False), x="driver_name", y=metric,
+                                color="driver_name", title=title)
+    return figures
+
+
+def write_report(paths, title, figures, fingerprint, formats):
+    os.makedirs(os.path.dirname(paths["meta"]), exist_ok=True)
+    if "json" in formats:
+        bundle = {"title": title, "figures": {name: json.loads(fig.to_json()) for name, fig in figures.items()}}
+        with open(paths["json"], "w", encoding="utf-8") as f:
+            json.dump(bundle, f)
+    if "html" in formats:
+        parts = [f"<h2>{name}</h2>" + fig.to_html(full_html=False, include_plotlyjs="cdn" if i == 0 else False)
+                 for i, (name, fig) in enumerate(figures.items())]
+        with open(paths["html"], "w", encoding="utf-8") as f:
+            f.write(f"<!DOCTYPE html><html><head><meta charset='utf-8'><title>{title}</title></head>"
+                    f"<body><h1>{title}</h1>{''.join(parts)}</body></html>")
+    with open(paths["meta"], "w", encoding="utf-8") as f:
+        json.dump({"fingerprint": fingerprint, "title": title, "figures": list(figures)}, f, indent=1)
+
+
+def _load_season(utils, year, session_type):
+    key = (year, session_type)
+    if key not in _season:
+        _season.clear()  # one season per worker at a time
+        columns = list(dict.fromkeys(utils.DRIVER_COLUMNS + utils.CIRCUIT_COLUMNS + utils.ALIGN_COLUMNS))
+        _season[key] = inspect.unwrap(utils.load_data)(year, session_type, columns=columns)
+    return _season[key]
+
+
+def render(task):
+    """Worker entry point: render one report; returns (task, error or None)"""
+    year, session_type, kind, name, paths, fingerprint, formats, data_root = task
+    try:
+        utils = _utils(data_root)
+        season = _load_season(utils, year, session_type)
+        column = "driver_name" if kind == "driver" else "race"
+        df = season[season[column] == name]
+        if df.empty:
+            return task, "no rows"
+        build = driver_figures if kind == "driver" else circuit_figures
+        title = f"{name} - {year} {session_type.capitalize()}"
+        write_report(paths, title, build(utils, df, name), fingerprint, formats)
+        return task, None
+    except Exception as e:
+        return task, str(e)
+
+
+def plan(utils, years, sessions, kinds, out_dir, formats, force=False, data_root=None):
+    """(tasks to render, number of up-to-date reports skipped), tasks ordered by season"""
+    tasks, skipped = [], 0
+    for year in years:
+        for session_type in sessions:
+            entries = utils._folder_manifest(year, session_type)
+            if not entries:
+                continue
+            names = {
+                "driver": sorted({e["driver_name"] for e in entries.values() if e.get("driver_name")}),
+                "circuit": sorted({e["race"] for e in entries.values() if e.get("race")}),
+            }
+            for kind in kinds:
+                for name in names[kind]:
+                    paths = report_paths(out_dir, year, session_type, kind, name)
+                    fingerprint = input_fingerprint(entries, kind, name)
+                    if not force and is_current(paths, fingerprint, formats):
+                        skipped += 1
+                        continue
+                    tasks.append((year, session_type, kind, name, paths, fingerprint, formats, data_root))
+    return tasks, skipped
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render driver/circuit report bundles without Streamlit")
+    parser.add_argument("--years", type=int, nargs="+", help="default: every year in f1_cleaned_data")
+    parser.add_argument("--sessions", nargs="+", default=["race", "sprint"])
+    parser.add_argument("--kinds", nargs="+", choices=list(KINDS), default=list(KINDS))
+    parser.add_argument("--format", nargs="+", choices=["html", "json"], default=["html", "json"])
+    parser.add_argument("--out", default=OUT_DIR)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--data-root", help="folder holding f1_cleaned_data (default: this repo)")
+    parser.add_argument("--force", action="store_true", help="re-render reports that are up to date")
+    args = parser.parse_args(argv)
+
+    utils = _utils(args.data_root)
+    years = args.years or utils.get_available_years()
+    tasks, skipped = plan(utils, years, args.sessions, args.kinds, args.out, args.format, args.force,
+                          args.data_root)
+    print(f"{len(tasks)} report(s) to render, {skipped} up to date")
+    if not tasks:
+        return 0
+
+    failed = 0
+    chunksize = max(1, len(tasks) // (4 * (args.workers or os.cpu_count() or 1)))
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        for (year, session_type, kind, name, paths, *_), error in pool.map(render, tasks, chunksize=chunksize):
+            if error:
+                failed += 1
+                print(f"failed {year} {session_type} {kind} {name}: {error}")
+            else:
+                print(f" done {paths['meta'][:-len('.meta.json')]}")
+    print(f"{len(tasks) - failed} rendered, {failed} failed, {skipped} skipped")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,185 @@
+"""Pre-aggregated rollup tables for f1_cleaned_data.
+
+Each f1_cleaned_data/<year>/<session>/ folder gets a `_rollups.csv.gz` with
+one row per (file, race, driver_name, n_gear, lap) holding count, sum,
+sum of squares, min and max of every metric. Any mean/std/min/max over
+coarser groups (per driver, per race, per year/session, ...) can be
+answered from these few thousand rows without reading raw telemetry.
+
+Rollups are refreshed incrementally from the folder manifest: only files
+whose mtime or size changed are re-aggregated.
+
+Usage:
+    python rollups.py               # refresh every year/session
+    python rollups.py 2024 race     # refresh one folder
+"""
+import os
+import sys
+import threading
+
+import numpy as np
+import pandas as pd
+
+import columnar_store
+import manifest
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+CLEANED_DIR = os.path.join(ROOT_DIR, "f1_cleaned_data")
+COLUMNAR_DIR = os.path.join(ROOT_DIR, "f1_columnar_data")
+
+ROLLUP_NAME = "_rollups.csv.gz"
+GROUP_COLUMNS = ["race", "driver_name", "n_gear", "lap"]
+METRICS = ["speed", "rpm", "throttle", "brake"]
+STATS = ["count", "sum", "sumsq", "min", "max"]
+STRING_KEYS = ["race", "driver_name"]
+# Placeholder for group keys missing from a file (e.g. no `lap` column): MISSING_KEY for
+# the numeric keys, MISSING_NAME for the string keys; test with is_missing()
+MISSING_KEY = -1
+MISSING_NAME = str(MISSING_KEY)
+
+
+def is_missing(values):
+    """Mask of rollup key values that are the missing-key placeholder"""
+    if pd.api.types.is_numeric_dtype(values):
+        return values == MISSING_KEY
+    return values.astype(str) == MISSING_NAME
+
+
+def rollup_frame(df):
+    """Aggregate one telemetry frame to rollup rows"""
+    df = df.copy()
+    for col in GROUP_COLUMNS:
+        missing = MISSING_NAME if col in STRING_KEYS else MISSING_KEY
+        if col not in df.columns:
+            df[col] = missing
+        elif col in STRING_KEYS:
+            df[col] = df[col].astype(object).where(df[col].notna(), missing).astype(str)
+        else:
+            df[col] = df[col].fillna(missing)
+    metrics = [m for m in METRICS if m in df.columns]
+    for m in metrics:
+        df[m] = pd.to_numeric(df[m], errors="coerce")
+        df[f"{m}_sq"] = df[m] ** 2
+
+    grouped = df.groupby(GROUP_COLUMNS, sort=False)
+    out = grouped.size().rename("rows").to_frame()
+    for m in metrics:
+        out[f"{m}_count"] = grouped[m].count()
+        out[f"{m}_sum"] = grouped[m].sum()
+        out[f"{m}_sumsq"] = grouped[f"{m}_sq"].sum()
+        out[f"{m}_min"] = grouped[m].min()
+        out[f"{m}_max"] = grouped[m].max()
+    for m in METRICS:
+        if m not in metrics:
+            for stat in STATS:
+                out[f"{m}_{stat}"] = 0 if stat in ("count", "sum", "sumsq") else np.nan
+    return out.reset_index()
+
+
+def _read_source(path, year, session_type, columnar_dir):
+    wanted = GROUP_COLUMNS + METRICS
+    store_folder = os.path.join(columnar_dir, str(year), session_type)
+    source = columnar_store.resolve_sources([path], store_folder)[0]
+    if source.endswith(".parquet"):
+        return columnar_store.read_parquet(source, columns=wanted)
+    return pd.read_csv(path, usecols=lambda c: c in wanted)
+
+
+def load_rollups(year, session_type, cleaned_dir=CLEANED_DIR, columnar_dir=COLUMNAR_DIR):
+    """Return the rollup rows of one year/session, refreshing stale files"""
+    folder = os.path.join(cleaned_dir, str(year), session_type)
+    entries = manifest.load_manifest(folder)
+    if not entries:
+        return pd.DataFrame()
+
+    rollup_path = os.path.join(folder, ROLLUP_NAME)
+    try:
+        # round_trip: the stored mtimes must compare equal to the manifest's floats
+        old = pd.read_csv(rollup_path, float_precision="round_trip", dtype={c: str for c in STRING_KEYS})
+    except (OSError, ValueError):
+        old = pd.DataFrame(columns=["file", "mtime", "size"])
+
+    fresh = set()
+    stamps = old.groupby("file")[["mtime", "size"]].first()
+    for fname, row in stamps.iterrows():
+        entry = entries.get(fname)
+        if entry and entry["mtime"] == row["mtime"] and entry["size"] == row["size"]:
+            fresh.add(fname)
+
+    parts = [old[old["file"].isin(fresh)]] if fresh else []
+    changed = fresh != set(stamps.index)
+    for fname, entry in entries.items():
+        if fname in fresh:
+            continue
+        try:
+            df = _read_source(os.path.join(folder, fname), year, session_type, columnar_dir)
+        except Exception:
+            continue
+        part = rollup_frame(df)
+        part.insert(0, "file", fname)
+        part.insert(1, "mtime", entry["mtime"])
+        part.insert(2, "size", entry["size"])
+        parts.append(part)
+        changed = True
+
+    if not parts:
+        return pd.DataFrame()
+    rollup = pd.concat(parts, ignore_index=True)
+    if changed:
+        # Per-writer temp file + atomic replace: the warm-up may refresh the same folder
+        tmp_path = f"{rollup_path}.{os.getpid()}-{threading.get_ident()}.tmp"
+        try:
+            rollup.to_csv(tmp_path, index=False, compression="gzip")
+            os.replace(tmp_path, rollup_path)
+        except OSError:
+            pass
+
+    rollup["year"] = int(year)
+    rollup["session_type"] = session_type
+    return rollup
+
+
+def summarize(rollup, by, metrics=None):
+    """Combine rollup rows into count/mean/std/min/max per `by` group
+
+    Rows whose group key is the MISSING_KEY placeholder (e.g. lap when the
+    data has no lap column) are kept, so callers grouping by such a key
+    should drop them with is_missing() if needed.
+    """
+    metrics = metrics or METRICS
+    by = [by] if isinstance(by, str) else list(by)
+    if rollup.empty:
+        return pd.DataFrame()
+    agg = {"rows": "sum"}
+    for m in metrics:
+        agg.update({f"{m}_count": "sum", f"{m}_sum": "sum", f"{m}_sumsq": "sum",
+                    f"{m}_min": "min", f"{m}_max": "max"})
+    grouped = rollup.groupby(by, sort=True).agg(agg)
+
+    out = pd.DataFrame(index=grouped.index)
+    out["count"] = grouped["rows"]
+    for m in metrics:
+        n = grouped[f"{m}_count"].replace(0, np.nan)
+        mean = grouped[f"{m}_sum"] / n
+        var = (grouped[f"{m}_sumsq"] / n - mean ** 2).clip(lower=0) * n / (n - 1).replace(0, np.nan)
+        out[f"{m}_mean"] = mean
+        out[f"{m}_std"] = np.sqrt(var)
+        out[f"{m}_min"] = grouped[f"{m}_min"]
+        out[f"{m}_max"] = grouped[f"{m}_max"]
+    return out.reset_index()
+
+
+def refresh_all(cleaned_dir=CLEANED_DIR, years=None, sessions=None):
+    if years is None:
+        years = sorted(n for n in os.listdir(cleaned_dir) if n.isdigit()) if os.path.isdir(cleaned_dir) else []
+    for year in years:
+        year_dir = os.path.join(cleaned_dir, str(year))
+        year_sessions = sessions or (sorted(os.listdir(year_dir)) if os.path.isdir(year_dir) else [])
+        for session_type in year_sessions:
+            rollup = load_rollups(year, session_type, cleaned_dir)
+            print(f"{year} {session_type}: {len(rollup)} rollup rows")
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    refresh_all(years=args[:1] or None, sessions=args[1:2] or None)
@@ -0,0 +1,272 @@
+"""Per-file statistics sketches for f1_cleaned_data.
+
+Each f1_cleaned_data/<year>/<session>/ folder gets a `_sketches.json.gz`
+with one small, mergeable Sketch per CSV:
+
+- exact: row count, per-metric count/sum/min/max, n_gear value counts
+- QuantileSketch per metric (speed, rpm, throttle, brake): a DDSketch
+  (log-spaced buckets); any quantile is within RELATIVE_ACCURACY (1%) of
+  the true value at that rank, e.g. a reported p95 speed of 300 km/h is
+  the true p95 +- 3 km/h, however many sketches were merged
+- HyperLogLog (streaming.DistinctCount) per key column (driver_name,
+  race): distinct counts with ~1.6% standard error, near exact for the
+  handful of drivers/races a selection covers
+
+Merging the sketches of the files a year/session/driver/circuit selection
+touches answers nunique/max/mode/len/quantiles without loading telemetry
+(utils.get_sketch). Like the rollups, sketches are refreshed incrementally
+from the folder manifest, only for files whose mtime or size changed.
+
+Usage:
+    python sketches.py               # refresh every year/session
+    python sketches.py 2024 race     # refresh one folder
+"""
+import gzip
+import json
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+import columnar_store
+import manifest
+import streaming
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+CLEANED_DIR = os.path.join(ROOT_DIR, "f1_cleaned_data")
+COLUMNAR_DIR = os.path.join(ROOT_DIR, "f1_columnar_data")
+
+SKETCH_NAME = "_sketches.json.gz"
+SKETCH_VERSION = 1
+METRICS = ["speed", "rpm", "throttle", "brake"]
+DISTINCT_COLUMNS = ["driver_name", "race"]
+RELATIVE_ACCURACY = 0.01
+MIN_VALUE = 1e-9  # |values| below this land in the zero bucket
+
+
+class QuantileSketch:
+    """DDSketch: quantiles with relative error <= alpha, merged by adding bucket counts"""
+
+    def __init__(self, alpha=RELATIVE_ACCURACY):
+        self.alpha = alpha
+        self.gamma = (1 + alpha) / (1 - alpha)
+        self.positive = {}
+        self.negative = {}
+        self.zero = 0
+
+    def _add(self, store, values):
+        keys, counts = np.unique(np.ceil(np.log(values) / np.log(self.gamma)).astype(np.int64),
+                                 return_counts=True)
+        for key, count in zip(keys.tolist(), counts.tolist()):
+            store[key] = store.get(key, 0) + count
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[np.isfinite(values)]
+        self._add(self.positive, values[values >= MIN_VALUE])
+        self._add(self.negative, -values[values <= -MIN_VALUE])
+        self.zero += int((np.abs(values) < MIN_VALUE).sum())
+
+    def merge(self, other):
+        for mine, theirs in ((self.positive, other.positive), (self.negative, other.negative)):
+            for key, count in theirs.items():
+                mine[key] = mine.get(key, 0) + count
+        self.zero += other.zero
+        return self
+
+    @property
+    def count(self):
+        return sum(self.positive.values()) + sum(self.negative.values()) + self.zero
+
+    def quantile(self, q):
+        total = self.count
+        if not total:
+            return np.nan
+        rank = q * (total - 1)
+        seen = 0
+        # Ascending value order: most negative (largest key) first, zeros, then positives
+        for key in sorted(self.negative, reverse=True):
+            seen += self.negative[key]
+            if seen > rank:
+                return -2 * self.gamma ** key / (self.gamma + 1)
+        seen += self.zero
+        if seen > rank:
+            return 0.0
+        for key in sorted(self.positive):
+            seen += self.positive[key]
+            if seen > rank:
+                return 2 * self.gamma ** key / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.positive) / (self.gamma + 1)
+
+    def to_dict(self):
+        return {"positive": {str(k): v for k, v in self.positive.items()},
+                "negative": {str(k): v for k, v in self.negative.items()}, "zero": self.zero}
+
+    @classmethod
+    def from_dict(cls, data, alpha=RELATIVE_ACCURACY):
+        sketch = cls(alpha)
+        sketch.positive = {int(k): v for k, v in data["positive"].items()}
+        sketch.negative = {int(k): v for k, v in data["negative"].items()}
+        sketch.zero = data["zero"]
+        return sketch
+
+
+class Sketch:
+    """Mergeable summary of one or more telemetry files"""
+
+    def __init__(self):
+        self.rows = 0
+        self.moments = {m: streaming.Moments(m) for m in METRICS}
+        self.quantiles = {m: QuantileSketch() for m in METRICS}
+        self.distinct = {c: streaming.DistinctCount(c) for c in DISTINCT_COLUMNS}
+        self.gears = {}
+
+    @classmethod
+    def from_frame(cls, df):
+        sketch = cls()
+        sketch.rows = len(df)
+        for m in METRICS:
+            if m in df.columns:
+                sketch.moments[m].update(df)
+                sketch.quantiles[m].update(pd.to_numeric(df[m], errors="coerce").to_numpy(np.float64))
+        for c in DISTINCT_COLUMNS:
+            sketch.distinct[c].update(df)
+        if "n_gear" in df.columns:
+            gears = pd.to_numeric(df["n_gear"], errors="coerce").dropna().astype(np.int64).value_counts()
+            sketch.gears = {int(g): int(n) for g, n in gears.items()}
+        return sketch
+
+    def merge(self, other):
+        self.rows += other.rows
+        for m in METRICS:
+            self.moments[m].merge(other.moments[m])
+            self.quantiles[m].merge(other.quantiles[m])
+        for c in DISTINCT_COLUMNS:
+            self.distinct[c].merge(other.distinct[c])
+        for gear, n in other.gears.items():
+            self.gears[gear] = self.gears.get(gear, 0) + n
+        return self
+
+    def stats(self, metric):
+        """Exact count/sum/mean/std/min/max of a metric"""
+        return self.moments[metric].result()
+
+    def quantile(self, metric, q):
+        """Approximate q-quantile (0..1), clamped to the exact min/max"""
+        stats = self.stats(metric)
+        if not stats["count"]:
+            return np.nan
+        return float(np.clip(self.quantiles[metric].quantile(q), stats["min"], stats["max"]))
+
+    def nunique(self, column):
+        """Approximate distinct count of driver_name/race, exact for n_gear"""
+        if column == "n_gear":
+            return len(self.gears)
+        return self.distinct[column].result()
+
+    def gear_mode(self):
+        return max(self.gears, key=self.gears.get) if self.gears else None
+
+    def gear_mean(self):
+        total = sum(self.gears.values())
+        return sum(g * n for g, n in self.gears.items()) / total if total else np.nan
+
+    def to_dict(self):
+        return {
+            "rows": self.rows,
+            "moments": {m: {k: getattr(s, k) for k in ("count", "sum", "sumsq", "min", "max")}
+                        for m, s in self.moments.items()},
+            "quantiles": {m: s.to_dict() for m, s in self.quantiles.items()},
+            # Sparse HLL registers: a file usually holds one driver and one race
+            "distinct": {c: {str(i): int(r) for i, r in enumerate(s.registers) if r}
+                         for c, s in self.distinct.items()},
+            "gears": {str(g): n for g, n in self.gears.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls()
+        sketch.rows = data["rows"]
+        for m, values in data["moments"].items():
+            for k, v in values.items():
+                setattr(sketch.moments[m], k, float(v) if k != "count" else int(v))
+        sketch.quantiles = {m: QuantileSketch.from_dict(d) for m, d in data["quantiles"].items()}
+        for c, registers in data["distinct"].items():
+            for i, r in registers.items():
+                sketch.distinct[c].registers[int(i)] = r
+        sketch.gears = {int(g): n for g, n in data["gears"].items()}
+        return sketch
+
+
+def _read_source(path, year, session_type, columnar_dir):
+    wanted = METRICS + DISTINCT_COLUMNS + ["n_gear"]
+    store_folder = os.path.join(columnar_dir, str(year), session_type)
+    source = columnar_store.resolve_sources([path], store_folder)[0]
+    if source.endswith(".parquet"):
+        return columnar_store.read_parquet(source, columns=wanted)
+    return pd.read_csv(path, usecols=lambda c: c in wanted)
+
+
+def _read(sketch_path):
+    try:
+        with gzip.open(sketch_path, "rt", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if data.get("version") != SKETCH_VERSION:
+        return {}
+    return data.get("files", {})
+
+
+def _write(sketch_path, files):
+    tmp_path = sketch_path + ".tmp"
+    try:
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+            json.dump({"version": SKETCH_VERSION, "files": files}, f)
+        os.replace(tmp_path, sketch_path)
+    except OSError:
+        pass
+
+
+def load_sketches(year, session_type, cleaned_dir=CLEANED_DIR, columnar_dir=COLUMNAR_DIR):
+    """Return {csv filename: Sketch} for one year/session, refreshing stale files"""
+    folder = os.path.join(cleaned_dir, str(year), session_type)
+    entries = manifest.load_manifest(folder)
+    if not entries:
+        return {}
+    sketch_path = os.path.join(folder, SKETCH_NAME)
+    old = _read(sketch_path)
+    files, sketches = {}, {}
+    changed = set(old) != set(entries)
+    for fname, entry in entries.items():
+        stored = old.get(fname)
+        if stored and stored["mtime"] == entry["mtime"] and stored["size"] == entry["size"]:
+            files[fname] = stored
+            sketches[fname] = Sketch.from_dict(stored["sketch"])
+            continue
+        try:
+            df = _read_source(os.path.join(folder, fname), year, session_type, columnar_dir)
+        except Exception:
+            continue
+        sketches[fname] = Sketch.from_frame(df)
+        files[fname] = {"mtime": entry["mtime"], "size": entry["size"], "sketch": sketches[fname].to_dict()}
+        changed = True
+    if changed:
+        _write(sketch_path, files)
+    return sketches
+
+
+def refresh_all(cleaned_dir=CLEANED_DIR, years=None, sessions=None):
+    if years is None:
+        years = sorted(n for n in os.listdir(cleaned_dir) if n.isdigit()) if os.path.isdir(cleaned_dir) else []
+    for year in years:
+        year_dir = os.path.join(cleaned_dir, str(year))
+        year_sessions = sessions or (sorted(os.listdir(year_dir)) if os.path.isdir(year_dir) else [])
+        for session_type in year_sessions:
+            print(f"{year} {session_type}: {len(load_sketches(year, session_type, cleaned_dir))} file sketches")
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    refresh_all(years=args[:1] or None, sessions=args[1:2] or None)
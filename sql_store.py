@@ -0,0 +1,202 @@
+"""Embedded SQL store for aggregate telemetry queries.
+
+Loads f1_cleaned_data into one in-process database,
+f1_sql_data/telemetry.duckdb (DuckDB, multi-threaded and vectorized) or
+f1_sql_data/telemetry.sqlite when duckdb is not installed. The `telemetry`
+table holds the TELEMETRY columns plus year, session_type and source file,
+indexed on (year, session_type, driver_name, race). The `files` table
+records each loaded file's mtime/size, so refreshes only reload changed
+files and utils.aggregate() can tell whether a season is current.
+
+aggregate() runs parameterized GROUP BY queries and returns only the
+result rows; identifiers are checked against COLUMNS and values are
+always bound as parameters.
+
+Usage:
+    python sql_store.py               # load/refresh every year/session
+    python sql_store.py 2024 race     # one folder
+"""
+import os
+import sqlite3
+import sys
+from contextlib import contextmanager
+
+import pandas as pd
+
+import columnar_store
+import manifest
+
+try:
+    import duckdb
+except ImportError:  # optional dependency, SQLite from the standard library otherwise
+    duckdb = None
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+CLEANED_DIR = os.path.join(ROOT_DIR, "f1_cleaned_data")
+COLUMNAR_DIR = os.path.join(ROOT_DIR, "f1_columnar_data")
+SQL_DIR = os.path.join(ROOT_DIR, "f1_sql_data")
+
+KEY_COLUMNS = ["year", "session_type", "driver_name", "race"]
+COLUMNS = {
+    "year": "INTEGER", "session_type": "VARCHAR", "driver_name": "VARCHAR", "race": "VARCHAR",
+    "lap": "INTEGER", "date": "VARCHAR", "speed": "REAL", "rpm": "REAL", "throttle": "REAL",
+    "brake": "REAL", "n_gear": "INTEGER", "accel_ms2": "REAL", "brake_zone_s": "REAL",
+    "gear_shift": "INTEGER", "full_throttle_frac": "REAL",
+}
+AGGREGATES = {"mean": "AVG", "sum": "SUM", "min": "MIN", "max": "MAX", "count": "COUNT"}
+
+
+def backend():
+    return "duckdb" if duckdb is not None else "sqlite"
+
+
+def db_path(sql_dir=SQL_DIR):
+    return os.path.join(sql_dir, "telemetry.duckdb" if duckdb is not None else "telemetry.sqlite")
+
+
+@contextmanager
+def connect(sql_dir=SQL_DIR, read_only=False):
+    """Open the store (created on first write); closed on exit"""
+    path = db_path(sql_dir)
+    if not read_only:
+        os.makedirs(sql_dir, exist_ok=True)
+    if duckdb is not None:
+        con = duckdb.connect(path, read_only=read_only)
+    else:
+        uri = f"file:{path}?mode=ro" if read_only else f"file:{path}"
+        con = sqlite3.connect(uri, uri=True, check_same_thread=False)
+    try:
+        yield con
+    finally:
+        con.close()
+
+
+def _ensure_schema(con):
+    columns = ", ".join(f"{name} {kind}" for name, kind in COLUMNS.items())
+    con.execute(f"CREATE TABLE IF NOT EXISTS telemetry (file VARCHAR, {columns})")
+    con.execute("CREATE TABLE IF NOT EXISTS files (year INTEGER, session_type VARCHAR, file VARCHAR, "
+                "mtime DOUBLE, size BIGINT)")
+    con.execute(f"CREATE INDEX IF NOT EXISTS telemetry_keys ON telemetry ({', '.join(KEY_COLUMNS)})")
+
+
+def _fetch(con, sql, params=()):
+    if duckdb is not None:
+        return con.execute(sql, list(params)).df()
+    return pd.read_sql_query(sql, con, params=list(params))
+
+
+def loaded_files(con, year, session_type):
+    """{file: (mtime, size)} loaded for one year/session"""
+    rows = con.execute("SELECT file, mtime, size FROM files WHERE year = ? AND session_type = ?",
+                       [int(year), session_type]).fetchall()
+    return {f: (m, s) for f, m, s in rows}
+
+
+def is_current(sql_dir, year, session_type, entries):
+    """Whether the store holds exactly the files (by mtime/size) of a manifest"""
+    if not entries or not os.path.exists(db_path(sql_dir)):
+        return False
+    try:
+        with connect(sql_dir, read_only=True) as con:
+            loaded = loaded_files(con, year, session_type)
+    except Exception:
+        return False
+    return loaded == {f: (e["mtime"], e["size"]) for f, e in entries.items()}
+
+
+def _read_file(path, year, session_type, columnar_dir):
+    store_folder = os.path.join(columnar_dir, str(year), session_type)
+    source = columnar_store.resolve_sources([path], store_folder)[0]
+    wanted = [c for c in COLUMNS if c not in ("year", "session_type")]
+    if source.endswith(".parquet"):
+        df = columnar_store.read_parquet(source, columns=wanted)
+    else:
+        df = pd.read_csv(path, usecols=lambda c: c in wanted)
+    df = df.reindex(columns=wanted)
+    df["date"] = df["date"].astype(str).where(df["date"].notna())
+    return df
+
+
+def refresh_folder(year, session_type, cleaned_dir=CLEANED_DIR, columnar_dir=COLUMNAR_DIR, sql_dir=SQL_DIR):
+    """Reload new/changed files of one year/session and drop deleted ones; returns files loaded"""
+    entries = manifest.load_manifest(os.path.join(cleaned_dir, str(year), session_type))
+    year = int(year)
+    with connect(sql_dir) as con:
+        _ensure_schema(con)
+        loaded = loaded_files(con, year, session_type)
+        current = {f: (e["mtime"], e["size"]) for f, e in entries.items()}
+        stale = [f for f in loaded if current.get(f) != loaded[f]]
+        fresh = [f for f in sorted(current) if loaded.get(f) != current[f]]
+        for fname in stale:
+            con.execute("DELETE FROM telemetry WHERE year = ? AND session_type = ? AND file = ?",
+                        [year, session_type, fname])
+            con.execute("DELETE FROM files WHERE year = ? AND session_type = ? AND file = ?",
+                        [year, session_type, fname])
+        for fname in fresh:
+            try:
+                df = _read_file(os.path.join(cleaned_dir, str(year), session_type, fname),
+                                year, session_type, columnar_dir)
+            except Exception:
+                continue
+            df.insert(0, "session_type", session_type)
+            df.insert(0, "year", year)
+            df.insert(0, "file", fname)
+            if duckdb is not None:
+                con.register("part", df)
+                con.execute("INSERT INTO telemetry BY NAME SELECT * FROM part")
+                con.unregister("part")
+            else:
+                df.to_sql("telemetry", con, if_exists="append", index=False)
+            con.execute("INSERT INTO files VALUES (?, ?, ?, ?, ?)",
+                        [year, session_type, fname, *current[fname]])
+        if duckdb is None:
+            con.commit()
+    return len(fresh)
+
+
+def _check(name):
+    if name not in COLUMNS:
+        raise ValueError(f"unknown column {name!r}")
+    return name
+
+
+def _in(column, values, params):
+    params.extend(values)
+    return f"{column} IN ({', '.join('?' * len(values))})"
+
+
+def aggregate(con, years, sessions, by, aggs, drivers=None, circuits=None):
+    """GROUP BY `by` with named aggregates {output: (column or '*', 'mean'|'sum'|'min'|'max'|'count')}"""
+    params = []
+    where = [_in("year", [int(y) for y in years], params), _in("session_type", list(sessions), params)]
+    if drivers:
+        where.append(_in("driver_name", list(drivers), params))
+    if circuits:
+        where.append(_in("race", list(circuits), params))
+    by = [_check(c) for c in by]
+    select = list(by)
+    for out, (column, func) in aggs.items():
+        if not out.isidentifier():
+            raise ValueError(f"bad output name {out!r}")
+        expr = "*" if column == "*" else _check(column)
+        select.append(f"{AGGREGATES[func]}({expr}) AS {out}")
+    sql = f"SELECT {', '.join(select)} FROM telemetry WHERE {' AND '.join(where)}"
+    if by:
+        sql += f" GROUP BY {', '.join(by)} ORDER BY {', '.join(by)}"
+    return _fetch(con, sql, params)
+
+
+def refresh_all(cleaned_dir=CLEANED_DIR, years=None, sessions=None, sql_dir=SQL_DIR):
+    if years is None:
+        years = sorted(n for n in os.listdir(cleaned_dir) if n.isdigit()) if os.path.isdir(cleaned_dir) else []
+    for year in years:
+        year_dir = os.path.join(cleaned_dir, str(year))
+        year_sessions = sessions or (sorted(os.listdir(year_dir)) if os.path.isdir(year_dir) else [])
+        for session_type in year_sessions:
+            n = refresh_folder(year, session_type, cleaned_dir, sql_dir=sql_dir)
+            print(f"{year} {session_type}: {n} file(s) loaded into {db_path(sql_dir)}")
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    refresh_all(years=args[:1] or None, sessions=args[1:2] or None)
@@ -0,0 +1,264 @@
+"""Out-of-core aggregation over telemetry files.
+
+Instead of concatenating a season and grouping it, the telemetry is
+walked file by file in chunks of at most CHUNK_ROWS rows (iter_file_chunks)
+and every chunk is folded into small aggregate states:
+
+- RowCount(): number of rows
+- Moments(column): count, sum, mean, std, min, max
+- GroupMoments(keys, column): the same per group key
+- Histogram(column, edges): counts over fixed bin edges
+- DistinctCount(column): HyperLogLog distinct count (~1.6% error at the
+  default precision, exact-ish for small cardinalities via linear counting)
+
+Memory is bounded by one chunk plus the states (the number of groups for
+GroupMoments, 2**precision bytes for DistinctCount), never by the data
+size. States are mergeable (a.merge(b)), so partial results from several
+folders, processes or machines combine into the same answer.
+
+    states = {"speed": Moments("speed"), "drivers": DistinctCount("driver_name")}
+    fold(chunks, states)
+    states["speed"].result()   # {'count': ..., 'mean': ..., ...}
+
+utils.stream_aggregate() / utils.stream_overview() feed it from
+f1_cleaned_data with manifest pruning.
+
+Usage:
+    python streaming.py 2024 race        # overview metrics of one folder
+"""
+import sys
+
+import numpy as np
+import pandas as pd
+
+import columnar_store
+
+CHUNK_ROWS = 100_000
+HLL_PRECISION = 12
+
+
+def iter_file_chunks(path, columns=None, chunk_rows=CHUNK_ROWS):
+    """Yield one telemetry file (CSV or Parquet) as DataFrames of at most chunk_rows rows"""
+    if path.endswith(".parquet"):
+        yield from columnar_store.iter_parquet(path, columns, chunk_rows)
+        return
+    usecols = (lambda c: c in columns) if columns else None
+    with pd.read_csv(path, usecols=usecols, chunksize=chunk_rows) as reader:
+        yield from reader
+
+
+def _numeric(chunk, column):
+    return pd.to_numeric(chunk[column], errors="coerce").to_numpy(np.float64)
+
+
+class RowCount:
+    """Number of rows folded"""
+
+    def __init__(self):
+        self.count = 0
+
+    def update(self, chunk):
+        self.count += len(chunk)
+
+    def merge(self, other):
+        self.count += other.count
+        return self
+
+    def result(self):
+        return self.count
+
+
+class Moments:
+    """count/sum/mean/std/min/max of one numeric column"""
+
+    def __init__(self, column):
+        self.column = column
+        self.count = 0
+        self.sum = 0.0
+        self.sumsq = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def update(self, chunk):
+        if self.column not in chunk.columns:
+            return
+        values = _numeric(chunk, self.column)
+        values = values[np.isfinite(values)]
+        if not len(values):
+            return
+        self.count += len(values)
+        self.sum += float(values.sum())
+        self.sumsq += float(np.square(values).sum())
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+
+    def merge(self, other):
+        self.count += other.count
+        self.sum += other.sum
+        self.sumsq += other.sumsq
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def result(self):
+        if not self.count:
+            return {"count": 0, "sum": 0.0, "mean": np.nan, "std": np.nan, "min": np.nan, "max": np.nan}
+        mean = self.sum / self.count
+        var = np.nan
+        if self.count > 1:
+            var = max(self.sumsq / self.count - mean ** 2, 0.0) * self.count / (self.count - 1)
+        return {"count": self.count, "sum": self.sum, "mean": mean, "std": np.sqrt(var),
+                "min": self.min, "max": self.max}
+
+
+class GroupMoments:
+    """Moments of one column per group of `keys` (memory grows with the number of groups)"""
+
+    def __init__(self, keys, column):
+        self.keys = [keys] if isinstance(keys, str) else list(keys)
+        self.column = column
+        self.table = None
+
+    def _combine(self, parts):
+        parts = [p for p in parts if p is not None and not p.empty]
+        if not parts:
+            return None
+        table = pd.concat(parts)
+        return table.groupby(level=self.keys, sort=False, observed=True).agg(
+            {"count": "sum", "sum": "sum", "sumsq": "sum", "min": "min", "max": "max"})
+
+    def update(self, chunk):
+        if self.column not in chunk.columns or not all(k in chunk.columns for k in self.keys):
+            return
+        values = pd.Series(_numeric(chunk, self.column), index=chunk.index)
+        frame = chunk[self.keys].assign(_v=values, _sq=values ** 2).dropna(subset=["_v"])
+        grouped = frame.groupby(self.keys, sort=False, observed=True)
+        part = pd.DataFrame({"count": grouped["_v"].count(), "sum": grouped["_v"].sum(),
+                             "sumsq": grouped["_sq"].sum(), "min": grouped["_v"].min(),
+                             "max": grouped["_v"].max()})
+        self.table = self._combine([self.table, part])
+
+    def merge(self, other):
+        self.table = self._combine([self.table, other.table])
+        return self
+
+    def result(self):
+        """One row per group: keys, count, mean, std, min, max"""
+        if self.table is None:
+            return pd.DataFrame(columns=self.keys + ["count", "mean", "std", "min", "max"])
+        t = self.table
+        n = t["count"].astype(np.float64)
+        mean = t["sum"] / n
+        var = (t["sumsq"] / n - mean ** 2).clip(lower=0) * n / (n - 1).replace(0, np.nan)
+        out = pd.DataFrame({"count": t["count"].astype(np.int64), "mean": mean, "std": np.sqrt(var),
+                            "min": t["min"], "max": t["max"]}, index=t.index)
+        return out.sort_index().reset_index()
+
+
+class Histogram:
+    """Counts of one column over fixed bin edges; values outside them are counted apart"""
+
+    def __init__(self, column, edges):
+        self.column = column
+        self.edges = np.asarray(edges, dtype=np.float64)
+        self.counts = np.zeros(len(self.edges) - 1, dtype=np.int64)
+        self.below = 0
+        self.above = 0
+
+    def update(self, chunk):
+        if self.column not in chunk.columns:
+            return
+        values = _numeric(chunk, self.column)
+        values = values[np.isfinite(values)]
+        self.below += int((values < self.edges[0]).sum())
+        self.above += int((values > self.edges[-1]).sum())
+        idx = np.searchsorted(self.edges, values, side="right") - 1
+        idx[values == self.edges[-1]] = len(self.counts) - 1  # closed last bin, as np.histogram
+        idx = idx[(idx >= 0) & (idx < len(self.counts))]
+        self.counts += np.bincount(idx, minlength=len(self.counts))
+
+    def merge(self, other):
+        self.counts += other.counts
+        self.below += other.below
+        self.above += other.above
+        return self
+
+    def result(self):
+        """bin_start, bin_end, count per bin"""
+        return pd.DataFrame({"bin_start": self.edges[:-1], "bin_end": self.edges[1:], "count": self.counts})
+
+
+def _bit_length(w):
+    """Vectorized int.bit_length() of a uint64 array"""
+    w = w.copy()
+    n = np.zeros(len(w), dtype=np.int64)
+    for shift in (32, 16, 8, 4, 2, 1):
+        high = w >= np.uint64(1 << shift)
+        n[high] += shift
+        w[high] >>= np.uint64(shift)
+    return n + (w > 0)
+
+
+class DistinctCount:
+    """HyperLogLog distinct count of one column (relative error ~1.04 / sqrt(2**precision))"""
+
+    def __init__(self, column, precision=HLL_PRECISION):
+        self.column = column
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def update(self, chunk):
+        if self.column not in chunk.columns:
+            return
+        values = chunk[self.column].dropna()
+        if values.empty:
+            return
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            values = values.astype(values.cat.categories.dtype)
+        self.add_hashes(pd.util.hash_pandas_object(values, index=False).to_numpy(np.uint64))
+
+    def add_hashes(self, hashes):
+        p = self.precision
+        idx = (hashes >> np.uint64(64 - p)).astype(np.int64)
+        rest = hashes & np.uint64((1 << (64 - p)) - 1)
+        rank = (64 - p) - _bit_length(rest) + 1
+        np.maximum.at(self.registers, idx, rank.astype(np.uint8))
+
+    def merge(self, other):
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def result(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = int((self.registers == 0).sum())
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * np.log(m / zeros)  # linear counting for small cardinalities
+        return int(round(estimate))
+
+
+def fold(chunks, states):
+    """Update every state with every chunk; returns states (a dict or list)"""
+    targets = list(states.values()) if isinstance(states, dict) else list(states)
+    for chunk in chunks:
+        for state in targets:
+            state.update(chunk)
+    return states
+
+
+def merge_states(a, b):
+    """Merge two dicts of states with the same keys into a"""
+    for name, state in b.items():
+        a[name].merge(state)
+    return a
+
+
+if __name__ == "__main__":
+    import utils
+
+    args = sys.argv[1:]
+    if len(args) < 2:
+        raise SystemExit("usage: python streaming.py <year> <session_type>")
+    for name, value in utils.stream_overview(int(args[0]), args[1]).items():
+        print(f"{name}: {value}")
@@ -1,114 +1,567 @@
+import functools
+import inspect
 import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import numpy as np
 import pandas as pd
 import plotly.express as px
 import streamlit as st
 
+import alignment
+import columnar_store
+from dataset_versions import DATASET_VERSIONS
+from figure_cache import FIGURE_CACHE, cached_figure
+from frame_cache import FRAME_CACHE, _freeze, shared_frame_cache
+import manifest
+import memmap_store
+from performance_monitor import cache_data, timed
+import rollups
+import sketches
+import sql_store
+import streaming
+
 ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
 #ANNUAL_DIR = os.path.join(ROOT_DIR, "f1_annual_data")
 CLEANED_DIR = os.path.join(ROOT_DIR, "f1_cleaned_data")
+COLUMNAR_DIR = os.path.join(ROOT_DIR, "f1_columnar_data")
+MEMMAP_DIR = os.path.join(ROOT_DIR, "f1_memmap_data")
+SQL_DIR = os.path.join(ROOT_DIR, "f1_sql_data")
+
+# Parallel file reads: worker count and whether to use processes instead of threads
+LOAD_WORKERS = int(os.environ.get("F1_LOAD_WORKERS", min(8, os.cpu_count() or 1)))
+LOAD_USE_PROCESSES = os.environ.get("F1_LOAD_PROCESSES", "0") == "1"
+
+# Cached results are keyed on the dataset version instead of expiring; this bounds
+# each st.cache_data function's entry count
+CACHE_MAX_ENTRIES = int(os.environ.get("F1_CACHE_MAX_ENTRIES", 256))
+
+# Columns each page loads (shared with the warm-up in warmup.py)
+DRIVER_COLUMNS = ['driver_name', 'speed', 'rpm', 'throttle', 'brake', 'n_gear', 'race', 'lap', 'date',
+                  'accel_ms2', 'brake_start', 'brake_zone_s', 'gear_shift', 'full_throttle_frac']
+CAR_COLUMNS = ['driver_name', 'speed', 'rpm', 'n_gear', 'throttle', 'brake']
+CIRCUIT_COLUMNS = ['driver_name', 'speed', 'rpm', 'throttle', 'brake', 'n_gear']
+EVOLUTION_METRICS = ['speed', 'throttle', 'brake']
+
+# Compact in-memory dtypes applied by the loaders (compact=False opts out)
+TELEMETRY_SCHEMA = {
+    'driver_name': 'category',
+    'race': 'category',
+    'session_type': 'category',
+    'speed': 'float32',
+    'throttle': 'float32',
+    'brake': 'float32',
+    'rpm': 'int16',
+    'n_gear': 'int8',
+    'lap': 'int16',
+    'year': 'int16',
+    'date': 'datetime64[ns, UTC]',
+    'accel_ms2': 'float32',
+    'brake_start': 'int8',
+    'brake_end': 'int8',
+    'brake_zone_s': 'float32',
+    'gear_shift': 'int8',
+    'full_throttle_frac': 'float32',
+}
+
+def dataset_version(years, sessions):
+    """Versions (see dataset_versions.py) of the year/session folders a call reads"""
+    return tuple(DATASET_VERSIONS.get(CLEANED_DIR, year, session_type)
+                 for year in _to_list(years) for session_type in _to_list(sessions))
+
+def versioned(func):
+    """Pass dataset_version(years, sessions) of a cached function's first two arguments
+    as its `dataset_version` keyword, which only serves as part of the cache key, so
+    the key changes whenever one of those folders does"""
+    signature = inspect.signature(func)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        years, sessions = list(bound.arguments.values())[:2]
+        return func(*args, dataset_version=dataset_version(years, sessions), **kwargs)
+    return wrapper
+
+def _drop_stale_frames(changed):
+    """Evict the shared frames and figures built from a previous version of a changed folder"""
+    stale = {old for _, _, old, _ in changed}
+    FRAME_CACHE.invalidate(lambda key: not stale.isdisjoint(dict(key[3]).get('dataset_version', ())))
+    FIGURE_CACHE.invalidate(lambda key: key[2][:1] == ('query',) and not stale.isdisjoint(key[2][-1]))
+
+def frame_key(df):
+    """Where an unmodified query() result came from (its arguments and dataset version), for the
+    chart helpers' data_key; None for frames from anywhere else"""
+    return df.attrs.get('data_key')
+
+DATASET_VERSIONS.add_change_listener(_drop_stale_frames)
+
+def _source_files(year, session_type, files):
+    """Swap CSVs for their up-to-date columnar copies when the store exists"""
+    store_folder = os.path.join(COLUMNAR_DIR, str(year), session_type)
+    return columnar_store.resolve_sources(files, store_folder)
+
+def _read_part(path, columns=None, nrows=None, filters=None):
+    """Read one telemetry file (Parquet or CSV), projecting to columns
+
+    `filters` (see _filter_part) are applied to this file's rows before it
+    is returned; filter columns not in `columns` are read and then dropped.
+    """
+    read_columns = columns
+    if columns and filters:
+        read_columns = list(columns) + [c for c in filters if c not in columns]
+    if path.endswith('.parquet'):
+        df_part = columnar_store.read_parquet(path, columns=read_columns)
+        if nrows is not None:
+            df_part = df_part.head(nrows)
+    else:
+        try:
+            df_part = pd.read_csv(path, usecols=read_columns, nrows=nrows)
+        except Exception:
+            df_part = pd.read_csv(path, nrows=nrows)
+            if read_columns:
+                df_part = df_part[[c for c in read_columns if c in df_part.columns]]
+    if filters:
+        df_part = _filter_part(df_part, filters)
+        if columns:
+            df_part = df_part[[c for c in columns if c in df_part.columns]]
+    return df_part
+
+def _filter_part(df, filters):
+    """Apply {column: allowed values} or {'date': (start, end)} row filters"""
+    mask = pd.Series(True, index=df.index)
+    for col, allowed in filters.items():
+        if col not in df.columns:
+            continue
+        if col == 'date':
+            start, end = allowed
+            dates = _parse_dates(df['date'])
+            df = df.assign(date=dates)
+            if start is not None:
+                mask &= dates >= start
+            if end is not None:
+                mask &= dates <= end
+        else:
+            mask &= df[col].isin(allowed)
+    return df[mask]
+
+def _try_read_part(path, columns=None, nrows=None, filters=None):
+    try:
+        return _read_part(path, columns=columns, nrows=nrows, filters=filters)
+    except Exception:
+        return None
+
+@timed("read_files")
+def _read_parts(paths, columns=None, nrows=None, workers=None, use_processes=None, filters=None):
+    """Read many files in parallel; returns (frames in input order, skipped count)"""
+    workers = LOAD_WORKERS if workers is None else workers
+    use_processes = LOAD_USE_PROCESSES if use_processes is None else use_processes
+    paths = list(paths)
+
+    if workers <= 1 or len(paths) <= 1:
+        results = [_try_read_part(p, columns, nrows, filters) for p in paths]
+    else:
+        executor_cls = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+        n = len(paths)
+        with executor_cls(max_workers=min(workers, n)) as pool:
+            results = list(pool.map(_try_read_part, paths, [columns] * n, [nrows] * n, [filters] * n,
+                                    chunksize=max(1, n // (workers * 4)) if use_processes else 1))
+
+    dfs = [df for df in results if df is not None]
+    return dfs, len(paths) - len(dfs)
+
+def _parse_dates(dates):
+    """Parse a date column that may mix CSV strings and Parquet timestamps"""
+    if pd.api.types.is_datetime64_any_dtype(dates):
+        return dates
+    return pd.to_datetime(dates.astype(str), errors='coerce', utc=True, format='ISO8601')
+
+@timed()
+def apply_telemetry_schema(df):
+    """Cast columns to TELEMETRY_SCHEMA dtypes, downcasting other numerics
+
+    Integer columns holding missing values use the nullable Int dtype of the
+    same width instead of failing.
+    """
+    for col, dtype in TELEMETRY_SCHEMA.items():
+        if col not in df.columns or str(df[col].dtype) == dtype:
+            continue
+        if dtype == 'category':
+            df[col] = df[col].astype('category')
+        elif dtype.startswith('datetime64'):
+            df[col] = _parse_dates(df[col])
+        else:
+            values = pd.to_numeric(df[col], errors='coerce')
+            if dtype.startswith('int') and values.isna().any():
+                dtype = dtype.capitalize()
+            df[col] = values.astype(dtype)
+    return optimize_dataframe_memory(df)
+
+def _concat_parts(dfs, skipped):
+    """Concatenate file frames and record read stats in df.attrs"""
+    df = pd.concat(dfs, ignore_index=True)
+    if 'date' in df.columns:
+        df['date'] = _parse_dates(df['date'])
+    df.attrs['files_read'] = len(dfs)
+    df.attrs['files_skipped'] = skipped
+    return df
+
+@timed()
+@versioned
+@shared_frame_cache
+def load_data(year, session_type, columns=None, sample_frac=None, workers=None, use_processes=None,
+              compact=True, dataset_version=None):
+    """Load complete dataset from f1_cleaned_data/<year>/<session>/*.csv
+
+    Reads the Parquet mirror in f1_columnar_data (see columnar_store.py)
+    for every file that has been converted, CSV for the rest. Files are
+    read in parallel (LOAD_WORKERS threads by default); unreadable files are
+    skipped and counted in df.attrs['files_skipped']. Columns are cast to
+    TELEMETRY_SCHEMA unless compact=False.
 
-@st.cache_data(ttl=3600)
-def load_data(year, session_type, columns=None, sample_frac=None):
-    """Load complete dataset from f1_cleaned_data/<year>/<session>/*.csv"""
+    When an up-to-date memmap store exists (see memmap_store.py) the frame
+    is built over its memory-mapped columns instead, without copying.
+    """
     folder = os.path.join(CLEANED_DIR, str(year), session_type)
     if not os.path.exists(folder):
         st.warning(f"Data not available: {folder}")
         return pd.DataFrame()
 
+    season = _memmap_season(year, session_type) if compact else None
+    if season is not None:
+        return _memmap_frame(season, columns)
+
     files = [os.path.join(folder, f) for f in os.listdir(folder) if f.lower().endswith('.csv')]
     if not files:
         return pd.DataFrame()
 
-    dfs = []
-    for path in files:
-        try:
-            df_part = pd.read_csv(path, usecols=columns)
-            dfs.append(df_part)
-        except Exception:
-            try:
-                df_part = pd.read_csv(path)
-                if columns:
-                    df_part = df_part[[c for c in columns if c in df_part.columns]]
-                dfs.append(df_part)
-            except Exception:
-                continue
-
+    dfs, skipped = _read_parts(_source_files(year, session_type, files), columns=columns,
+                               workers=workers, use_processes=use_processes)
     if not dfs:
         return pd.DataFrame()
 
-    df = pd.concat(dfs, ignore_index=True)
+    df = _concat_parts(dfs, skipped)
+    return apply_telemetry_schema(df) if compact else df
 
-    if 'date' in df.columns:
-        df['date'] = pd.to_datetime(df['date'], errors='coerce', utc=True)
+def _folder_manifest(year, session_type):
+    """Manifest entries ({filename: entry}) for a year/session folder"""
+    return manifest.load_manifest(os.path.join(CLEANED_DIR, str(year), session_type))
+
+def _memmap_season(year, session_type, entries=None):
+    """Memory-mapped season store, if one was built from the current files"""
+    if not os.path.isdir(os.path.join(MEMMAP_DIR, str(year), session_type)):
+        return None
+    entries = _folder_manifest(year, session_type) if entries is None else entries
+    if not entries:
+        return None
+    fingerprint = memmap_store.manifest_fingerprint(entries)
+    return memmap_store.open_season(year, session_type, MEMMAP_DIR, fingerprint)
+
+def _memmap_frame(season, columns=None, drivers=None, circuits=None, filters=None):
+    """Slice a MemmapSeason: driver/race blocks from its offsets, the date window by
+    binary search; lap filters are applied to the sliced rows"""
+    filters = filters or {}
+    row_filters = {k: v for k, v in filters.items() if k == 'lap'}
+    read_columns = columns
+    if columns and row_filters:
+        read_columns = list(columns) + [c for c in row_filters if c not in columns]
+    df = season.frame(read_columns, drivers=drivers, races=circuits, time_range=filters.get('date'))
+    if row_filters:
+        df = _filter_part(df, row_filters)
+        if columns:
+            df = df[[c for c in columns if c in df.columns]]
+    df.attrs['files_read'] = 0
+    df.attrs['files_skipped'] = 0
     return df
 
-@st.cache_data(ttl=3600)
-def load_data_filtered(year, session_type, driver_name=None, circuit=None, max_rows=None):
-    """Load filtered by driver/circuit at file level"""
+@timed()
+@versioned
+@shared_frame_cache
+def load_data_filtered(year, session_type, driver_name=None, circuit=None, max_rows=None,
+                       workers=None, use_processes=None, compact=True, dataset_version=None):
+    """Load filtered by driver/circuit at file level (parallel reads as in load_data)"""
     cleaned_dir = os.path.join(CLEANED_DIR, str(year), session_type)
     if not os.path.exists(cleaned_dir):
         return pd.DataFrame()
 
-    files = [os.path.join(cleaned_dir, f) for f in os.listdir(cleaned_dir) if f.lower().endswith('.csv')]
+    season = _memmap_season(year, session_type) if compact and max_rows is None else None
+    if season is not None:
+        return _memmap_frame(season, drivers=_to_list(driver_name), circuits=_to_list(circuit))
+
     matched = []
-    for fpath in files:
-        try:
-            head = pd.read_csv(fpath, nrows=1)
-        except Exception:
+    for fname, entry in _folder_manifest(year, session_type).items():
+        if circuit and entry.get('race') is not None and entry['race'] != str(circuit):
             continue
-        if circuit and 'race' in head.columns:
-            if str(head.iloc[0].get('race', '')) != str(circuit):
-                continue
-        if driver_name and 'driver_name' in head.columns:
-            if str(head.iloc[0].get('driver_name', '')) != str(driver_name):
-                continue
-        matched.append(fpath)
+        if driver_name and entry.get('driver_name') is not None and entry['driver_name'] != str(driver_name):
+            continue
+        matched.append(os.path.join(cleaned_dir, fname))
 
     if not matched:
         return pd.DataFrame()
 
-    dfs = []
-    for p in matched:
-        try:
-            dfs.append(pd.read_csv(p, nrows=max_rows))
-        except Exception:
-            continue
+    dfs, skipped = _read_parts(_source_files(year, session_type, matched), nrows=max_rows,
+                               workers=workers, use_processes=use_processes)
     if not dfs:
         return pd.DataFrame()
-    df = pd.concat(dfs, ignore_index=True)
 
-    if 'date' in df.columns:
-        df['date'] = pd.to_datetime(df['date'], errors='coerce', utc=True)
+    df = _concat_parts(dfs, skipped)
+    return apply_telemetry_schema(df) if compact else df
 
+def _to_list(value):
+    if value is None:
+        return None
+    return [value] if isinstance(value, (str, int)) else list(value)
+
+def _utc(value):
+    ts = pd.Timestamp(value)
+    return ts.tz_localize('UTC') if ts.tzinfo is None else ts.tz_convert('UTC')
+
+def _entry_matches(entry, drivers, circuits, laps, time_range):
+    """Whether a manifest entry may hold rows matching the query"""
+    if drivers and entry.get('driver_name') is not None and entry['driver_name'] not in drivers:
+        return False
+    if circuits and entry.get('race') is not None and entry['race'] not in circuits:
+        return False
+    if laps and entry.get('lap_min') is not None:
+        if max(laps) < entry['lap_min'] or min(laps) > entry['lap_max']:
+            return False
+    if time_range and entry.get('date_min') is not None:
+        start, end = time_range
+        if end is not None and pd.Timestamp(entry['date_min']) > end:
+            return False
+        if start is not None and pd.Timestamp(entry['date_max']) < start:
+            return False
+    return True
+
+@timed()
+@versioned
+@shared_frame_cache
+def query(years, sessions, columns=None, drivers=None, circuits=None, laps=None,
+          time_range=None, limit=None, compact=True, dataset_version=None):
+    """Fetch exactly the telemetry slice a page renders
+
+    years/sessions take a single value or a list. Files are pruned with the
+    folder manifests (driver, race, lap and date ranges), only `columns` are
+    read, and driver/circuit/lap/time_range row filters are applied to each
+    file as it is read. `time_range` is a (start, end) pair, either side may
+    be None. `limit` caps the total number of rows returned. When more than
+    one year or session is requested, `year`/`session_type` columns are added.
+    Filters on a column that a file does not have are ignored for that file.
+    Columns are cast to TELEMETRY_SCHEMA unless compact=False. Seasons with
+    an up-to-date memmap store are sliced from it instead of read from files.
+    df.attrs['data_key'] records the call and dataset version (see frame_key).
+    """
+    years, sessions = _to_list(years), _to_list(sessions)
+    drivers, circuits, laps = _to_list(drivers), _to_list(circuits), _to_list(laps)
+    if time_range is not None:
+        time_range = tuple(_utc(t) if t is not None else None for t in time_range)
+
+    filters = {}
+    if drivers:
+        filters['driver_name'] = drivers
+    if circuits:
+        filters['race'] = circuits
+    if laps:
+        filters['lap'] = laps
+    if time_range:
+        filters['date'] = time_range
+    tag = len(years) > 1 or len(sessions) > 1
+
+    frames, skipped = [], 0
+    for year in years:
+        for session_type in sessions:
+            folder = os.path.join(CLEANED_DIR, str(year), session_type)
+            entries = _folder_manifest(year, session_type)
+            season = _memmap_season(year, session_type, entries) if compact else None
+            if season is not None:
+                df = _memmap_frame(season, columns, drivers, circuits, filters)
+                if df.empty:
+                    continue
+            else:
+                matched = [os.path.join(folder, fname) for fname, entry in entries.items()
+                           if _entry_matches(entry, drivers, circuits, laps, time_range)]
+                if not matched:
+                    continue
+                dfs, n_skipped = _read_parts(_source_files(year, session_type, matched), columns=columns,
+                                             nrows=None if filters else limit, filters=filters or None)
+                skipped += n_skipped
+                dfs = [d for d in dfs if not d.empty]
+                if not dfs:
+                    continue
+                df = _concat_parts(dfs, n_skipped)
+            if tag:
+                df['year'] = int(year)
+                df['session_type'] = session_type
+            frames.append(df)
+
+    if not frames:
+        return pd.DataFrame()
+    df = frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+    if limit is not None:
+        df = df.head(limit)
+    if compact:
+        df = apply_telemetry_schema(df)
+    df.attrs['files_read'] = sum(f.attrs.get('files_read', 0) for f in frames)
+    df.attrs['files_skipped'] = skipped
+    if dataset_version is not None:
+        df.attrs['data_key'] = ('query', _freeze((years, sessions, columns, drivers, circuits, laps,
+                                                  time_range, limit, compact)), dataset_version)
     return df
 
-@st.cache_data(ttl=3600)
-def get_data_summary(year, session_type):
-    """Get drivers/circuits summary from sample files"""
-    folder = os.path.join(CLEANED_DIR, str(year), session_type)
-    if not os.path.exists(folder):
-        return {}
-    files = [os.path.join(folder, f) for f in os.listdir(folder) if f.lower().endswith('.csv')]
-    files = files[:20]
-    if not files:
-        return {}
-    dfs = []
-    for p in files:
+def iter_telemetry(years, sessions, columns=None, drivers=None, circuits=None,
+                   chunk_rows=streaming.CHUNK_ROWS):
+    """Yield telemetry as chunks of at most chunk_rows rows, one file at a time
+
+    Files are pruned with the manifests and driver/circuit filters applied
+    per chunk as in query(), but nothing is concatenated, so memory stays
+    bounded by one chunk whatever the data size. Every chunk carries
+    `year` and `session_type` columns. Unreadable files are skipped.
+    """
+    drivers, circuits = _to_list(drivers), _to_list(circuits)
+    filters = {}
+    if drivers:
+        filters['driver_name'] = drivers
+    if circuits:
+        filters['race'] = circuits
+    read_columns = list(columns) + [c for c in filters if c not in columns] if columns else None
+    for year in _to_list(years):
+        for session_type in _to_list(sessions):
+            folder = os.path.join(CLEANED_DIR, str(year), session_type)
+            matched = [os.path.join(folder, fname)
+                       for fname, entry in _folder_manifest(year, session_type).items()
+                       if _entry_matches(entry, drivers, circuits, None, None)]
+            for path in _source_files(year, session_type, matched):
+                try:
+                    for chunk in streaming.iter_file_chunks(path, read_columns, chunk_rows):
+                        if filters:
+                            chunk = _filter_part(chunk, filters)
+                            if columns:
+                                chunk = chunk[[c for c in columns if c in chunk.columns]]
+                        if not chunk.empty:
+                            yield chunk.assign(year=int(year), session_type=session_type)
+                except Exception:
+                    continue
+
+@timed()
+def stream_aggregate(states, years, sessions, columns=None, drivers=None, circuits=None,
+                     chunk_rows=streaming.CHUNK_ROWS):
+    """Fold iter_telemetry() chunks into streaming states (see streaming.py); returns states"""
+    return streaming.fold(iter_telemetry(years, sessions, columns, drivers, circuits, chunk_rows), states)
+
+def stream_overview(years, sessions, drivers=None, circuits=None, chunk_rows=streaming.CHUNK_ROWS):
+    """Overview metrics (data points, distinct drivers/races, speed/rpm/throttle/brake stats)
+    computed out of core, for data that does not fit in memory"""
+    states = {
+        'drivers': streaming.DistinctCount('driver_name'),
+        'races': streaming.DistinctCount('race'),
+        'speed': streaming.Moments('speed'),
+        'rpm': streaming.Moments('rpm'),
+        'throttle': streaming.Moments('throttle'),
+        'brake': streaming.Moments('brake'),
+        'rows': streaming.RowCount(),
+    }
+    columns = ['driver_name', 'race', 'speed', 'rpm', 'throttle', 'brake']
+    stream_aggregate(states, years, sessions, columns, drivers, circuits, chunk_rows)
+    speed, rpm = states['speed'].result(), states['rpm'].result()
+    return {
+        'data_points': states['rows'].result(),
+        'n_drivers': states['drivers'].result(),
+        'n_races': states['races'].result(),
+        'avg_speed': speed['mean'],
+        'max_speed': speed['max'],
+        'avg_rpm': rpm['mean'],
+        'max_rpm': rpm['max'],
+        'avg_throttle': states['throttle'].result()['mean'],
+        'avg_brake': states['brake'].result()['mean'],
+    }
+
+@timed()
+@versioned
+@cache_data(max_entries=CACHE_MAX_ENTRIES)
+def aggregate(years, sessions, by, aggs, drivers=None, circuits=None, columns=None, dataset_version=None):
+    """Grouped aggregates as result rows only
+
+    `aggs` maps output names to (column, func) with func one of mean, sum,
+    min, max, count; ('*', 'count') counts rows, e.g.
+    aggregate(2024, 'race', ['driver_name'], {'speed': ('speed', 'mean')}).
+    Runs in the embedded SQL store (sql_store.py) when every requested
+    season is loaded and current, otherwise with pandas over query(). That
+    query() reads `columns` (plus any the aggregation needs) with the same
+    arguments as given here, so a page passing the columns and filters of
+    its own query() call groups the frame already in the shared cache.
+    Both paths return plain object/int64/float64 columns.
+    """
+    filters = {k: v for k, v in (('drivers', drivers), ('circuits', circuits)) if v is not None}
+    if all(sql_store.is_current(SQL_DIR, y, s, _folder_manifest(y, s))
+           for y in _to_list(years) for s in _to_list(sessions)):
         try:
-            dfs.append(pd.read_csv(p, nrows=5000, usecols=['driver_name','race']))
+            with sql_store.connect(SQL_DIR, read_only=True) as con:
+                return _plain_dtypes(sql_store.aggregate(con, _to_list(years), _to_list(sessions), by, aggs,
+                                                         _to_list(drivers), _to_list(circuits)))
+        except ValueError:
+            raise
         except Exception:
-            try:
-                dfs.append(pd.read_csv(p, nrows=1000))
-            except Exception:
-                continue
-    if not dfs:
+            pass  # store locked or being rebuilt: fall back to pandas
+
+    needed = [c for c in dict.fromkeys(list(by) + [c for c, _ in aggs.values() if c != '*'])
+              if c not in ('year', 'session_type')]
+    columns = list(columns) if columns else []
+    columns += [c for c in needed if c not in columns]
+    df = query(years, sessions, columns=columns, **filters)
+    years, sessions = _to_list(years), _to_list(sessions)
+    if df.empty:
+        return pd.DataFrame(columns=list(by) + list(aggs))
+    if 'year' in by and 'year' not in df.columns:
+        df = df.assign(year=int(years[0]))
+    if 'session_type' in by and 'session_type' not in df.columns:
+        df = df.assign(session_type=sessions[0])
+    keys = list(by) or ['_all']
+    if not by:
+        df = df.assign(_all=0)
+    named = {out: (keys[0], 'size') if column == '*' else (column, func) for out, (column, func) in aggs.items()}
+    out = df.groupby(keys, observed=True).agg(**named).reset_index()
+    return _plain_dtypes(out if by else out.drop(columns='_all'))
+
+def _plain_dtypes(df):
+    """Categorical/string columns as object, integers as int64 (float64 with NaN), floats as float64"""
+    for col in df.columns:
+        values = df[col]
+        if isinstance(values.dtype, pd.CategoricalDtype) or pd.api.types.is_string_dtype(values):
+            df[col] = values.astype(object)
+        elif pd.api.types.is_integer_dtype(values):
+            df[col] = values.astype('float64' if values.isna().any() else 'int64')
+        elif pd.api.types.is_float_dtype(values):
+            df[col] = values.astype('float64')
+    return df
+
+ALIGN_COLUMNS = ['driver_name', 'race', 'date', 'lap'] + alignment.CHANNELS
+
+@timed()
+@versioned
+@shared_frame_cache
+def aligned_laps(year, session_type, driver, circuit, step=alignment.DEFAULT_STEP_M, dataset_version=None):
+    """One driver's laps at one circuit resampled onto a distance grid (see alignment.py)"""
+    df = query(year, session_type, columns=ALIGN_COLUMNS, drivers=driver, circuits=circuit)
+    return alignment.align_laps(df, step=step, lap_length=alignment.circuit_length(circuit))
+
+def compare_fastest_laps(year, session_type, drivers, circuit, step=alignment.DEFAULT_STEP_M):
+    """Fastest-lap traces of several drivers on one distance grid, with delta_s to the first"""
+    return alignment.compare_fastest({d: aligned_laps(year, session_type, d, circuit, step) for d in drivers})
+
+@versioned
+@cache_data(max_entries=CACHE_MAX_ENTRIES)
+def get_data_summary(year, session_type, dataset_version=None):
+    """Get drivers/circuits/columns summary from the folder manifest"""
+    entries = _folder_manifest(year, session_type)
+    if not entries:
         return {}
-    df_sample = pd.concat(dfs, ignore_index=True)
+    columns = []
+    for entry in entries.values():
+        columns.extend(c for c in entry['columns'] if c not in columns)
 
     return {
-        'drivers': sorted(df_sample['driver_name'].dropna().unique().tolist()) if 'driver_name' in df_sample.columns else [],
-        'circuits': sorted(df_sample['race'].dropna().unique().tolist()) if 'race' in df_sample.columns else [],
-        'columns': df_sample.columns.tolist(),
+        'drivers': sorted({e['driver_name'] for e in entries.values() if e.get('driver_name')}),
+        'circuits': sorted({e['race'] for e in entries.values() if e.get('race')}),
+        'columns': columns,
     }
 
 def get_available_years():
@@ -120,94 +573,324 @@ def get_available_years():
                 years.append(int(name))
     return sorted(years)
 
-@st.cache_data(ttl=3600)
-def get_available_circuits(year, session_type):
-    """Get circuits from cleaned data filenames + CSV race column"""
+def _circuit_token(fname):
+    """Circuit part of '<year>_<circuit>_<Race|Sprint>_<key>_<driver>.csv', if present"""
+    parts = fname[:-4].split('_')
+    if len(parts) < 3 or not parts[0].isdigit():
+        return None
+    try:
+        stop_idx = parts.index('Race') if 'Race' in parts else parts.index('Sprint')
+    except ValueError:
+        return None
+    return '_'.join(parts[1:stop_idx])
+
+@versioned
+@cache_data(max_entries=CACHE_MAX_ENTRIES)
+def get_available_circuits(year, session_type, dataset_version=None):
+    """Get circuits from the manifest race column, falling back to filenames"""
     circuits = set()
-    cleaned_dir = os.path.join(CLEANED_DIR, str(year), session_type)
-    if os.path.exists(cleaned_dir):
-        seen_tokens = set()
-        for fname in os.listdir(cleaned_dir):
-            if not fname.lower().endswith('.csv'):
-                continue
-            parts = fname[:-4].split('_')
-            if len(parts) < 3 or not parts[0].isdigit():
-                continue
-            try:
-                stop_idx = parts.index('Race') if 'Race' in parts else parts.index('Sprint')
-            except ValueError:
-                continue
-            token = '_'.join(parts[1:stop_idx])
-            if token in seen_tokens:
-                continue
-            seen_tokens.add(token)
-            fpath = os.path.join(cleaned_dir, fname)
-            try:
-                df1 = pd.read_csv(fpath, usecols=['race'], nrows=1)
-                name = str(df1.iloc[0]['race'])
-                if name:
-                    circuits.add(name)
-                    continue
-            except Exception:
-                pass
+    for fname, entry in _folder_manifest(year, session_type).items():
+        if entry.get('race'):
+            circuits.add(entry['race'])
+            continue
+        token = _circuit_token(fname)
+        if token:
             circuits.add(token.replace('_', ' '))
     return sorted(circuits)
 
-@st.cache_data(ttl=3600)
-def get_available_drivers(year, session_type):
-    """Get drivers from 1st row of each CSV"""
-    cleaned_dir = os.path.join(CLEANED_DIR, str(year), session_type)
-    if not os.path.exists(cleaned_dir):
-        return []
-    names = set()
-    files = [os.path.join(cleaned_dir, f) for f in os.listdir(cleaned_dir) if f.lower().endswith('.csv')]
-    for fpath in files:
-        try:
-            df = pd.read_csv(fpath, usecols=['driver_name'], nrows=1)
-            val = str(df.iloc[0]['driver_name'])
-            if val:
-                names.add(val)
-        except Exception:
-            continue
-    return sorted(names)
+@versioned
+@cache_data(max_entries=CACHE_MAX_ENTRIES)
+def get_available_drivers(year, session_type, dataset_version=None):
+    """Get drivers from the folder manifest"""
+    entries = _folder_manifest(year, session_type)
+    return sorted({e['driver_name'] for e in entries.values() if e.get('driver_name')})
 
-def create_speed_distribution(df, title="Speed Distribution", max_points=10000):
-    if len(df) > max_points:
-        df_plot = df.sample(n=max_points, random_state=42)
+@timed()
+@versioned
+@cache_data(max_entries=CACHE_MAX_ENTRIES)
+def get_rollups(years, session_types, dataset_version=None):
+    """Rollup rows (see rollups.py) for every year x session type"""
+    years = [years] if isinstance(years, (int, str)) else years
+    session_types = [session_types] if isinstance(session_types, str) else session_types
+    seasons = [(year, session_type) for year in years for session_type in session_types]
+    n = len(seasons)
+    if n > 1 and LOAD_WORKERS > 1:
+        # Seasons with stale rollups re-read their changed files; refresh them side by side
+        with ThreadPoolExecutor(max_workers=min(LOAD_WORKERS, n)) as pool:
+            parts = list(pool.map(rollups.load_rollups, [y for y, _ in seasons], [s for _, s in seasons],
+                                  [CLEANED_DIR] * n, [COLUMNAR_DIR] * n))
     else:
-        df_plot = df
-    
-    fig = px.histogram(df_plot, x="speed", nbins=40, 
-                      color="driver_name",
-                      title=title)
+        parts = [rollups.load_rollups(y, s, CLEANED_DIR, COLUMNAR_DIR) for y, s in seasons]
+    parts = [part for part in parts if not part.empty]
+    if not parts:
+        return pd.DataFrame()
+    return pd.concat(parts, ignore_index=True)
+
+def get_rollup_summary(years, session_types, by, metrics=None, drivers=None):
+    """count/mean/std/min/max of metrics per `by` group, answered from rollups
+
+    e.g. get_rollup_summary(2024, 'race', by='driver_name') gives one row per
+    driver with speed_mean, rpm_mean, ..., speed_max, ... and count.
+    """
+    rollup = get_rollups(years, session_types)
+    if rollup.empty:
+        return pd.DataFrame()
+    if drivers:
+        rollup = rollup[rollup['driver_name'].isin(drivers)]
+    return rollups.summarize(rollup, by, metrics)
+
+@timed()
+@versioned
+@cache_data(max_entries=CACHE_MAX_ENTRIES)
+def get_evolution_table(years, session_types=('race', 'sprint'), metrics=EVOLUTION_METRICS,
+                        dataset_version=None):
+    """Mean of metrics per (year, session_type, driver_name), from the rollups
+
+    One small row per driver and season: the rollups of every requested
+    season are read once and reduced here, so driver_evolution() only
+    filters this table.
+    """
+    rollup = get_rollups(list(years), list(session_types))
+    if rollup.empty:
+        return pd.DataFrame()
+    rollup = rollup[~rollups.is_missing(rollup['driver_name'])]
+    summary = rollups.summarize(rollup, ['year', 'session_type', 'driver_name'], list(metrics))
+    out = summary[['year', 'session_type', 'driver_name']].copy()
+    out['data_points'] = summary['count']
+    for m in metrics:
+        out[f'avg_{m}'] = summary[f'{m}_mean']
+    return out
+
+def driver_evolution(driver, years, session_types=('race', 'sprint'), metrics=EVOLUTION_METRICS):
+    """year, session_type, data_points and avg_<metric> of one driver, one row per season with data"""
+    table = get_evolution_table(list(years), list(session_types), list(metrics))
+    if table.empty:
+        return table
+    return table[table['driver_name'] == driver].drop(columns='driver_name').reset_index(drop=True)
+
+@timed()
+@versioned
+@cache_data(max_entries=CACHE_MAX_ENTRIES)
+def get_sketch(years, sessions, drivers=None, circuits=None, dataset_version=None):
+    """Merged sketches.Sketch of every file a selection covers, without reading telemetry
+
+    Files are picked with the manifests (one driver and race per file), e.g.
+    get_sketch(2024, 'race', circuits='Monza').quantile('speed', 0.95).
+    """
+    drivers, circuits = _to_list(drivers), _to_list(circuits)
+    merged = sketches.Sketch()
+    for year in _to_list(years):
+        for session_type in _to_list(sessions):
+            entries = _folder_manifest(year, session_type)
+            file_sketches = sketches.load_sketches(year, session_type, CLEANED_DIR, COLUMNAR_DIR)
+            for fname, sketch in file_sketches.items():
+                if fname in entries and _entry_matches(entries[fname], drivers, circuits, None, None):
+                    merged.merge(sketch)
+    return merged
+
+# Point budget per line trace sent to the browser
+LINE_MAX_POINTS = 2000
+# Scatter/line figures with at least this many points render with WebGL (scattergl) instead of SVG
+WEBGL_MIN_POINTS = int(os.environ.get("F1_WEBGL_MIN_POINTS", 1000))
+
+def render_mode(n_points):
+    """'webgl' for figures with WEBGL_MIN_POINTS points or more, else 'svg'"""
+    return 'webgl' if n_points >= WEBGL_MIN_POINTS else 'svg'
+
+def _as_float(values):
+    if isinstance(values, pd.Series) and pd.api.types.is_datetime64_any_dtype(values):
+        values = values.to_numpy(dtype='datetime64[ns]')
+    values = np.asarray(values)
+    if np.issubdtype(values.dtype, np.datetime64):
+        return values.astype('datetime64[ns]').astype(np.int64).astype(np.float64)
+    return values.astype(np.float64)
+
+def lttb_indices(x, y, n_out):
+    """Indices of the points kept by Largest-Triangle-Three-Buckets
+
+    x must be sorted. The first and last points are always kept; every
+    bucket in between keeps the point forming the largest triangle with
+    the averages of its neighbouring buckets, so peaks and braking spikes
+    survive. Fully vectorized (no per-bucket Python loop).
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x, y = _as_float(x), _as_float(y)
+
+    # Interior buckets cover points 1..n-2; the first/last points are their own buckets
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    starts = edges[:-1]
+    counts = np.diff(edges)
+    bucket = np.repeat(np.arange(len(starts)), counts)
+
+    x_mean = np.add.reduceat(x[1:n - 1], starts - 1) / counts
+    y_mean = np.add.reduceat(y[1:n - 1], starts - 1) / counts
+    ax = np.concatenate(([x[0]], x_mean[:-1]))
+    ay = np.concatenate(([y[0]], y_mean[:-1]))
+    cx = np.concatenate((x_mean[1:], [x[-1]]))
+    cy = np.concatenate((y_mean[1:], [y[-1]]))
+
+    px_, py_ = x[1:n - 1], y[1:n - 1]
+    area = np.abs((ax[bucket] - cx[bucket]) * (py_ - ay[bucket])
+                  - (ax[bucket] - px_) * (cy[bucket] - ay[bucket]))
+
+    # First index of the max area in each bucket
+    best = np.maximum.reduceat(area, starts - 1)
+    is_best = area == best[bucket]
+    _, first = np.unique(bucket[is_best], return_index=True)
+    picked = np.flatnonzero(is_best)[first] + 1
+    return np.concatenate(([0], picked, [n - 1]))
+
+def downsample_lttb(df, x, y, max_points=LINE_MAX_POINTS, by=None):
+    """Downsample a frame for a line chart, keeping max_points per `by` group"""
+    if len(df) <= max_points:
+        return df
+    if by is not None and by in df.columns:
+        parts = [downsample_lttb(part, x, y, max_points)
+                 for _, part in df.groupby(by, observed=True, sort=False)]
+        return pd.concat(parts) if parts else df
+    df = df.dropna(subset=[x, y])
+    if not df[x].is_monotonic_increasing:
+        df = df.sort_values(x)
+    return df.iloc[lttb_indices(_as_float(df[x]), _as_float(df[y]), max_points)]
+
+@timed()
+@cached_figure
+def create_line_chart(df, x, y, color=None, title=None, max_points=LINE_MAX_POINTS, **kwargs):
+    """px.line with LTTB downsampling to max_points per trace"""
+    df_plot = downsample_lttb(df, x, y, max_points=max_points, by=color)
+    if len(df_plot) < len(df):
+        title = f"{title} (showing {len(df_plot):,} of {len(df):,} points)" if title else None
+    kwargs.setdefault('render_mode', render_mode(len(df_plot)))
+    return px.line(df_plot, x=x, y=y, color=color, title=title, **kwargs)
+
+def _group_codes(df, by):
+    """(integer code per row, group labels) for an optional grouping column"""
+    if by is None or by not in df.columns:
+        return np.zeros(len(df), dtype=np.int64), [None]
+    codes, labels = pd.factorize(df[by], sort=True)
+    return codes.astype(np.int64), list(labels)
+
+def _bin_index(values, edges):
+    """Bin of each value for the given edges (-1 when outside or missing)"""
+    idx = np.searchsorted(edges, values, side='right') - 1
+    idx[values == edges[-1]] = len(edges) - 2
+    idx[(values < edges[0]) | (values > edges[-1]) | np.isnan(values)] = -1
+    return idx
+
+def histogram_bins(df, x, bins=50, by='driver_name', value_range=None):
+    """Server-side 1D histogram: one row per (group, bin) with its count
+
+    Edges are shared by all groups, so the result has at most
+    groups x bins rows however many telemetry rows went in.
+    """
+    values = _as_float(df[x])
+    finite = values[np.isfinite(values)]
+    if finite.size == 0:
+        return pd.DataFrame(columns=[by, 'bin_left', 'bin_right', 'bin_center', 'count'])
+    edges = np.histogram_bin_edges(finite, bins=bins, range=value_range)
+    codes, labels = _group_codes(df, by)
+    xi = _bin_index(values, edges)
+    ok = (xi >= 0) & (codes >= 0)
+    n_bins = len(edges) - 1
+    counts = np.bincount(codes[ok] * n_bins + xi[ok], minlength=len(labels) * n_bins)
+
+    out = pd.DataFrame({
+        'bin_left': np.tile(edges[:-1], len(labels)),
+        'bin_right': np.tile(edges[1:], len(labels)),
+        'count': counts,
+    })
+    out['bin_center'] = (out['bin_left'] + out['bin_right']) / 2
+    if by is not None:
+        out.insert(0, by, np.repeat(labels, n_bins))
+    return out
+
+def density_grid(df, x, y, bins=50, by='driver_name'):
+    """Server-side 2D histogram per group
+
+    Returns (labels, x_edges, y_edges, counts) where counts has shape
+    (len(labels), len(y_edges) - 1, len(x_edges) - 1).
+    """
+    bins_x, bins_y = (bins, bins) if np.isscalar(bins) else bins
+    xv, yv = _as_float(df[x]), _as_float(df[y])
+    fx, fy = xv[np.isfinite(xv)], yv[np.isfinite(yv)]
+    if fx.size == 0 or fy.size == 0:
+        return [], np.array([]), np.array([]), np.zeros((0, 0, 0), dtype=np.int64)
+    x_edges = np.histogram_bin_edges(fx, bins=bins_x)
+    y_edges = np.histogram_bin_edges(fy, bins=bins_y)
+    codes, labels = _group_codes(df, by)
+    xi, yi = _bin_index(xv, x_edges), _bin_index(yv, y_edges)
+    ok = (xi >= 0) & (yi >= 0) & (codes >= 0)
+    nx, ny = len(x_edges) - 1, len(y_edges) - 1
+    flat = (codes[ok] * ny + yi[ok]) * nx + xi[ok]
+    counts = np.bincount(flat, minlength=len(labels) * ny * nx).reshape(len(labels), ny, nx)
+    return labels, x_edges, y_edges, counts
+
+@timed()
+@cached_figure
+def create_binned_histogram(df, x, bins=50, color='driver_name', title=None, labels=None):
+    """Histogram drawn as bars from histogram_bins instead of raw rows"""
+    hist = histogram_bins(df, x, bins=bins, by=color)
+    hist = hist.rename(columns={'bin_center': x})
+    fig = px.bar(hist, x=x, y='count', color=color, title=title, labels=labels,
+                 barmode='overlay', opacity=0.6,
+                 hover_data={'bin_left': ':.1f', 'bin_right': ':.1f'})
+    fig.update_traces(width=float(hist['bin_right'].iloc[0] - hist['bin_left'].iloc[0]) if len(hist) else None)
+    fig.update_layout(bargap=0)
     return fig
 
-def create_speed_rpm_scatter(df, title="Speed vs RPM", max_points=5000):
-    if len(df) > max_points:
-        df_plot = df.sample(n=max_points, random_state=42)
-    else:
-        df_plot = df
-    
-    fig = px.scatter(df_plot, x="rpm", y="speed", 
-                    color="driver_name",
-                    opacity=0.5,
+@timed()
+@cached_figure
+def create_density_heatmap(df, x, y, bins=50, by='driver_name', title=None, labels=None, facet_col_wrap=4):
+    """2D density heatmap (one facet per `by` group) from density_grid"""
+    group_labels, x_edges, y_edges, counts = density_grid(df, x, y, bins=bins, by=by)
+    labels = labels or {}
+    x_centers = (x_edges[:-1] + x_edges[1:]) / 2
+    y_centers = (y_edges[:-1] + y_edges[1:]) / 2
+    facets = len(group_labels) > 1
+    fig = px.imshow(counts if facets else counts[0] if len(counts) else counts,
+                    x=x_centers, y=y_centers, origin='lower', aspect='auto',
+                    color_continuous_scale='Viridis',
+                    facet_col=0 if facets else None,
+                    facet_col_wrap=facet_col_wrap if facets else None,
+                    labels={'x': labels.get(x, x), 'y': labels.get(y, y), 'color': 'count'},
                     title=title)
+    if facets:
+        fig.for_each_annotation(lambda a: a.update(text=str(group_labels[int(a.text.split('=')[-1])])))
     return fig
 
+@timed()
+def create_speed_distribution(df, title="Speed Distribution", bins=40):
+    return create_binned_histogram(df, "speed", bins=bins, color="driver_name", title=title)
+
+def _scatter(df, x, y, color=None, title=None, max_points=None, **kwargs):
+    """px.scatter of at most max_points sampled rows, WebGL above WEBGL_MIN_POINTS"""
+    if max_points is not None and len(df) > max_points:
+        df = df.sample(n=max_points, random_state=42)
+    kwargs.setdefault('render_mode', render_mode(len(df)))
+    return px.scatter(df, x=x, y=y, color=color, title=title, **kwargs)
+
+@timed()
+@cached_figure
+def create_scatter(df, x, y, color=None, title=None, max_points=5000, **kwargs):
+    """Scatter plot (sampled to max_points, WebGL for large point counts)"""
+    return _scatter(df, x, y, color=color, title=title, max_points=max_points, **kwargs)
+
+@timed()
+@cached_figure
+def create_speed_rpm_scatter(df, title="Speed vs RPM", max_points=5000):
+    return _scatter(df, "rpm", "speed", color="driver_name", title=title, max_points=max_points, opacity=0.5)
+
+@timed()
+@cached_figure
 def create_throttle_brake_map(df, title="Throttle vs Brake", max_points=5000):
-    sample_size = min(len(df), max_points)
-    df_sample = df.sample(sample_size, random_state=42)
-    
-    fig = px.scatter(df_sample, 
-                    x="throttle", 
-                    y="brake",
-                    color="driver_name",
-                    opacity=0.5,
-                    title=title)
-    return fig
+    return _scatter(df, "throttle", "brake", color="driver_name", title=title, max_points=max_points, opacity=0.5)
 
+@timed()
+@cached_figure
 def create_gear_distribution(df, title="Gear Distribution"):
-    gear_counts = df.groupby(["driver_name", "n_gear"]).size().reset_index(name="count")
+    gear_counts = df.groupby(["driver_name", "n_gear"], observed=True).size().reset_index(name="count")
     fig = px.bar(gear_counts, 
                 x="n_gear", 
                 y="count", 
@@ -216,8 +899,10 @@ def create_gear_distribution(df, title="Gear Distribution"):
                 title=title)
     return fig
 
+@timed()
+@cached_figure
 def create_average_speed_bar(df, by="driver_name", title="Average Speed"):
-    avg_speed = df.groupby(by)["speed"].mean().reset_index()
+    avg_speed = df.groupby(by, observed=True)["speed"].mean().reset_index()
     avg_speed = avg_speed.sort_values("speed", ascending=False)
     
     fig = px.bar(avg_speed, 
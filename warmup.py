@@ -0,0 +1,219 @@
+"""Background cache warm-up and prefetch.
+
+The first visitor after a deploy, a data change or a cache invalidation
+would otherwise pay the full cold-load cost. start_warmup() (called by
+every page, a no-op after the first call) starts one daemon thread per
+process that:
+
+1. loads the manifests, the rollups and the default selection (first
+   year, race) with exactly the calls the pages make,
+2. once the user has been idle for WARMUP_IDLE_S, prefetches the
+   neighbours of the latest selection a page reported via warm_around():
+   the other session type, then the previous and next year,
+3. repeats every WARMUP_INTERVAL_S (entries that are still cached are
+   cheap hits) and immediately after FRAME_CACHE.invalidate().
+
+It also starts the dataset watcher (dataset_versions.py): when files in a
+year/session folder change, that season's entries get a new cache key and
+the next pass reloads it first, before the default selection.
+
+Jobs run on at most WARMUP_WORKERS threads and stop while the shared
+frame cache is above WARMUP_BUDGET_FRACTION of its budget, so prefetching
+never evicts frames someone is looking at.
+
+Environment: F1_WARMUP=0 disables it; F1_WARMUP_WORKERS,
+F1_WARMUP_BUDGET_FRACTION, F1_WARMUP_IDLE_S and F1_WARMUP_INTERVAL_S
+override the defaults.
+"""
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import manifest
+import performance_monitor
+import utils
+from frame_cache import FRAME_CACHE
+
+WARMUP_ENABLED = os.environ.get("F1_WARMUP", "1") != "0"
+WARMUP_WORKERS = int(os.environ.get("F1_WARMUP_WORKERS", 2))
+WARMUP_BUDGET_FRACTION = float(os.environ.get("F1_WARMUP_BUDGET_FRACTION", 0.5))
+WARMUP_IDLE_S = float(os.environ.get("F1_WARMUP_IDLE_S", 2))
+WARMUP_INTERVAL_S = float(os.environ.get("F1_WARMUP_INTERVAL_S", 900))
+THREAD_PREFIX = "f1-warmup"
+SESSION_TYPES = ["race", "sprint"]
+
+logger = logging.getLogger(__name__)
+_context_logger = logging.getLogger("streamlit.runtime.scriptrunner_utils.script_run_context")
+
+
+class _WarmupThreadFilter(logging.Filter):
+    """Drop Streamlit's 'missing ScriptRunContext' warnings raised by warm-up threads"""
+
+    def filter(self, record):
+        return not record.threadName.startswith(THREAD_PREFIX)
+
+
+def selection_jobs(year, session_type):
+    """(label, callable) pairs reproducing what the pages load for one selection"""
+    jobs = []
+    drivers = utils.get_available_drivers(year, session_type)
+    circuits = utils.get_available_circuits(year, session_type)
+    jobs.append((f"car {year} {session_type}",
+                 lambda: utils.query(year, session_type, columns=utils.CAR_COLUMNS)))
+    if drivers:
+        jobs.append((f"driver {year} {session_type}",
+                     lambda: utils.query(year, session_type, columns=utils.DRIVER_COLUMNS, drivers=drivers[0])))
+    if circuits:
+        jobs.append((f"circuit {year} {session_type}",
+                     lambda: utils.query(year, session_type, columns=utils.CIRCUIT_COLUMNS, circuits=circuits[0])))
+    return jobs
+
+
+def overview_jobs(years):
+    """Manifests, rollups and the cross-season comparison page"""
+    jobs = [(f"manifest {y} {s}", lambda y=y, s=s: manifest.load_manifest(
+                os.path.join(utils.CLEANED_DIR, str(y), s)))
+            for y in years for s in SESSION_TYPES]
+    jobs += [(f"rollups {y} {s}", lambda y=y, s=s: utils.get_rollups(y, s)) for y in years for s in SESSION_TYPES]
+    jobs.append(("rollups all", lambda: utils.get_rollups(years, SESSION_TYPES)))
+    jobs.append(("evolution", lambda: utils.get_evolution_table(years, SESSION_TYPES)))
+    return jobs
+
+
+class Warmup:
+    """Background warm-up thread with an idle gate, memory budget and worker limit."""
+
+    def __init__(self, workers=WARMUP_WORKERS, budget_fraction=WARMUP_BUDGET_FRACTION,
+                 idle_s=WARMUP_IDLE_S, interval_s=WARMUP_INTERVAL_S, cache=FRAME_CACHE):
+        self.workers = workers
+        self.budget_fraction = budget_fraction
+        self.idle_s = idle_s
+        self.interval_s = interval_s
+        self.cache = cache
+        self.focus = None
+        self.changed = []
+        self.last_activity = time.monotonic()
+        self.stats = {"passes": 0, "jobs": 0, "skipped_budget": 0, "errors": 0}
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self.cache.add_invalidation_listener(self.wake)
+                utils.DATASET_VERSIONS.add_change_listener(self.refresh)
+                utils.DATASET_VERSIONS.start_watcher()
+                self._thread = threading.Thread(target=self._run, name=f"{THREAD_PREFIX}-main", daemon=True)
+                self._thread.start()
+        return self
+
+    def wake(self):
+        self._wake.set()
+
+    def refresh(self, changed):
+        """Dataset change listener: reload the changed seasons on the next pass"""
+        with self._lock:
+            for year, session_type, _, _ in changed:
+                if (year, session_type) not in self.changed:
+                    self.changed.append((year, session_type))
+        self.wake()
+
+    def note(self, year, session_type):
+        """Record user activity and the selection whose neighbours should be prefetched"""
+        self.last_activity = time.monotonic()
+        if (year, session_type) != self.focus:
+            self.focus = (year, session_type)
+            self.wake()
+
+    def over_budget(self):
+        stats = self.cache.stats()
+        return stats["bytes"] >= self.budget_fraction * stats["budget_bytes"]
+
+    def _wait_idle(self):
+        while time.monotonic() - self.last_activity < self.idle_s:
+            time.sleep(self.idle_s / 4)
+
+    def _job(self, label, func, idle):
+        if idle:
+            self._wait_idle()
+        if self.over_budget():
+            self.stats["skipped_budget"] += 1
+            return False
+        try:
+            func()
+            self.stats["jobs"] += 1
+        except Exception:
+            self.stats["errors"] += 1
+            logger.exception("warm-up %s failed", label)
+        return True
+
+    def run_jobs(self, jobs, idle=False):
+        """Run jobs on the worker pool; returns False if the memory budget stopped them"""
+        if not jobs:
+            return True
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=THREAD_PREFIX) as pool:
+            results = list(pool.map(lambda job: self._job(job[0], job[1], idle), jobs))
+        return all(results)
+
+    def neighbours(self, year, session_type, years):
+        selections = [(year, s) for s in SESSION_TYPES if s != session_type]
+        if year in years:
+            i = years.index(year)
+            selections += [(years[j], session_type) for j in (i - 1, i + 1) if 0 <= j < len(years)]
+        return selections
+
+    def run_pass(self):
+        performance_monitor.current_monitor().reset()
+        years = utils.get_available_years()
+        if not years:
+            return
+        default = (years[0], SESSION_TYPES[0])
+        with self._lock:
+            changed, self.changed = self.changed, []
+        for selection in changed:
+            self.run_jobs(selection_jobs(*selection))
+        self.run_jobs(overview_jobs(years))
+        if not self.run_jobs(selection_jobs(*default)):
+            return
+        focus = self.focus or default
+        for selection in ([focus] if focus != default else []) + self.neighbours(*focus, years):
+            if not self.run_jobs(selection_jobs(*selection), idle=True):
+                break
+        self.stats["passes"] += 1
+
+    def _run(self):
+        while True:
+            self._wake.clear()
+            try:
+                self.run_pass()
+            except RuntimeError as e:
+                if "shutdown" in str(e):  # interpreter exiting: no new pool threads
+                    return
+                self.stats["errors"] += 1
+                logger.exception("warm-up pass failed")
+            except Exception:
+                self.stats["errors"] += 1
+                logger.exception("warm-up pass failed")
+            self._wake.wait(self.interval_s)
+
+
+WARMUP = Warmup()
+
+
+def start_warmup():
+    """Start the process-wide warm-up thread once (no-op if disabled or running)"""
+    if WARMUP_ENABLED:
+        if not any(isinstance(f, _WarmupThreadFilter) for f in _context_logger.filters):
+            _context_logger.addFilter(_WarmupThreadFilter())
+        WARMUP.start()
+    return WARMUP
+
+
+def warm_around(year, session_type):
+    """Tell the warm-up thread what the user is looking at (call after the sidebar selection)"""
+    if WARMUP_ENABLED:
+        start_warmup().note(year, session_type)
+